@@ -0,0 +1,214 @@
+import os
+import json
+import uuid
+import hashlib
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from structuredLog import get_logger
+
+log = get_logger("aasxUpload")
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class MultipartFileStream():
+    """A multipart/form-data body with a single file field, which is streamed from disk
+    (in chunks) while it is sent, instead of being read into memory up front
+    """
+    def __init__(self, path: str, field_name: str = "aasx", chunk_size: int = CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self._head = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{os.path.basename(path)}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        ).encode()
+        self._tail = f"\r\n--{boundary}--\r\n".encode()
+        self._length = len(self._head) + os.path.getsize(path) + len(self._tail)
+        self._file = None
+        self.seek(0)
+
+
+    def __len__(self):
+        return self._length
+
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+    def seek(self, offset: int, whence: int = 0):
+        """Rewinds the stream (e.g. to send it again), only offset 0 is supported
+        """
+        if offset != 0 or whence != 0:
+            raise ValueError("MultipartFileStream can only be rewound to the start")
+        self.close()
+        self._parts = [self._head, None, self._tail]
+        self._buffer = b""
+
+
+    def read(self, size: int = -1) -> bytes:
+        """Reads the next bytes of the body, opening the file lazily and closing it once read
+
+        Args:
+            size (int): the maximum number of bytes, -1 to read everything
+
+        Returns:
+            bytes: the bytes read, empty at the end of the body
+        """
+        size = self._length if size is None or size < 0 else size
+        while len(self._buffer) < size and self._parts:
+            if self._parts[0] is not None:
+                self._buffer += self._parts.pop(0)
+                continue
+            if self._file is None:
+                self._file = open(self.path, 'rb')
+            chunk = self._file.read(size - len(self._buffer))
+            if chunk:
+                self._buffer += chunk
+            else:
+                self.close()
+                self._parts.pop(0)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+    def close(self):
+        """Closes the file handle, if open
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+    def __repr__(self):
+        return f"MultipartFileStream('{self.path}', {self._length} bytes)"
+
+
+class UploadHashStore():
+    """Append-only JSONL store of the content hash of every AASX file uploaded per resource,
+    persisted between runs. Without a path the hashes are only kept in memory
+    """
+    def __init__(self, path: str = None):
+        self.path = path
+        self._hashes = {}
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path) as store_file:
+                for line in store_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._hashes.setdefault(entry["uuid"], {})[entry["path"]] = entry["sha256"]
+            log.info(f"Loaded AASX upload hashes of '{len(self._hashes)}' resources from '{path}'")
+
+
+    def is_uploaded(self, uuid: str, path: str, sha256: str) -> bool:
+        """Checks if the file with the given content was already uploaded to the resource
+        """
+        with self._lock:
+            return self._hashes.get(uuid, {}).get(path) == sha256
+
+
+    def record(self, uuid: str, path: str, sha256: str):
+        """Records an upload of the file with the given content to the resource
+        """
+        with self._lock:
+            self._hashes.setdefault(uuid, {})[path] = sha256
+            if self.path is not None:
+                with open(self.path, "a") as store_file:
+                    store_file.write(json.dumps({"uuid": uuid, "path": path, "sha256": sha256}) + "\n")
+
+
+    def forget(self, uuid: str):
+        """Forgets all uploads to the (deleted or new) resource, in memory and on disk (on the next load)
+        """
+        with self._lock:
+            paths = self._hashes.pop(uuid, {})
+            if self.path is not None and paths:
+                with open(self.path, "a") as store_file:
+                    for path in paths:
+                        store_file.write(json.dumps({"uuid": uuid, "path": path, "sha256": None}) + "\n")
+
+
+class AasxUploader():
+    """Uploads AASX files to resources on a bounded pool, streaming them from disk.
+    Files whose content (sha256) was already uploaded to a resource are skipped
+    """
+    def __init__(self, slm, hash_store: UploadHashStore = None, max_parallel: int = 4):
+        self.slm = slm
+        self.hash_store = hash_store or UploadHashStore()
+        self._executor = ThreadPoolExecutor(max_workers=max_parallel)
+        self._file_hashes = {}
+        self._lock = threading.Lock()
+
+
+    def file_hash(self, path: str) -> str:
+        """Computes the sha256 of the file in chunks, cached as long as size and mtime do not change
+
+        Args:
+            path (str): the path of the file
+
+        Returns:
+            str: the hex digest
+        """
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime)
+        with self._lock:
+            if key in self._file_hashes:
+                return self._file_hashes[key]
+
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as aasx_file:
+            for chunk in iter(lambda: aasx_file.read(CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        with self._lock:
+            self._file_hashes[key] = sha256.hexdigest()
+            return self._file_hashes[key]
+
+
+    def upload(self, uuid: str, paths: list) -> list:
+        """Uploads the given AASX files to the resource, several at once. Unchanged files
+        and files with identical content are uploaded only once
+
+        Args:
+            uuid (str): the uuid of the resource
+            paths (list): the paths of the AASX files
+
+        Returns:
+            list: the paths of the uploaded files
+        """
+        pending = {}
+        for path in paths:
+            sha256 = self.file_hash(path)
+            if self.hash_store.is_uploaded(uuid, path, sha256):
+                log.info(f"SKIP: AASX file '{path}' is unchanged since the last upload to resource '{uuid}'")
+            elif sha256 in pending.values():
+                log.info(f"SKIP: AASX file '{path}' has the same content as another file uploaded to resource '{uuid}'")
+            else:
+                pending[path] = sha256
+
+        # the uploads run on the pool of the uploader, within the (logging) context of the calling pipeline
+        futures = {path: self._executor.submit(contextvars.copy_context().run, self.slm.upload_submodel, uuid=uuid, path=path) for path in pending}
+        uploaded = []
+        for path, future in futures.items():
+            # only add submodels to list if result is provided (implies that request succeeded)
+            if future.result():
+                self.hash_store.record(uuid, path, pending[path])
+                uploaded.append(path)
+        return uploaded
+
+
+    def close(self):
+        """Waits for running uploads and shuts the pool down
+        """
+        self._executor.shutdown(wait=True)
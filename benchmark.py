@@ -0,0 +1,246 @@
+import os
+import sys
+import json
+import time
+import uuid
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+
+from mockRegistry import MockRegistry
+
+DEVICE_HEADER = [
+    "Device", "OS", "user", "password", "hostname", "eth0 IP", "eth1 IP", "is_resource", "UUID",
+    "connection-type", "connection-port", "location-uuid", "aasx-filter-substring",
+    "DC_Base", "DC_Docker", "DC_Transferapp", "DC_Swarm", "DC_K3S", "DC_Dummy"
+]
+
+# scenarios of every size: a run against an empty registry, the same run again, a reconciliation
+# and a run wiping the registry (DELETE_ALL) before provisioning everything again
+SCENARIOS = [
+    ("initial", {}),
+    ("rerun", {}),
+    ("reconcile", {"RECONCILE": "True"}),
+    ("recreate", {"FORCE_DELETE": "True", "DELETE_ALL": "True"}),
+]
+
+BENCHMARK_NAMESPACE = uuid.UUID("1b6c2a1e-8d4f-4c55-9f0e-5a3c1de0b7a2")
+
+# the log lines of an operation, which failed (after all retries): a request of the SLM client, or a task of the task graph
+FAILED_PREFIXES = ("FAILED", "ERROR: task")
+
+
+def write_inventory(path: str, devices: int, locations: int = 5, groups: int = 3):
+    """Writes a synthetic EXCEL inventory. Every device has a deterministic uuid, half of them
+    request the Docker capability and every tenth one an AASX file
+
+    Args:
+        path (str): the path of the xlsx file
+        devices (int): the number of devices
+        locations (int): the number of locations
+        groups (int): the number of service groups
+    """
+    from openpyxl import Workbook
+
+    location_uuids = [str(uuid.uuid5(BENCHMARK_NAMESPACE, f"location-{index}")) for index in range(locations)]
+    workbook = Workbook(write_only=True)
+
+    sheet = workbook.create_sheet("DEVICES")
+    sheet.append(DEVICE_HEADER)
+    for index in range(devices):
+        sheet.append([
+            "Benchmark Device", "linux", "bench", "password", f"bench-{index:05d}",
+            f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}", "-", "yes",
+            str(uuid.uuid5(BENCHMARK_NAMESPACE, f"device-{index}")), "ssh", 22, location_uuids[index % locations],
+            "benchmark" if index % 10 == 0 else None,
+            "yes" if index % 4 == 0 else "-", "skip" if index % 2 == 0 else "-", "-", "-", "-", "-"
+        ])
+
+    sheet = workbook.create_sheet("LOCATIONS")
+    sheet.append(["UUID", "Name"])
+    for index, location_uuid in enumerate(location_uuids):
+        sheet.append([location_uuid, f"Benchmark Location {index}"])
+
+    sheet = workbook.create_sheet("SERVICE_GROUPS")
+    sheet.append(["UUID", "Name"])
+    for index in range(groups):
+        sheet.append([str(uuid.uuid5(BENCHMARK_NAMESPACE, f"group-{index}")), f"Benchmark Group {index}"])
+
+    workbook.save(path)
+
+
+def run_setup(registry: MockRegistry, workdir: str, inventory: str, env: dict, log_path: str, timeout: float) -> dict:
+    """Runs setup.py against the mock registry, as a separate process
+
+    Returns:
+        dict: the wall-clock time, the exit code, the requests counted by the mock and the metrics report of the run
+    """
+    metrics_file = os.path.join(workdir, "metrics.json")
+    if os.path.exists(metrics_file):
+        os.remove(metrics_file)
+
+    run_env = {
+        **os.environ,
+        "SLM_HOST": registry.url,
+        "RESOURCE_REGISTRY_HOST": registry.url,
+        "SERVICE_REGISTRY_HOST": registry.url,
+        "KEYCLOAK_HOST": registry.url,
+        "XLSX_FILE": inventory,
+        "SHEET_NAME": "DEVICES",
+        "PING_CHECK": "False",
+        "AASX_FILE_FILTER": os.path.join(workdir, "**", "*.aasx"),
+        "JOURNAL_FILE": os.path.join(workdir, "init-journal.jsonl"),
+        "AASX_HASH_FILE": os.path.join(workdir, "aasx-hashes.jsonl"),
+        "METRICS_FILE": metrics_file,
+        **env
+    }
+    requests_before = registry.requests
+    start = time.monotonic()
+    with open(log_path, "w") as log_file:
+        process = subprocess.run([sys.executable, "-u", "setup.py"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                 env=run_env, stdout=log_file, stderr=subprocess.STDOUT, timeout=timeout)
+    elapsed = time.monotonic() - start
+
+    requests_after = registry.requests
+    requests_by_endpoint = {endpoint: count - requests_before.get(endpoint, 0) for endpoint, count in requests_after.items()
+                            if count > requests_before.get(endpoint, 0)}
+    report = {}
+    if os.path.exists(metrics_file):
+        with open(metrics_file) as report_file:
+            report = json.load(report_file)
+    # a run can exit successfully although operations failed (e.g. the mock does not implement an endpoint the client calls)
+    with open(log_path) as log_file:
+        failed = [line.strip() for line in log_file if line.startswith(FAILED_PREFIXES)]
+    return {
+        "exit_code": process.returncode,
+        "failed_operations": len(failed),
+        "failed_examples": failed[:5],
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_total": sum(requests_by_endpoint.values()),
+        "requests_by_endpoint": requests_by_endpoint,
+        "stages": report.get("stages", {})
+    }
+
+
+def run_benchmark(sizes: list, latency: float, jitter: float, error_rate: float, consistency_delay: float, timeout: float) -> list:
+    """Runs all scenarios for every inventory size against a fresh mock registry
+
+    Returns:
+        list: one result dict per size and scenario
+    """
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix=f"slm-benchmark-{size}-") as workdir, \
+                MockRegistry(latency=latency, jitter=jitter, error_rate=error_rate, consistency_delay=consistency_delay) as registry:
+            inventory = os.path.join(workdir, "inventory.xlsx")
+            write_inventory(inventory, size)
+            os.makedirs(os.path.join(workdir, "aasx"))
+            with open(os.path.join(workdir, "aasx", "benchmark_submodels.aasx"), "wb") as aasx_file:
+                aasx_file.write(os.urandom(64 * 1024))
+
+            for scenario, env in SCENARIOS:
+                print(f"Running scenario '{scenario}' with '{size}' devices (latency={latency}s, error_rate={error_rate}, consistency_delay={consistency_delay}s) ...")
+                result = run_setup(registry, workdir, inventory, env, os.path.join(workdir, f"{scenario}.log"), timeout)
+                result.update({
+                    "devices": size,
+                    "scenario": scenario,
+                    "devices_per_second": round(size / result["elapsed_seconds"], 3) if result["elapsed_seconds"] > 0 else None,
+                    "requests_per_device": round(result["requests_total"] / size, 3)
+                })
+                if result["exit_code"] != 0:
+                    with open(os.path.join(workdir, f"{scenario}.log")) as log_file:
+                        print("".join(log_file.readlines()[-20:]))
+                results.append(result)
+                print(f"  took {result['elapsed_seconds']:.2f}s ({result['devices_per_second']} devices/s), '{result['requests_total']}' requests ({result['requests_per_device']} per device), "
+                      f"'{result['failed_operations']}' failed operations, exit code {result['exit_code']}")
+                for line in result["failed_examples"]:
+                    print(f"  {line}")
+    return results
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """Compares the results with a baseline of an earlier benchmark
+
+    Args:
+        results (list): the results of this benchmark
+        baseline (list): the results of the baseline
+        tolerance (float): the accepted slowdown, e.g. 0.2 for 20%
+
+    Returns:
+        list: the regressions, as messages. Empty if there are none
+    """
+    previous = {(result["devices"], result["scenario"]): result for result in baseline}
+    regressions = []
+    for result in results:
+        base = previous.get((result["devices"], result["scenario"]))
+        if base is None:
+            continue
+        if result["elapsed_seconds"] > base["elapsed_seconds"] * (1 + tolerance):
+            regressions.append(f"{result['scenario']} ({result['devices']} devices): took {result['elapsed_seconds']}s instead of {base['elapsed_seconds']}s")
+        if result["requests_total"] > base["requests_total"]:
+            regressions.append(f"{result['scenario']} ({result['devices']} devices): sent {result['requests_total']} requests instead of {base['requests_total']}")
+        if result["failed_operations"] > base.get("failed_operations", 0):
+            regressions.append(f"{result['scenario']} ({result['devices']} devices): {result['failed_operations']} operations failed instead of {base.get('failed_operations', 0)}")
+    return regressions
+
+
+def print_results(results: list):
+    """Prints the results as table
+    """
+    print(f"\n{'DEVICES':>8} {'SCENARIO':<10} {'SECONDS':>9} {'DEVICES/S':>10} {'REQUESTS':>9} {'REQ/DEVICE':>10} {'FAILED':>7} {'EXIT':>5}")
+    for result in results:
+        print(f"{result['devices']:>8} {result['scenario']:<10} {result['elapsed_seconds']:>9.2f} {result['devices_per_second'] or 0:>10.1f} "
+              f"{result['requests_total']:>9} {result['requests_per_device']:>10.2f} {result['failed_operations']:>7} {result['exit_code']:>5}")
+
+
+def build_argparser():
+    """
+    Parse command line arguments.
+    :return: command line arguments
+    """
+    parser = ArgumentParser(description="Benchmarks setup.py against the local mock SLM with synthetic inventories")
+    parser.add_argument("--sizes", default="100,1000,10000", help="(optional) Comma separated numbers of devices")
+    parser.add_argument("--latency", default=0.005, type=float, help="(optional) The delay (in seconds) of the mock per request")
+    parser.add_argument("--jitter", default=0.0, type=float, help="(optional) The random variation (in seconds) of the delay")
+    parser.add_argument("--error-rate", default=0.0, type=float, help="(optional) The share of requests failing with 503 (0..1)")
+    parser.add_argument("--consistency-delay", default=0.0, type=float, help="(optional) The time (in seconds) until written resources are visible")
+    parser.add_argument("--timeout", default=3600, type=float, help="(optional) The maximum time (in seconds) of a single run")
+    parser.add_argument("--output", default=None, help="(optional) Write the results as JSON to the given file")
+    parser.add_argument("--baseline", default=None, help="(optional) Compare with the JSON results of an earlier benchmark, fail on regressions")
+    parser.add_argument("--tolerance", default=0.2, type=float, help="(optional) The accepted slowdown compared to the baseline. Default: 0.2 (20%%)")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_argparser().parse_args()
+    results = run_benchmark(
+        sizes=[int(size) for size in args.sizes.split(",")],
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        consistency_delay=args.consistency_delay,
+        timeout=args.timeout
+    )
+    print_results(results)
+
+    # without injected errors, every operation has to succeed
+    failed = [result for result in results if result["exit_code"] != 0 or (args.error_rate == 0 and result["failed_operations"] > 0)]
+    for result in failed:
+        print(f"FAILED: {result['scenario']} ({result['devices']} devices): exit code {result['exit_code']}, '{result['failed_operations']}' failed operations")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"Wrote results to '{args.output}'")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            exit(1)
+        print("No regressions compared to the baseline")
+
+    if failed:
+        exit(1)
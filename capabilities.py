@@ -0,0 +1,57 @@
+from structuredLog import get_logger
+
+log = get_logger("capabilities")
+
+CAPABILITY_NAME_TO_ID = {
+    "BASE" : "657d64b6-7f8a-41b7-8202-d3fb7c0ddaac",
+    "DUMMY" : "2c8cafe5-1155-471c-9639-0db48ec249eb",
+    "DOCKER": "08c5b8de-5d4a-4116-a73f-1d1f616c7c70",
+    "TRANSFERAPP": "110d43ff-f351-4e55-92c0-77625875ce6e",
+    "DOCKER_SWARM": "5dcb8fc8-556b-4735-9c80-fce546e7bd7a",
+    "K3S": "21afb100-01f9-4915-9c8c-bf9afc032c01",
+    "KUBERNETES": "a2ae8818-09ae-4e86-8e5a-2effb1122fa6"
+}
+
+# the capabilities, which can be added to a resource by add_capabilities
+CAPABILITY_OPTIONS = ["DUMMY", "DOCKER", "TRANSFERAPP", "DOCKER_SWARM", "K3S"]
+
+
+def capability_action(uuid: str, capability: str, available_capabilities: set, overwrite: bool) -> str:
+    """Decides (and logs) what add_capabilities does with a capability of a resource, shared by the SLM clients
+
+    Args:
+        uuid (str): the uuid of the resource
+        capability (str): the name of the capability
+        available_capabilities (set): the capabilities already registered for the resource
+        overwrite (bool): determines if an already registered capabilty is overwritten
+
+    Returns:
+        str: 'add', 'skip' (already registered) or 'invalid' (not in CAPABILITY_OPTIONS)
+    """
+    if capability not in CAPABILITY_OPTIONS:
+        log.error(f"FAILED: capability '{capability}' not in available options {CAPABILITY_OPTIONS}. Skipping ...")
+        return "invalid"
+    if capability not in available_capabilities:
+        log.info(f"Adding capability '{capability}' to resource '{uuid}'. Since resource has the capability not yet!")
+        return "add"
+    if overwrite:
+        log.info(f"OVERWRITE: adding capability '{capability}' to resource '{uuid}'. Overwriting already available capbility!")
+        return "add"
+    log.info(f"SKIP: skipping adding capability '{capability}' to resource '{uuid}'. Since it already has the capbility and FORCE_OVERWRITE is not given!")
+    return "skip"
+
+
+def capability_url(host_resource_registry: str, uuid: str, capability: str, row_value: str) -> tuple:
+    """Returns the url of the request adding a capability to a resource, and its skip flag
+
+    Args:
+        host_resource_registry (str): the url of the resource registry
+        uuid (str): the uuid of the resource
+        capability (str): the name of the capability
+        row_value (str): the value of the capability in the inventory, 'skip' to skip the installation
+
+    Returns:
+        tuple: the url and the skip flag ('true' or 'false')
+    """
+    skip_flag = 'true' if row_value == 'skip' else 'false'
+    return f"{host_resource_registry}/resources/{uuid}/capabilities?capabilityId={CAPABILITY_NAME_TO_ID[capability]}&skipInstall={skip_flag}", skip_flag
@@ -0,0 +1,166 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from structuredLog import get_logger
+
+log = get_logger("installTracker")
+
+# the states of an install, as reported by the deployment capabilities of a resource (case-insensitive)
+INSTALLED_STATES = {"installed", "ready", "success", "succeeded", "done"}
+FAILED_STATES = {"failed", "error", "install_failed", "installation_failed"}
+# the fields of a deployment capability, which may carry the state of its install
+STATE_FIELDS = ["installStatus", "status", "state"]
+
+
+def install_state(entry: dict) -> str:
+    """Returns the state of the install of a deployment capability: 'installed', 'failed', 'pending',
+    or None if the entry carries neither a state field nor an 'installed' flag (it is treated as pending until the timeout)
+
+    Args:
+        entry (dict): the deployment capability, as returned by the resource registry
+    """
+    status = next((str(entry[field]).lower() for field in STATE_FIELDS if entry.get(field) is not None), None)
+    if status in FAILED_STATES or entry.get("failed") is True:
+        return "failed"
+    if status is not None:
+        return "installed" if status in INSTALLED_STATES else "pending"
+    if isinstance(entry.get("installed"), bool):
+        return "installed" if entry["installed"] else "pending"
+    return None
+
+
+class InstallStatus():
+    """An install of a capability, started by adding it to a resource (skipInstall=false)
+    """
+    __slots__ = ("uuid", "capability", "state", "started", "finished")
+
+    def __init__(self, uuid: str, capability: str, started: float):
+        self.uuid = uuid
+        self.capability = capability
+        self.state = "pending"
+        self.started = started
+        self.finished = None
+
+
+    @property
+    def duration(self) -> float:
+        """The time (in seconds) from adding the capability until its install was seen finished, None if pending
+        """
+        return None if self.finished is None else self.finished - self.started
+
+
+    def __repr__(self):
+        return f"InstallStatus('{self.uuid}', {self.capability}, {self.state}, duration={self.duration})"
+
+
+class InstallTracker():
+    """Tracks the installs of the capabilities added by the SLM client. The SLM installs capabilities (e.g. Docker, K3S)
+    as background jobs, so their completion is polled at the deployment capabilities of the resources, all resources
+    with pending installs concurrently
+
+    Example:
+        slm.add_capability(uuid, "DOCKER", "yes")   # tracked by slm.installs
+        installs = slm.installs.wait(timeout=900, max_workers=8)
+    """
+    def __init__(self, slm, initial_interval: float = 2.0, max_interval: float = 30.0):
+        self.slm = slm
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self._installs = {}
+        self._unknown = set()
+        self._lock = threading.Lock()
+
+
+    def started(self, uuid: str, capability: str):
+        """Records that the install of the capability was started now (again, if it was tracked already)
+        """
+        with self._lock:
+            self._installs[(uuid, capability)] = InstallStatus(uuid, capability, time.monotonic())
+
+
+    def installs(self) -> list:
+        """Returns the tracked installs, in the order they were started
+        """
+        with self._lock:
+            return list(self._installs.values())
+
+
+    def _check(self, uuid: str, pending: list):
+        """Fetches the deployment capabilities of a resource once, and updates its pending installs
+        """
+        entries = {entry.get("name"): entry for entry in self.slm.get_deployment_capabilities(uuid)}
+        now = time.monotonic()
+        for install in pending:
+            entry = entries.get(install.capability)
+            state = install_state(entry) if entry is not None else "pending"
+            if state is None:
+                state = "pending"
+                if (uuid, install.capability) not in self._unknown:
+                    self._unknown.add((uuid, install.capability))
+                    log.warning(f"WARNING: the state of the install of capability '{install.capability}' on resource '{uuid}' is unknown. "
+                                f"Waiting for a known state until the timeout ...", extra={"device": uuid, "fields": {"response": entry}})
+            if state != "pending":
+                install.state = state
+                install.finished = now
+                if state == "failed":
+                    log.error(f"FAILED: install of capability '{install.capability}' on resource '{uuid}' failed after {install.duration:.1f}s",
+                              extra={"device": uuid, "fields": {"response": entry}})
+                else:
+                    log.info(f"SUCCESS: installed capability '{install.capability}' on resource '{uuid}' after {install.duration:.1f}s",
+                             extra={"device": uuid})
+
+
+    def wait(self, timeout: float, max_workers: int) -> list:
+        """Polls the deployment capabilities of all resources with pending installs concurrently, until every install
+        has finished or failed, or the deadline is reached. The pause between two rounds doubles up to max_interval
+
+        Args:
+            timeout (float): the deadline (in seconds) from now
+            max_workers (int): the number of concurrent requests
+
+        Returns:
+            list: the tracked InstallStatus, pending ones are marked 'timeout'
+        """
+        deadline = time.monotonic() + timeout
+        interval = self.initial_interval
+        installs = self.installs()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                pending = {}
+                for install in installs:
+                    if install.state == "pending":
+                        pending.setdefault(install.uuid, []).append(install)
+                if not pending:
+                    break
+                list(executor.map(lambda item: self._check(*item), pending.items()))
+                if all(install.state != "pending" for installs_of in pending.values() for install in installs_of):
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                time.sleep(min(interval, remaining))
+                interval = min(interval * 2, self.max_interval)
+
+        for install in installs:
+            if install.state == "pending":
+                install.state = "timeout"
+                log.error(f"FAILED: install of capability '{install.capability}' on resource '{install.uuid}' did not finish within {timeout}s",
+                          extra={"device": install.uuid})
+        return installs
+
+
+def print_installs(installs: list):
+    """Prints the install durations per device, and the number of finished, failed and timed out installs
+    """
+    by_uuid = {}
+    for install in installs:
+        by_uuid.setdefault(install.uuid, []).append(install)
+    for uuid, installs_of in by_uuid.items():
+        if all(install.state == "installed" for install in installs_of):
+            duration = max(install.duration for install in installs_of)
+            log.info(f"{uuid}: installed {[install.capability for install in installs_of]} in {duration:.1f}s")
+        else:
+            log.warning(f"WARNING: {uuid}: {', '.join(f'{install.capability}={install.state}' for install in installs_of)}")
+    counts = {state: len([install for install in installs if install.state == state]) for state in ["installed", "failed", "timeout"]}
+    log.info(f"Installs of '{len(by_uuid)}' resources: '{counts['installed']}' installed, '{counts['failed']}' failed, '{counts['timeout']}' timed out")
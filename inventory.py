@@ -0,0 +1,394 @@
+import os
+import csv
+import json
+from uuid import uuid4
+from typing import NamedTuple
+
+# sheet column -> attribute of a DeviceRecord
+DEVICE_COLUMNS = [
+    ("UUID", "uuid"),
+    ("Device", "device"),
+    ("hostname", "hostname"),
+    ("user", "user"),
+    ("password", "password"),
+    ("eth0 IP", "eth0_ip"),
+    ("eth1 IP", "eth1_ip"),
+    ("is_resource", "is_resource"),
+    ("connection-type", "connection_type"),
+    ("connection-port", "connection_port"),
+    ("location-uuid", "location_uuid"),
+    ("aasx-filter-substring", "aasx_filter"),
+]
+
+# prefix of the columns holding the capability flags ('yes', 'skip' or '-')
+CAPABILITY_PREFIX = "DC_"
+
+# EXCEL column of a capability flag -> capability name known by the slmClient
+CAPABILITY_COLUMNS = [
+    ("DC_Dummy", "DUMMY"),
+    ("DC_Docker", "DOCKER"),
+    ("DC_Transferapp", "TRANSFERAPP"),
+    ("DC_Swarm", "DOCKER_SWARM"),
+    ("DC_K3S", "K3S"),
+]
+
+LOCATIONS_SHEET = "LOCATIONS"
+SERVICE_GROUPS_SHEET = "SERVICE_GROUPS"
+# the columns of the location and service group sheets
+NAMED_COLUMNS = ["UUID", "Name"]
+
+
+class ColumnError(ValueError):
+    """A required column is missing in a sheet of the inventory
+    """
+    def __init__(self, sheet: str, column: str):
+        super().__init__(f"sheet '{sheet}' has no column '{column}'")
+        self.sheet = sheet
+        self.column = column
+
+
+class DeviceRecord():
+    """A device of the inventory. Empty cells are None, capability flags are kept by column (e.g. 'DC_Docker')
+    """
+    __slots__ = tuple(attribute for _, attribute in DEVICE_COLUMNS) + ("capabilities", "row")
+
+    def __init__(self, uuid: str = None, device: str = None, hostname: str = None, user: str = None, password: str = None,
+                 eth0_ip: str = None, eth1_ip: str = None, is_resource: bool = False, connection_type: str = None,
+                 connection_port: int = None, location_uuid: str = None, aasx_filter: str = None, capabilities: dict = None,
+                 row: int = None):
+        self.uuid = uuid
+        self.device = device
+        self.hostname = hostname
+        self.user = user
+        self.password = password
+        self.eth0_ip = eth0_ip
+        self.eth1_ip = eth1_ip
+        self.is_resource = is_resource
+        self.connection_type = connection_type
+        self.connection_port = connection_port
+        self.location_uuid = location_uuid
+        self.aasx_filter = aasx_filter
+        self.capabilities = capabilities or {}
+        # the row in the source file (see load_inventory), None if the record was not loaded from a file
+        self.row = row
+
+
+    @property
+    def ip(self) -> str:
+        """The IP of the resource: eth0, unless it is not set ('-')
+        """
+        return self.eth0_ip if self.eth0_ip not in ["-", None] else self.eth1_ip
+
+
+    def __repr__(self):
+        return f"DeviceRecord('{self.uuid}', '{self.hostname}')"
+
+
+class NamedRecord():
+    """A location or service group of the inventory
+    """
+    __slots__ = ("uuid", "name", "row")
+
+    def __init__(self, uuid: str, name: str, row: int = None):
+        self.uuid = uuid
+        self.name = name
+        self.row = row
+
+
+    def __repr__(self):
+        return f"NamedRecord('{self.uuid}', '{self.name}')"
+
+
+class CapabilityRecord(NamedTuple):
+    """A capability requested for a device: the capability name known by the slmClient (e.g. 'DOCKER') and the
+    flag of its column ('yes', or 'skip' to register it without installing). A tuple, so it unpacks as (name, flag)
+    """
+    name: str
+    flag: str
+
+
+class Inventory():
+    """The devices, locations and service groups of an inventory file, indexed by uuid (and the devices by location),
+    so lookups do not scan the lists
+    """
+    __slots__ = ("devices", "locations", "service_groups", "resources", "without_uuid", "by_uuid", "by_location", "locations_by_uuid", "service_groups_by_uuid")
+
+    def __init__(self, devices: list, locations: list = None, service_groups: list = None, without_uuid: list = None):
+        self.devices = devices
+        self.locations = locations
+        self.service_groups = service_groups
+        # the resource rows without UUID, which are skipped (unless GENERATE_UUID is set)
+        self.without_uuid = without_uuid or []
+        self.resources = [device for device in devices if device.is_resource]
+        # the first row of a uuid wins, as in deduplicate
+        self.by_uuid = {}
+        self.by_location = {}
+        for device in devices:
+            self.by_uuid.setdefault(device.uuid, device)
+            self.by_location.setdefault(device.location_uuid, []).append(device)
+        self.locations_by_uuid = {}
+        for location in locations or []:
+            self.locations_by_uuid.setdefault(location.uuid, location)
+        self.service_groups_by_uuid = {}
+        for group in service_groups or []:
+            self.service_groups_by_uuid.setdefault(group.uuid, group)
+
+
+    def deduplicate(self) -> list:
+        """Drops the resources, locations and service groups, whose uuid was listed in an earlier row already,
+        so every uuid is written once (and is a single task of the task graph)
+
+        Returns:
+            list: the dropped records, as (sheet kind, record) pairs: 'resource', 'location' or 'service_group'
+        """
+        dropped = []
+
+        def unique(kind, records):
+            if records is None:
+                return None
+            seen = set()
+            kept = []
+            for record in records:
+                if record.uuid in seen:
+                    dropped.append((kind, record))
+                else:
+                    seen.add(record.uuid)
+                    kept.append(record)
+            return kept
+
+        self.resources = unique("resource", self.resources)
+        self.locations = unique("location", self.locations)
+        self.service_groups = unique("service_group", self.service_groups)
+        return dropped
+
+
+    @property
+    def device_uuids(self) -> set:
+        """The uuids of all devices, including those which are no resources (a set-like view of the index)
+        """
+        return self.by_uuid.keys()
+
+
+    def device(self, uuid: str) -> DeviceRecord:
+        """Returns the device with the given uuid, None if it is not in the inventory
+        """
+        return self.by_uuid.get(uuid)
+
+
+    def devices_at(self, location_uuid: str) -> list:
+        """Returns the devices at the given location (None for devices without location)
+        """
+        return self.by_location.get(location_uuid, [])
+
+
+    def unknown_locations(self) -> set:
+        """Returns the location uuids referenced by devices, which are not listed in the locations of the inventory
+        """
+        return {uuid for uuid in self.by_location if uuid is not None and uuid not in self.locations_by_uuid}
+
+
+def _cell(value):
+    """Normalizes a cell: blank cells (and NaN) become None, everything else a stripped string
+    """
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value if value else None
+
+
+def _port(value) -> int:
+    """Parses the connection port, None if it is not a number (e.g. '-')
+    """
+    try:
+        return round(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _device_records(header: list, rows, generate_uuid: bool = False, first_row: int = 2) -> tuple:
+    """Builds the device records of a table, reading the columns by position
+
+    Args:
+        header (list): the column names
+        rows (iterable): the rows, as sequences of cell values in the order of the header
+        first_row (int): the row number of the first row in the source file (see load_inventory)
+        generate_uuid (bool): GENERATE_UUID, resource rows without UUID get a generated one (the uuid of the sheet is not sent)
+
+    Returns:
+        tuple: the DeviceRecords, and the resource rows without UUID, which are skipped (unless generate_uuid is set)
+    """
+    positions = {column: index for index, column in enumerate(header) if column is not None}
+    columns = [(attribute, positions.get(column)) for column, attribute in DEVICE_COLUMNS]
+    capability_columns = [(column, index) for column, index in positions.items() if str(column).startswith(CAPABILITY_PREFIX)]
+
+    devices = []
+    without_uuid = []
+    for number, row in enumerate(rows, start=first_row):
+        values = {attribute: (_cell(row[index]) if index is not None and index < len(row) else None) for attribute, index in columns}
+        values["is_resource"] = values["is_resource"] == "yes"
+        values["row"] = number
+        if values["uuid"] is None:
+            if not values["is_resource"]:
+                continue
+            if not generate_uuid:
+                without_uuid.append(DeviceRecord(**values))
+                continue
+            values["uuid"] = str(uuid4())
+        values["connection_port"] = _port(values["connection_port"])
+        values["capabilities"] = {column: _cell(row[index]) for column, index in capability_columns if index < len(row)}
+        devices.append(DeviceRecord(**values))
+    return devices, without_uuid
+
+
+def _named_records(sheet: str, header: list, rows, first_row: int = 2) -> list:
+    """Builds the location or service group records of a table, rows without UUID are skipped
+
+    Raises:
+        ColumnError: if the table has no 'UUID' or 'Name' column
+    """
+    positions = {column: index for index, column in enumerate(header)}
+    missing = [column for column in NAMED_COLUMNS if column not in positions]
+    if missing:
+        raise ColumnError(sheet, missing[0])
+    uuid_index, name_index = positions["UUID"], positions["Name"]
+    records = []
+    for number, row in enumerate(rows, start=first_row):
+        uuid = _cell(row[uuid_index]) if uuid_index < len(row) else None
+        if uuid is not None:
+            records.append(NamedRecord(uuid, _cell(row[name_index]) if name_index < len(row) else None, number))
+    return records
+
+
+def _load_xlsx(path: str, sheet_name: str) -> tuple:
+    """Reads the device, location and service group sheets, parsing the workbook only once
+
+    Returns:
+        tuple: the tables (header, rows) by sheet name, None for missing sheets
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        tables = {}
+        for name in [sheet_name, LOCATIONS_SHEET, SERVICE_GROUPS_SHEET]:
+            if name not in workbook.sheetnames:
+                tables[name] = None
+                continue
+            rows = workbook[name].iter_rows(values_only=True)
+            header = list(next(rows, []))
+            tables[name] = (header, list(rows))
+        return tables
+    finally:
+        workbook.close()
+
+
+def _load_csv(path: str) -> tuple:
+    """Reads a CSV table
+
+    Returns:
+        tuple: the header and the rows
+    """
+    with open(path, newline="", encoding="utf-8-sig") as csv_file:
+        rows = csv.reader(csv_file)
+        header = next(rows, [])
+        return header, list(rows)
+
+
+def _load_parquet(path: str) -> tuple:
+    """Reads a Parquet table (requires the optional dependency pyarrow)
+
+    Raises:
+        ValueError: if pyarrow is not installed
+
+    Returns:
+        tuple: the header and the rows
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("reading Parquet inventories requires the optional dependency 'pyarrow' (pip install pyarrow)")
+
+    table = pq.read_table(path)
+    return table.column_names, list(zip(*(column.to_pylist() for column in table.columns)))
+
+
+def _load_json(path: str, sheet_name: str) -> dict:
+    """Reads a JSON inventory: either a list of device objects,
+    or an object with a list of objects per sheet name (e.g. {"DEVICES": [...], "LOCATIONS": [...]})
+
+    Returns:
+        dict: the tables (header, rows) by sheet name, None for missing sheets
+    """
+    with open(path) as json_file:
+        content = json.load(json_file)
+    if isinstance(content, list):
+        content = {sheet_name: content}
+
+    tables = {}
+    for name in [sheet_name, LOCATIONS_SHEET, SERVICE_GROUPS_SHEET]:
+        objects = content.get(name)
+        if objects is None:
+            tables[name] = None
+            continue
+        header = list(dict.fromkeys(key for item in objects for key in item))
+        tables[name] = (header, [[item.get(key) for key in header] for item in objects])
+    return tables
+
+
+def _sibling_tables(path: str, sheet_name: str, load) -> dict:
+    """Reads a single-table inventory (CSV or Parquet). Locations and service groups are read
+    from the files next to it, named after the sheet (e.g. 'devices.LOCATIONS.csv'), if they exist
+
+    Returns:
+        dict: the tables (header, rows) by sheet name, None for missing sheets
+    """
+    stem, extension = os.path.splitext(path)
+    tables = {sheet_name: load(path)}
+    for name in [LOCATIONS_SHEET, SERVICE_GROUPS_SHEET]:
+        sibling = f"{stem}.{name}{extension}"
+        tables[name] = load(sibling) if os.path.exists(sibling) else None
+    return tables
+
+
+def load_inventory(path: str, sheet_name: str = "DEVICES", generate_uuid: bool = False) -> Inventory:
+    """Loads the inventory from an EXCEL workbook (parsed once), or from a CSV, Parquet or JSON file
+
+    Args:
+        path (str): the path of the inventory file
+        sheet_name (str): the sheet (or JSON key) with the devices
+        generate_uuid (bool): GENERATE_UUID, resources without UUID are kept (with a generated uuid) instead of skipped
+
+    Raises:
+        ValueError: if the file type is not supported or the sheet is missing, ColumnError if a required column is missing
+
+    Returns:
+        Inventory: the devices, locations and service groups. Locations and service groups are None if missing.
+            The records carry their row in the file: the row number of EXCEL and CSV (the header is row 1),
+            the number of the entry (from 1) of JSON and Parquet
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in [".xlsx", ".xlsm"]:
+        tables = _load_xlsx(path, sheet_name)
+    elif extension == ".csv":
+        tables = _sibling_tables(path, sheet_name, _load_csv)
+    elif extension == ".parquet":
+        tables = _sibling_tables(path, sheet_name, _load_parquet)
+    elif extension == ".json":
+        tables = _load_json(path, sheet_name)
+    else:
+        raise ValueError(f"unsupported inventory file type '{extension}' (use .xlsx, .csv, .parquet or .json)")
+
+    if tables[sheet_name] is None:
+        raise ValueError(f"sheet '{sheet_name}' does not exist in file '{path}'")
+
+    # the header is the first row of EXCEL and CSV files, JSON and Parquet entries are numbered from 1
+    first_row = 2 if extension in [".xlsx", ".xlsm", ".csv"] else 1
+    devices, without_uuid = _device_records(*tables[sheet_name], generate_uuid=generate_uuid, first_row=first_row)
+    return Inventory(
+        devices=devices,
+        without_uuid=without_uuid,
+        locations=_named_records(LOCATIONS_SHEET, *tables[LOCATIONS_SHEET], first_row) if tables[LOCATIONS_SHEET] is not None else None,
+        service_groups=_named_records(SERVICE_GROUPS_SHEET, *tables[SERVICE_GROUPS_SHEET], first_row) if tables[SERVICE_GROUPS_SHEET] is not None else None
+    )
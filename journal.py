@@ -0,0 +1,86 @@
+import os
+import json
+import time
+import threading
+
+from structuredLog import get_logger
+
+log = get_logger("journal")
+
+
+class ProgressJournal():
+    """Append-only JSONL journal of the completed steps per device UUID (e.g. resource created,
+    capability added, AASX uploaded), used to resume an interrupted run. Without a path the journal is disabled.
+    """
+    def __init__(self, path: str = None, resume: bool = False):
+        self.path = path
+        self._completed = {}
+        self._lock = threading.Lock()
+        self._file = None
+
+        if path is None:
+            return
+
+        if resume and os.path.exists(path):
+            with open(path) as journal_file:
+                for line in journal_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # a line may be incomplete, if the last run was killed while writing it
+                        continue
+                    self._completed.setdefault((entry["uuid"], entry["step"]), []).append(entry.get("detail"))
+            log.info(f"Resuming from journal '{path}' ('{sum(map(len, self._completed.values()))}' completed steps)")
+
+        # start a new journal, unless resuming
+        self._file = open(path, "a" if resume else "w", buffering=1)
+
+
+    def is_done(self, uuid: str, step: str, detail: str = None) -> bool:
+        """Checks if the step was completed in the journaled run
+
+        Args:
+            uuid (str): the uuid of the device (or '*' for global steps)
+            step (str): the step, e.g. 'resource', 'capability', 'submodel'
+            detail (str): the detail of the step (e.g. capability name or AASX path), None to match any
+
+        Returns:
+            bool: True if the step was completed
+        """
+        with self._lock:
+            details = self._completed.get((uuid, step), [])
+            return len(details) > 0 if detail is None else detail in details
+
+
+    def detail(self, uuid: str, step: str) -> str:
+        """Returns the detail of the last completion of the step, e.g. a generated resource uuid
+
+        Returns:
+            str: the detail, or None if the step was not completed
+        """
+        with self._lock:
+            details = self._completed.get((uuid, step), [])
+            return details[-1] if details else None
+
+
+    def record(self, uuid: str, step: str, detail: str = None):
+        """Records a completed step, the line is written through immediately
+
+        Args:
+            uuid (str): the uuid of the device (or '*' for global steps)
+            step (str): the step, e.g. 'resource', 'capability', 'submodel'
+            detail (str): the detail of the step (e.g. capability name or AASX path)
+        """
+        with self._lock:
+            self._completed.setdefault((uuid, step), []).append(detail)
+            if self._file is not None:
+                self._file.write(json.dumps({"ts": time.time(), "uuid": uuid, "step": step, "detail": detail}) + "\n")
+
+
+    def close(self):
+        """Closes the journal file
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
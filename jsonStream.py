@@ -0,0 +1,94 @@
+import json
+import codecs
+
+WHITESPACE = " \t\n\r"
+
+
+class JsonArrayDecoder():
+    """Decodes the elements of a top-level JSON array incrementally, while the body is received in chunks.
+    Only the current (incomplete) element is buffered, so memory stays flat however long the array is
+
+    Example:
+        decoder = JsonArrayDecoder()
+        for chunk in res.iter_content(chunk_size=65536):
+            for item in decoder.feed(chunk):
+                ...
+        decoder.close()
+    """
+    def __init__(self):
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._started = False
+        self._done = False
+
+
+    def feed(self, chunk: bytes) -> list:
+        """Adds the next chunk of the body
+
+        Args:
+            chunk (bytes): the received bytes
+
+        Raises:
+            ValueError: if the body is no JSON array
+
+        Returns:
+            list: the elements completed by this chunk
+        """
+        if self._done:
+            return []
+        self._buffer += self._text.decode(chunk)
+        items = []
+        position = 0
+        while True:
+            while position < len(self._buffer) and self._buffer[position] in WHITESPACE + ("," if self._started else ""):
+                position += 1
+            if position >= len(self._buffer):
+                break
+            if not self._started:
+                if self._buffer[position] != "[":
+                    raise ValueError(f"expected a JSON array, got '{self._buffer[position:position + 20]}'")
+                self._started = True
+                position += 1
+                continue
+            if self._buffer[position] == "]":
+                self._done = True
+                position += 1
+                break
+            try:
+                item, end = self._decoder.raw_decode(self._buffer, position)
+            except json.JSONDecodeError:
+                # the element is not complete yet
+                break
+            if end >= len(self._buffer):
+                # a number (or literal) at the end of the chunk may continue in the next one
+                break
+            items.append(item)
+            position = end
+        self._buffer = self._buffer[position:]
+        return items
+
+
+    def close(self):
+        """Checks that the array was complete
+
+        Raises:
+            ValueError: if the body ended within the array
+        """
+        if not self._done:
+            raise ValueError("JSON array ended unexpectedly")
+
+
+def iter_json_array(chunks):
+    """Yields the elements of a top-level JSON array from an iterable of byte chunks
+
+    Args:
+        chunks: the chunks of the body, e.g. requests' res.iter_content()
+
+    Raises:
+        ValueError: if the body is no (complete) JSON array
+    """
+    decoder = JsonArrayDecoder()
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+    decoder.close()
@@ -0,0 +1,263 @@
+import re
+import json
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from structuredLog import get_logger, SUMMARY_LOGGER
+
+log = get_logger("metrics")
+summary_log = logging.getLogger(SUMMARY_LOGGER)
+
+# uuids (and numeric ids) in url paths are replaced, so all requests of an endpoint are counted together
+ID_PATTERN = re.compile(r"/([0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}|\d+)(?=/|$)")
+
+# upper bounds (in seconds) of the latency histogram buckets of the Prometheus export
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+
+PERCENTILES = [50, 95, 99]
+
+
+def endpoint_of(method: str, url: str) -> str:
+    """Returns the endpoint of a request, e.g. 'PUT /resources/{id}/capabilities'
+
+    Args:
+        method (str): the HTTP method
+        url (str): the full url of the request
+
+    Returns:
+        str: the method and the path template, without host and query
+    """
+    return f"{method.upper()} {ID_PATTERN.sub('/{id}', urlparse(url).path)}"
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """Returns the p-th percentile (nearest rank) of the sorted values, None if empty
+    """
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def _rounded(value: float) -> float:
+    """Rounds a duration to microseconds, keeping None
+    """
+    return None if value is None else round(value, 6)
+
+
+class EndpointStats():
+    """The requests of one endpoint
+    """
+    __slots__ = ("count", "latencies", "status_codes", "retries", "bytes_uploaded", "throttled")
+
+    def __init__(self):
+        self.count = 0
+        self.latencies = []
+        self.status_codes = {}
+        self.retries = 0
+        self.bytes_uploaded = 0
+        self.throttled = 0.0
+
+
+    def to_dict(self) -> dict:
+        """Returns the counts and the latency percentiles of the endpoint
+        """
+        latencies = sorted(self.latencies)
+        return {
+            "requests": self.count,
+            "status_codes": dict(sorted(self.status_codes.items())),
+            "retries": self.retries,
+            "bytes_uploaded": self.bytes_uploaded,
+            "throttled_seconds": round(self.throttled, 6),
+            "latency_seconds": {
+                "mean": _rounded(sum(latencies) / len(latencies) if latencies else None),
+                **{f"p{p}": _rounded(percentile(latencies, p)) for p in PERCENTILES},
+                "max": _rounded(latencies[-1] if latencies else None),
+                "total": round(sum(latencies), 6)
+            }
+        }
+
+
+class StageStats():
+    """The timing of one stage. A stage may run several times (e.g. once per device pipeline),
+    so both the summed time and the wall-clock span (first start to last end) are kept
+    """
+    __slots__ = ("count", "total", "first_start", "last_end")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.first_start = None
+        self.last_end = None
+
+
+    def to_dict(self) -> dict:
+        """Returns the number of runs, the wall-clock span and the summed time of the stage
+        """
+        return {
+            "runs": self.count,
+            "wall_clock_seconds": round(self.last_end - self.first_start, 6) if self.count else 0.0,
+            "total_seconds": round(self.total, 6)
+        }
+
+
+class Metrics():
+    """Thread-safe instrumentation of a run: per-endpoint requests (latency, status codes, retries,
+    uploaded bytes) and per-stage timing, exported as JSON report or in Prometheus text format
+    """
+    def __init__(self):
+        self._endpoints = {}
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+
+
+    def record_request(self, method: str, url: str, status, latency: float, bytes_uploaded: int = 0, throttled: float = 0.0):
+        """Records a finished request
+
+        Args:
+            method (str): the HTTP method
+            url (str): the full url of the request
+            status (int|str): the status code, or the name of the exception if the request failed
+            latency (float): the time (in seconds) until the response was received
+            bytes_uploaded (int): the size of the sent body
+            throttled (float): the time (in seconds) the request was held back by the rate limiter
+        """
+        endpoint = endpoint_of(method, url)
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, EndpointStats())
+            stats.count += 1
+            stats.latencies.append(latency)
+            stats.status_codes[str(status)] = stats.status_codes.get(str(status), 0) + 1
+            stats.bytes_uploaded += bytes_uploaded
+            stats.throttled += throttled
+
+
+    def record_retry(self, method: str, url: str):
+        """Records that a request is sent again (e.g. after a 401 or a transient failure)
+        """
+        endpoint = endpoint_of(method, url)
+        with self._lock:
+            self._endpoints.setdefault(endpoint, EndpointStats()).retries += 1
+
+
+    @contextmanager
+    def stage(self, name: str):
+        """Times the enclosed block as (one run of) the given stage
+
+        Args:
+            name (str): the stage, e.g. 'locations', 'create', 'aasx'
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            end = time.monotonic()
+            with self._lock:
+                stats = self._stages.setdefault(name, StageStats())
+                stats.count += 1
+                stats.total += end - start
+                stats.first_start = start if stats.first_start is None else min(stats.first_start, start)
+                stats.last_end = end if stats.last_end is None else max(stats.last_end, end)
+
+
+    def report(self) -> dict:
+        """Returns the machine-readable report of the run
+
+        Returns:
+            dict: the totals, the stats per endpoint (sorted by summed latency) and per stage
+        """
+        with self._lock:
+            endpoints = {endpoint: stats.to_dict() for endpoint, stats in self._endpoints.items()}
+            stages = {name: stats.to_dict() for name, stats in self._stages.items()}
+        elapsed = time.monotonic() - self._started
+        requests_total = sum(stats["requests"] for stats in endpoints.values())
+        return {
+            "elapsed_seconds": round(elapsed, 6),
+            "requests_total": requests_total,
+            "requests_per_second": round(requests_total / elapsed, 3) if elapsed > 0 else None,
+            "retries_total": sum(stats["retries"] for stats in endpoints.values()),
+            "bytes_uploaded_total": sum(stats["bytes_uploaded"] for stats in endpoints.values()),
+            "throttled_seconds_total": round(sum(stats["throttled_seconds"] for stats in endpoints.values()), 6),
+            "endpoints": dict(sorted(endpoints.items(), key=lambda item: -item[1]["latency_seconds"]["total"])),
+            "stages": stages
+        }
+
+
+    def to_prometheus(self, prefix: str = "slm_init") -> str:
+        """Returns the metrics in the Prometheus text exposition format
+
+        Args:
+            prefix (str): the prefix of all metric names
+
+        Returns:
+            str: the metrics
+        """
+        def labels(**values):
+            escaped = {key: str(value).replace("\\", "\\\\").replace('"', '\\"') for key, value in values.items()}
+            return "{" + ",".join(f'{key}="{value}"' for key, value in escaped.items()) + "}"
+
+        with self._lock:
+            endpoints = {endpoint: (stats.count, list(stats.latencies), dict(stats.status_codes), stats.retries, stats.bytes_uploaded)
+                         for endpoint, stats in self._endpoints.items()}
+            stages = {name: stats.to_dict() for name, stats in self._stages.items()}
+
+        lines = [
+            f"# HELP {prefix}_requests_total Requests sent to the SLM, by endpoint and status code",
+            f"# TYPE {prefix}_requests_total counter"
+        ]
+        for endpoint, (_, _, status_codes, _, _) in endpoints.items():
+            for status, count in sorted(status_codes.items()):
+                lines.append(f"{prefix}_requests_total{labels(endpoint=endpoint, status=status)} {count}")
+
+        lines += [f"# HELP {prefix}_retries_total Requests sent again, by endpoint", f"# TYPE {prefix}_retries_total counter"]
+        lines += [f"{prefix}_retries_total{labels(endpoint=endpoint)} {retries}" for endpoint, (_, _, _, retries, _) in endpoints.items()]
+
+        lines += [f"# HELP {prefix}_uploaded_bytes_total Bytes of the sent bodies, by endpoint", f"# TYPE {prefix}_uploaded_bytes_total counter"]
+        lines += [f"{prefix}_uploaded_bytes_total{labels(endpoint=endpoint)} {size}" for endpoint, (_, _, _, _, size) in endpoints.items()]
+
+        lines += [f"# HELP {prefix}_request_duration_seconds Latency of the requests, by endpoint", f"# TYPE {prefix}_request_duration_seconds histogram"]
+        for endpoint, (count, latencies, _, _, _) in endpoints.items():
+            for bucket in LATENCY_BUCKETS:
+                lines.append(f"{prefix}_request_duration_seconds_bucket{labels(endpoint=endpoint, le=bucket)} {len([latency for latency in latencies if latency <= bucket])}")
+            lines.append(f"{prefix}_request_duration_seconds_bucket{labels(endpoint=endpoint, le='+Inf')} {count}")
+            lines.append(f"{prefix}_request_duration_seconds_sum{labels(endpoint=endpoint)} {sum(latencies)}")
+            lines.append(f"{prefix}_request_duration_seconds_count{labels(endpoint=endpoint)} {count}")
+
+        lines += [f"# HELP {prefix}_stage_seconds Wall-clock time of the stages of the run", f"# TYPE {prefix}_stage_seconds gauge"]
+        lines += [f"{prefix}_stage_seconds{labels(stage=name)} {stats['wall_clock_seconds']}" for name, stats in stages.items()]
+        return "\n".join(lines) + "\n"
+
+
+    def write_json(self, path: str):
+        """Writes the report as JSON file
+        """
+        with open(path, "w") as report_file:
+            json.dump(self.report(), report_file, indent=2)
+        log.info(f"Wrote metrics report to '{path}'")
+
+
+    def write_prometheus(self, path: str):
+        """Writes the metrics as Prometheus text file (e.g. for the node exporter textfile collector)
+        """
+        with open(path, "w") as metrics_file:
+            metrics_file.write(self.to_prometheus())
+        log.info(f"Wrote Prometheus metrics to '{path}'")
+
+
+    def print_endpoints(self):
+        """Prints the requests, status codes and latency percentiles per endpoint, slowest (in total) first
+        """
+        report = self.report()
+        log.info(f"{'ENDPOINT':<58} {'REQUESTS':>8} {'P50':>8} {'P95':>8} {'P99':>8} {'RETRIES':>7}  STATUS CODES")
+        for endpoint, stats in report["endpoints"].items():
+            latency = stats["latency_seconds"]
+            log.info(f"{endpoint:<58} {stats['requests']:>8} {latency['p50'] or 0:>8.3f} {latency['p95'] or 0:>8.3f} {latency['p99'] or 0:>8.3f} {stats['retries']:>7}  {stats['status_codes']}")
+        for name, stats in report["stages"].items():
+            log.info(f"Stage '{name}': {stats['wall_clock_seconds']:.2f}s wall clock ({stats['runs']} runs, {stats['total_seconds']:.2f}s in total)")
+        summary_log.info(f"Requests: '{report['requests_total']}' in total ({report['requests_per_second']} per second), '{report['retries_total']}' retries, '{report['bytes_uploaded_total']}' bytes uploaded, "
+                         f"{report['throttled_seconds_total']:.2f}s throttled")
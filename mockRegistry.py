@@ -0,0 +1,313 @@
+import re
+import json
+import hashlib
+import time
+import random
+import socket
+import threading
+from argparse import ArgumentParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from slmClient import CAPABILITY_NAME_TO_ID, RESOURCE_FIELDS
+
+CAPABILITY_ID_TO_NAME = {capability_id: name for name, capability_id in CAPABILITY_NAME_TO_ID.items()}
+
+ID_PATTERN = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+
+
+class MockRegistryState():
+    """The in-memory state of the mock SLM (resources, locations, service groups, capabilities and submodels).
+    Created and deleted resources become visible to reads only after the consistency delay, installed capabilities
+    are reported as installed only after the install time
+    """
+    def __init__(self, consistency_delay: float = 0.0, install_time: float = 0.0):
+        self.consistency_delay = consistency_delay
+        self.install_time = install_time
+        self.lock = threading.Lock()
+        self.reset()
+
+
+    def reset(self):
+        """Clears the state and the request counts
+        """
+        with self.lock:
+            self.resources = {}
+            self.locations = {}
+            self.groups = {}
+            self.capabilities = {}
+            self.submodels = {}
+            self.requests = {}
+
+
+    def visible_resources(self) -> list:
+        """Returns the resources, which are visible to reads at the moment
+        """
+        now = time.monotonic()
+        return [entry["item"] for entry in self.resources.values() if entry["visible_at"] <= now and (entry["gone_at"] is None or entry["gone_at"] > now)]
+
+
+    def count(self, endpoint: str):
+        """Counts a request of the endpoint
+        """
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+
+class MockRegistryHandler(BaseHTTPRequestHandler):
+    """Implements the endpoints of Keycloak, the resource registry and the service registry used by the slmClient.
+    Every request is delayed by the configured latency and fails with 503 at the configured error rate.
+    GET responses carry an ETag, and are answered with 304 if it matches If-None-Match
+    """
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # send headers and body without waiting for the ACK of the client (no Nagle delay)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+    def log_message(self, *args):
+        pass
+
+
+    def do_GET(self):
+        self._handle("GET")
+
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+    def _respond(self, status: int, body=None, method: str = None):
+        data = b"" if body is None else json.dumps(body).encode()
+        etag = None
+        if method == "GET" and status == 200:
+            # lists and items can be revalidated with If-None-Match
+            etag = f'"{hashlib.sha1(data).hexdigest()}"'
+            if self.headers.get("If-None-Match") == etag:
+                status, data = 304, b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+    def _handle(self, method: str):
+        config = self.server.config
+        state = self.server.state
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        # the mock's own endpoints are neither delayed nor failed
+        if url.path == "/mock/stats":
+            with state.lock:
+                return self._respond(200, {"requests": dict(state.requests), "resources": len(state.visible_resources()), "submodels": sum(map(len, state.submodels.values()))})
+        if url.path == "/mock/reset" and method == "POST":
+            state.reset()
+            return self._respond(200)
+
+        state.count(f"{method} {ID_PATTERN.sub('{id}', url.path)}")
+        time.sleep(max(config["latency"] + random.uniform(-config["jitter"], config["jitter"]), 0))
+        if random.random() < config["error_rate"]:
+            return self._respond(503, {"error": "injected failure"})
+
+        with state.lock:
+            status, response = self._route(method, url.path, query, body, state)
+        self._respond(status, response, method)
+
+
+    def _route(self, method: str, path: str, query: dict, body: bytes, state: MockRegistryState) -> tuple:
+        """Applies the request to the state
+
+        Returns:
+            tuple: the status code and the (JSON) body of the response
+        """
+        if path.endswith("/protocol/openid-connect/token") and method == "POST":
+            form = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+            if form.get("grant_type") == "password" and not form.get("username"):
+                return 401, {"error": "invalid_grant", "error_description": "Invalid user credentials"}
+            return 200, {
+                "access_token": f"mock-{time.time()}",
+                "expires_in": self.server.config["token_ttl"],
+                "refresh_token": f"mock-refresh-{time.time()}",
+                "refresh_expires_in": self.server.config["token_ttl"] * 6
+            }
+
+        if path == "/resources/locations":
+            if method == "GET":
+                return 200, list(state.locations.values())
+            if method == "POST":
+                state.locations[query["id"]] = {"id": query["id"], "name": query.get("name")}
+                return 201, state.locations[query["id"]]
+            if method == "DELETE":
+                state.locations.pop(query.get("id"), None)
+                return 200, None
+
+        if path == "/services/instances/groups":
+            if method == "GET":
+                return 200, list(state.groups.values())
+            if method == "DELETE":
+                state.groups.pop(query.get("id"), None)
+                return 200, None
+        match = re.fullmatch(r"/services/instances/groups/([^/]+)", path)
+        if match and method == "PUT":
+            state.groups[match.group(1)] = json.loads(body or b"{}")
+            return 200, None
+
+        if path == "/resources" and method == "GET":
+            resources = state.visible_resources()
+            if "size" in query:
+                size = int(query["size"])
+                return 200, resources[int(query.get("page", 0)) * size:][:size]
+            return 200, resources
+
+        match = re.fullmatch(r"/resources/([^/]+)(/[^/]+)?", path)
+        if match is None:
+            return 404, {"error": f"unknown endpoint '{method} {path}'"}
+        uuid, sub_path = match.groups()
+        entry = state.resources.get(uuid)
+        now = time.monotonic()
+
+        if sub_path is None:
+            if method == "GET":
+                visible = entry is not None and entry["visible_at"] <= now and (entry["gone_at"] is None or entry["gone_at"] > now)
+                return (200, entry["item"]) if visible else (404, {"error": "resource not found"})
+            if method == "PUT":
+                form = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+                state.resources[uuid] = {
+                    "item": {"id": uuid, **{field: form.get(key) for key, field in RESOURCE_FIELDS.items()}},
+                    "visible_at": now + state.consistency_delay if entry is None or entry["gone_at"] is not None else entry["visible_at"],
+                    "gone_at": None
+                }
+                return 201, state.resources[uuid]["item"]
+            if method == "DELETE":
+                if entry is None or entry["gone_at"] is not None:
+                    return 404, {"error": "resource not found"}
+                entry["gone_at"] = now + state.consistency_delay
+                state.capabilities.pop(uuid, None)
+                state.submodels.pop(uuid, None)
+                return 200, None
+
+        if entry is None or entry["gone_at"] is not None:
+            return 404, {"error": "resource not found"}
+        if sub_path == "/deployment-capabilities" and method == "GET":
+            installed_at = state.capabilities.get(uuid, {})
+            return 200, [{"name": name, "installed": installed_at[name] <= now} for name in sorted(installed_at)]
+        if sub_path == "/capabilities" and method == "PUT":
+            name = CAPABILITY_ID_TO_NAME.get(query.get("capabilityId"), query.get("capabilityId"))
+            state.capabilities.setdefault(uuid, {})[name] = now + (0.0 if query.get("skipInstall") == "true" else state.install_time)
+            return 200, {}
+        if sub_path == "/submodels" and method == "POST":
+            state.submodels.setdefault(uuid, []).append(len(body))
+            return 201, {}
+        return 404, {"error": f"unknown endpoint '{method} {path}'"}
+
+
+class MockRegistry():
+    """A local stand-in for the SLM (Keycloak, resource registry and service registry on one port),
+    with injected latency, error rate, eventual consistency and install time. Runs in a background thread
+
+    Example:
+        with MockRegistry(latency=0.01) as registry:
+            slm = slmClient(registry.url, registry.url, registry.url, registry.url, "fabos", "password")
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, consistency_delay: float = 0.0, token_ttl: int = 300, install_time: float = 0.0):
+        self.state = MockRegistryState(consistency_delay=consistency_delay, install_time=install_time)
+        self.server = ThreadingHTTPServer((host, port), MockRegistryHandler)
+        self.server.daemon_threads = True
+        self.server.state = self.state
+        self.server.config = {"latency": latency, "jitter": jitter, "error_rate": error_rate, "token_ttl": token_ttl}
+        self._thread = None
+
+
+    @property
+    def url(self) -> str:
+        """The base url of all registries, e.g. 'http://127.0.0.1:9010'
+        """
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+    @property
+    def requests(self) -> dict:
+        """The number of requests by endpoint, e.g. 'PUT /resources/{id}'
+        """
+        with self.state.lock:
+            return dict(self.state.requests)
+
+
+    def start(self):
+        """Serves requests in a background thread
+        """
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+
+    def stop(self):
+        """Stops serving and closes the socket
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def build_argparser():
+    """
+    Parse command line arguments.
+    :return: command line arguments
+    """
+    parser = ArgumentParser(description="Local mock of the SLM registries (Keycloak, resource registry, service registry)")
+    parser.add_argument("--host", default="127.0.0.1", help="(optional) The interface to listen on")
+    parser.add_argument("--port", default=9010, type=int, help="(optional) The port to listen on")
+    parser.add_argument("--latency", default=0.0, type=float, help="(optional) The delay (in seconds) added to every request")
+    parser.add_argument("--jitter", default=0.0, type=float, help="(optional) The random variation (in seconds) of the delay")
+    parser.add_argument("--error-rate", default=0.0, type=float, help="(optional) The share of requests failing with 503 (0..1)")
+    parser.add_argument("--consistency-delay", default=0.0, type=float,
+                        help="(optional) The time (in seconds) until created or deleted resources are visible to reads")
+    parser.add_argument("--install-time", default=0.0, type=float,
+                        help="(optional) The time (in seconds) until an added capability is reported as installed")
+    parser.add_argument("--token-ttl", default=300, type=int, help="(optional) The lifetime (in seconds) of issued access tokens")
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_argparser().parse_args()
+    registry = MockRegistry(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        consistency_delay=args.consistency_delay,
+        token_ttl=args.token_ttl,
+        install_time=args.install_time
+    )
+    print(f"Mock SLM listening on '{registry.url}' (latency={args.latency}s, jitter={args.jitter}s, error_rate={args.error_rate}, consistency_delay={args.consistency_delay}s, install_time={args.install_time}s)")
+    print(f"Use it with SLM_HOST={registry.url} RESOURCE_REGISTRY_HOST={registry.url} SERVICE_REGISTRY_HOST={registry.url} KEYCLOAK_HOST={registry.url}")
+    try:
+        registry.server.serve_forever()
+    except KeyboardInterrupt:
+        registry.stop()
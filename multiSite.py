@@ -0,0 +1,226 @@
+import os
+import re
+import sys
+import json
+import time
+import tempfile
+import logging
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from structuredLog import get_logger, SUMMARY_LOGGER
+
+log = get_logger("multiSite")
+summary_log = logging.getLogger(SUMMARY_LOGGER)
+
+# the files written by a run, which every site gets its own copy of (e.g. '/files/init-journal.jsonl' -> '/files/init-journal.plant-a.jsonl')
+SITE_FILES = ["JOURNAL_FILE", "AASX_HASH_FILE", "METRICS_FILE", "METRICS_PROMETHEUS_FILE", "REGISTRY_CACHE_FILE", "SUMMARY_FILE"]
+# the hosts derived from SLM_HOST, which are not taken over from the environment (they would point every site to the same registry)
+SITE_HOSTS = ["RESOURCE_REGISTRY_HOST", "SERVICE_REGISTRY_HOST", "KEYCLOAK_HOST"]
+# the settings of a site, which are never printed
+SECRET_KEYS = ["SLM_PASSWORD"]
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+KEY_PATTERN = re.compile(r"^[A-Z][A-Z0-9_]*$")
+
+
+class SiteTarget():
+    """A site of the manifest: its name and the environment variables it overrides (e.g. SLM_HOST, SLM_USER, SLM_PASSWORD, XLSX_FILE, SHEET_NAME)
+    """
+    __slots__ = ("name", "env")
+
+    def __init__(self, name: str, env: dict):
+        self.name = name
+        self.env = env
+
+
+    def __repr__(self):
+        return f"SiteTarget(name={self.name}, env={ {key: ('***' if key in SECRET_KEYS else value) for key, value in self.env.items()} })"
+
+
+def load_manifest(path: str) -> list:
+    """Loads the sites to provision from a JSON manifest, either a list of sites or an object with a list 'sites', e.g.
+    [{"name": "plant-a", "SLM_HOST": "http://10.0.1.10", "SLM_USER": "fabos", "SLM_PASSWORD": "...", "XLSX_FILE": "/files/plant-a.xlsx", "SHEET_NAME": "DEVICES"}, ...]
+
+    Args:
+        path (str): the path of the manifest
+
+    Raises:
+        ValueError: if the manifest can not be read, or a site is invalid
+
+    Returns:
+        list: the SiteTargets
+    """
+    try:
+        with open(path) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"can not read manifest '{path}' ({e})")
+    sites = manifest.get("sites") if isinstance(manifest, dict) else manifest
+    if not isinstance(sites, list) or not sites:
+        raise ValueError(f"manifest '{path}' lists no sites, expected a list of sites or an object with a list 'sites'")
+
+    targets = []
+    for index, site in enumerate(sites):
+        if not isinstance(site, dict):
+            raise ValueError(f"site #{index} of manifest '{path}' is no object")
+        name = str(site.get("name", ""))
+        if not NAME_PATTERN.match(name):
+            raise ValueError(f"site #{index} of manifest '{path}' has an invalid name '{name}' (letters, digits, '_', '.' and '-')")
+        if name in [target.name for target in targets]:
+            raise ValueError(f"site '{name}' is listed twice in manifest '{path}'")
+        env = {key: str(value) for key, value in site.items() if key != "name"}
+        invalid = [key for key in env if not KEY_PATTERN.match(key)]
+        if invalid:
+            raise ValueError(f"site '{name}' of manifest '{path}' has invalid settings {invalid}, expected environment variable names (e.g. 'SLM_HOST')")
+        if not env.get("SLM_HOST"):
+            raise ValueError(f"site '{name}' of manifest '{path}' has no 'SLM_HOST'")
+        targets.append(SiteTarget(name, env))
+    return targets
+
+
+def site_path(path: str, name: str) -> str:
+    """Returns the path of a file for a site, with the site name before the extension
+    (e.g. '/files/init-journal.jsonl' -> '/files/init-journal.plant-a.jsonl'). Empty paths (not written) stay empty
+    """
+    if not path:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.{name}{extension}"
+
+
+def site_env(target: SiteTarget, files: dict, summary_dir: str) -> dict:
+    """Returns the environment of the run of a site: the environment of this process, with the files
+    separated per site, the hosts derived from the site's SLM_HOST and the overrides of the site
+
+    Args:
+        target (SiteTarget): the site
+        files (dict): the paths of the SITE_FILES of this process (with their defaults)
+        summary_dir (str): the directory for the summary of the site, if SUMMARY_FILE is not set
+
+    Returns:
+        dict: the environment variables
+    """
+    env = {key: value for key, value in os.environ.items() if key not in SITE_HOSTS and key != "MANIFEST_FILE"}
+    for key in SITE_FILES:
+        env[key] = site_path(files.get(key, ""), target.name)
+    if not env["SUMMARY_FILE"]:
+        env["SUMMARY_FILE"] = os.path.join(summary_dir, f"summary.{target.name}.json")
+    env.update(target.env)
+    return env
+
+
+class MultiSiteRunner():
+    """Provisions several sites (SLM installations) in parallel. Every site runs setup.py as a separate process,
+    with its own SLM client, worker pools, journal, metrics and cache, so a slow or failing site does not hold up the others.
+    The output of the sites is interleaved line by line, tagged with the site name
+    """
+    def __init__(self, targets: list, files: dict, max_parallel: int = None, args: list = None):
+        self.targets = targets
+        self.files = files
+        self.max_parallel = max_parallel or len(targets)
+        self.args = args or []
+
+
+    def _print(self, name: str, line: str):
+        """Passes a line of the output of a site on, tagged with the site. The output was already filtered by the
+        run of the site, so it is not filtered by level again. JSON lines (LOG_FORMAT=json) keep their level and fields
+        """
+        level, message, fields = logging.INFO, line, {}
+        if line.startswith("{"):
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                entry = None
+            if isinstance(entry, dict) and "message" in entry:
+                level = logging.getLevelName(entry.pop("level", "INFO"))
+                message = entry.pop("message")
+                fields = {key: value for key, value in entry.items() if key not in ["time", "logger"]}
+        record = log.makeRecord(log.name, level if isinstance(level, int) else logging.INFO, __file__, 0, message, None, None,
+                                extra={"site": name, "device": fields.pop("device", None), "fields": fields})
+        log.handle(record)
+
+
+    def _run_site(self, target: SiteTarget, summary_dir: str) -> dict:
+        """Runs setup.py for a site, and collects its summary
+
+        Returns:
+            dict: the name, exit code, wall-clock time and summary (None, if the run did not finish) of the site
+        """
+        env = site_env(target, self.files, summary_dir)
+        if os.path.exists(env["SUMMARY_FILE"]):
+            os.remove(env["SUMMARY_FILE"])
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "setup.py")
+        start = time.monotonic()
+        log.info(f"starting (SLM_HOST={env['SLM_HOST']}, XLSX_FILE={env.get('XLSX_FILE')}, SHEET_NAME={env.get('SHEET_NAME')})", extra={"site": target.name})
+        try:
+            process = subprocess.Popen([sys.executable, "-u", script] + self.args, env=env, stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT, text=True, bufsize=1)
+        except OSError as e:
+            log.error(f"ERORR: can not start the run ({e})", extra={"site": target.name})
+            return {"name": target.name, "exit_code": None, "elapsed_seconds": 0.0, "summary": None}
+        for line in process.stdout:
+            self._print(target.name, line.rstrip("\n"))
+        exit_code = process.wait()
+        elapsed = time.monotonic() - start
+
+        summary = None
+        if os.path.exists(env["SUMMARY_FILE"]):
+            try:
+                with open(env["SUMMARY_FILE"]) as summary_file:
+                    summary = json.load(summary_file)
+            except (OSError, ValueError) as e:
+                log.warning(f"WARNING: can not read the summary '{env['SUMMARY_FILE']}' ({e})", extra={"site": target.name})
+        log.info(f"finished with exit code '{exit_code}' after {elapsed:.2f}s", extra={"site": target.name})
+        return {"name": target.name, "exit_code": exit_code, "elapsed_seconds": round(elapsed, 3), "summary": summary}
+
+
+    def run(self) -> list:
+        """Runs all sites, at most max_parallel at once
+
+        Returns:
+            list: the results of the sites, in the order of the manifest
+        """
+        with tempfile.TemporaryDirectory(prefix="slm-init-sites-") as summary_dir:
+            with ThreadPoolExecutor(max_workers=self.max_parallel) as executor:
+                return list(executor.map(lambda target: self._run_site(target, summary_dir), self.targets))
+
+
+def combine_summaries(results: list) -> dict:
+    """Combines the results of the sites into one summary: the counts per site and in total
+
+    Returns:
+        dict: the combined summary
+    """
+    sites = {}
+    totals = {}
+    for result in results:
+        counts = {key: len(value) for key, value in (result["summary"] or {}).items() if isinstance(value, list)}
+        for key, count in counts.items():
+            totals[key] = totals.get(key, 0) + count
+        sites[result["name"]] = {
+            "succeeded": result["exit_code"] == 0,
+            "exit_code": result["exit_code"],
+            "elapsed_seconds": result["elapsed_seconds"],
+            "counts": counts,
+            "summary": result["summary"]
+        }
+    return {
+        "sites": sites,
+        "totals": totals,
+        "failed": [result["name"] for result in results if result["exit_code"] != 0]
+    }
+
+
+def print_combined_summary(combined: dict):
+    """Prints the counts per site and in total
+    """
+    summary_log.info("\nMULTI-SITE SUMMARY --------------------------------------------------------------------------------------------------------")
+    keys = sorted(combined["totals"])
+    for name, site in combined["sites"].items():
+        state = "OK" if site["succeeded"] else f"FAILED (exit code '{site['exit_code']}')"
+        counts = ", ".join(f"{key}={site['counts'].get(key, 0)}" for key in keys)
+        summary_log.info(f"{name}: {state}, took {site['elapsed_seconds']:.2f}s{', ' + counts if counts else ''}")
+    totals = ", ".join(f"{key}={combined['totals'][key]}" for key in keys)
+    summary_log.info(f"Total: {totals or '-'}")
+    if combined["failed"]:
+        summary_log.info(f"FAILED sites: {combined['failed']}")
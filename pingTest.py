@@ -1,30 +1,39 @@
-from utils import *
-import pandas as pd
+import os
+import sys
+
+from inventory import load_inventory
+from reachability import ReachabilityScanner, print_results
+from structuredLog import configure_logging
+
+XLSX_FILE = os.getenv("XLSX_FILE", "example.xlsx")
+SHEET_NAME = os.getenv("SHEET_NAME", "DEVICES")
+PING_TIMEOUT = float(os.getenv("PING_TIMEOUT", "2"))
 
-XLSX_FILE = "example.xlsx"
-SHEET_NAME = "DEVICES"
 
-    
 
 if __name__ == "__main__":
 
+    # the results table is logged, on the same stream as the prints
+    configure_logging(stream=sys.stdout)
 
     # read file, and only use resources
-    df = pd.read_excel(XLSX_FILE, sheet_name=SHEET_NAME)
-    df_devices = df[df['is_resource']=="yes"]
-
-    for index, row in df_devices.iterrows():
-
-        # create data item based on defaults
-        resourceIp = row["eth0 IP"] if row["eth0 IP"]!="-" else row["eth1 IP"]
-        resourceHostname = row["hostname"] + ".local"
-        
-        if ping(resourceHostname):
-            print(f"SUCCESS: Device '{row['UUID']}' with hostname '{resourceHostname}' is available via PING")
-        else: 
-            print(f"WARNING: Device '{row['UUID']}' with hostname '{resourceHostname}' is not available via PING")
-
-            if not ping(resourceIp):
-                print(f"WARNING: Device '{row['UUID']}' with IP '{resourceIp}' is not available via PING")
+    devices = load_inventory(XLSX_FILE, sheet_name=SHEET_NAME).resources
+
+    # ping hostname (mDNS) and IP of all devices at once, probe the connection port of devices which drop ICMP
+    results = ReachabilityScanner(timeout=PING_TIMEOUT, hostname_suffix=".local").scan(devices)
+
+    for uuid, result in results.items():
+        if result.hostname_icmp:
+            print(f"SUCCESS: Device '{uuid}' with hostname '{result.hostname}' is available via PING")
+        else:
+            print(f"WARNING: Device '{uuid}' with hostname '{result.hostname}' is not available via PING")
+
+            if result.ip_icmp:
+                print(f"SUCCESS: Device '{uuid}' with IP '{result.ip}' is available via PING")
+            elif result.tcp:
+                print(f"SUCCESS: Device '{uuid}' with IP '{result.ip}' is available via TCP port '{result.port}'")
             else:
-                print(f"SUCCESS: Device '{row['UUID']}' with IP '{resourceIp}' is available via PING")
+                print(f"WARNING: Device '{uuid}' with IP '{result.ip}' is not available via PING")
+
+    print()
+    print_results(results)
@@ -0,0 +1,223 @@
+import json
+from collections import Counter
+
+from provisioner import build_resource_item, parse_capabilities, filter_aasx_files
+from reconciler import Operation, compute_plan
+from inventory import Inventory
+from structuredLog import get_logger
+
+log = get_logger("planner")
+
+
+def save_snapshot(state: dict, path: str):
+    """Saves a registry state (as returned by reconciler.fetch_state) as JSON snapshot
+
+    Args:
+        state (dict): the registry state
+        path (str): the path of the JSON file
+    """
+    snapshot = dict(state)
+    snapshot["capabilities"] = {uuid: sorted(names) for uuid, names in state["capabilities"].items()}
+    with open(path, "w") as snapshot_file:
+        json.dump(snapshot, snapshot_file, indent=2)
+    log.info(f"Saved registry snapshot to '{path}'")
+
+
+def load_snapshot(path: str) -> dict:
+    """Loads an offline JSON snapshot of the registry state
+
+    Args:
+        path (str): the path of the JSON file
+
+    Returns:
+        dict: the registry state, in the format of reconciler.fetch_state
+    """
+    with open(path) as snapshot_file:
+        snapshot = json.load(snapshot_file)
+    snapshot["capabilities"] = {uuid: set(names) for uuid, names in snapshot.get("capabilities", {}).items()}
+    for key in ["resources", "locations", "service_groups"]:
+        snapshot[key] = snapshot.get(key, {})
+    log.info(f"Loaded registry snapshot from '{path}' ('{len(snapshot['resources'])}' resources, '{len(snapshot['locations'])}' locations, '{len(snapshot['service_groups'])}' service groups)")
+    return snapshot
+
+
+def _read(method: str, description: str = "", uuid: str = None) -> Operation:
+    """Creates a read operation of a plan
+    """
+    return Operation("read", uuid, description or uuid or "", method, {} if uuid is None else {"uuid": uuid})
+
+
+def build_default_plan(state: dict, inventory: Inventory, aasx_files: list,
+                       overwrite: bool, force_delete: bool, delete_all: bool, generate_uuid: bool, is_uploaded=None) -> list:
+    """Builds the operations the default (delete and recreate) mode of setup.main would perform
+
+    Args:
+        state (dict): the registry state, as returned by reconciler.fetch_state
+        inventory (Inventory): the devices, locations and service groups of the inventory
+        aasx_files (list): the paths of all available AASX files
+        overwrite (bool): FORCE_OVERWRITE (or '-f')
+        force_delete (bool): FORCE_DELETE
+        delete_all (bool): DELETE_ALL
+        generate_uuid (bool): GENERATE_UUID
+        is_uploaded (callable): checks if an AASX file (uuid, path) is unchanged since its last upload, None to plan all uploads
+
+    Returns:
+        list: the operations, the ones of the task graph with the operations they wait for
+    """
+    plan = [_read("get_keycloak_token"), _read("get_locations"), _read("get_service_groups"), _read("get_resources")]
+
+    # the clean up deletes the resources first, then the locations and service groups they reference
+    resources_current = set(state["resources"])
+    if force_delete:
+        sheet_uuids = inventory.device_uuids
+        deleted = [uuid for uuid in state["resources"] if delete_all or uuid in sheet_uuids]
+        for uuid in deleted:
+            resource = state["resources"][uuid]
+            plan.append(Operation("delete_resource", uuid, f"{uuid}, {resource.get('hostname')}, {resource.get('ip')}", "delete_resource", {"uuid": uuid}))
+        if deleted:
+            plan.append(_read("get_resources", "wait_for_resources (at least one poll)"))
+        resources_current -= set(deleted)
+    if delete_all:
+        for kind, current in [("location", state["locations"]), ("service_group", state["service_groups"])]:
+            for uuid, item in current.items():
+                plan.append(Operation(f"delete_{kind}", uuid, f'{item.get("name")} ({uuid})', f"delete_{kind}", {"uuid": uuid}))
+
+    # the lists are read once at the start, later reads are answered by the registry cache (kept up to date by the own writes)
+    plan += [_read("get_deployment_capabilities", uuid=uuid) for uuid in state["resources"] if uuid in resources_current]
+
+    # the locations, service groups and devices are tasks of one task graph: an operation runs as soon as the
+    # operations it waits for are done, they are listed in the order they are added to the graph
+    location_steps = {}
+    for kind, records in [("location", inventory.locations), ("service_group", inventory.service_groups)]:
+        for record in records or []:
+            operation = Operation(f"create_{kind}", record.uuid, f'{record.name} ({record.uuid})', f"create_{kind}", {"uuid": record.uuid, "name": record.name})
+            plan.append(operation)
+            if kind == "location":
+                location_steps[record.uuid] = operation
+
+    for device in inventory.resources:
+        device_resource_item = build_resource_item(device)
+        exists = device.uuid in resources_current
+        uuid = "<generated>" if generate_uuid and not exists else device.uuid
+        description = f"{uuid}, {device_resource_item['resourceHostname']}, {device_resource_item['resourceIp']}"
+        location = [location_steps[device.location_uuid]] if device.location_uuid in location_steps else []
+
+        readiness = _read("get_resource", "wait_for_resource (at least one poll)", uuid)
+        if not exists:
+            written = Operation("create_resource", uuid, description, "create_resource", {"uuid": uuid, "item": device_resource_item}, after=location)
+        elif overwrite:
+            written = Operation("update_resource", uuid, description, "create_resource", {"uuid": uuid, "item": device_resource_item}, after=location)
+        else:
+            written = None
+        if written is not None:
+            plan.append(written)
+            readiness.after = [written]
+        else:
+            readiness.after = location
+        plan.append(readiness)
+
+        previous = []
+        available_capabilities = state["capabilities"].get(uuid, set()) if exists else set()
+        for capability, row_value in parse_capabilities(device):
+            if overwrite or capability not in available_capabilities:
+                operation = Operation("add_capability", uuid, f"{uuid}, {capability} ({row_value})", "add_capability",
+                                      {"uuid": uuid, "capability": capability, "row_value": row_value}, after=[readiness] + previous)
+                plan.append(operation)
+                previous = [operation]
+
+        for path in filter_aasx_files(device, aasx_files) or []:
+            if exists and is_uploaded is not None and is_uploaded(uuid, path):
+                continue
+            plan.append(Operation("add_submodels", uuid, f"{uuid}, {path}", "add_submodels", {"uuid": uuid, "path": path}, after=[readiness]))
+
+    return plan
+
+
+def build_reconcile_plan(state: dict, inventory: Inventory, aasx_files: list, overwrite: bool, prune: bool) -> list:
+    """Builds the operations the reconcile mode of setup.main would perform, including the reads of the state
+
+    Args:
+        see reconciler.compute_plan
+
+    Returns:
+        list: the operations, the ones of the task graph with the operations they wait for
+    """
+    plan = [_read("get_keycloak_token"), _read("get_resources"), _read("get_locations"), _read("get_service_groups")]
+    plan += [_read("get_deployment_capabilities", uuid=uuid) for uuid in state["resources"]]
+
+    # the operations are tasks of a task graph, with the same dependencies as reconciler.build_graph
+    ready_of = {}
+    last_of = {}
+    locations = {}
+    resources = []
+    for operation in compute_plan(state, inventory, aasx_files=aasx_files, overwrite=overwrite, prune=prune):
+        if operation.kind == "create_location":
+            locations[operation.uuid] = operation
+        elif operation.kind == "delete_resource":
+            resources.append(operation)
+        elif operation.kind in ["create_resource", "update_resource"]:
+            location = operation.kwargs["item"].get("resourceLocation")
+            operation.after = [dependency for dependency in [locations.get(location)] + [deleted for deleted in resources if deleted.uuid == operation.uuid] if dependency]
+            resources.append(operation)
+            plan.append(operation)
+            ready_of[operation.uuid] = _read("get_resource", "wait_for_resource (at least one poll)", operation.uuid)
+            ready_of[operation.uuid].after = [operation]
+            plan.append(ready_of[operation.uuid])
+            continue
+        elif operation.kind in ["add_capability", "add_submodels"]:
+            operation.after = [dependency for dependency in [ready_of.get(operation.uuid), last_of.get((operation.uuid, operation.kind))] if dependency]
+            last_of[operation.uuid, operation.kind] = operation
+        elif operation.kind in ["delete_service_group", "delete_location"]:
+            operation.after = list(resources)
+        plan.append(operation)
+    return plan
+
+
+def count_requests(plan: list) -> dict:
+    """Estimates the HTTP requests of a plan. Every operation is one request, polls are counted once
+
+    Args:
+        plan (list): the operations
+
+    Returns:
+        dict: the number of requests by slmClient method
+    """
+    return dict(Counter(operation.method for operation in plan))
+
+
+def print_plan(plan: list):
+    """Prints the operations of a plan (with the steps they wait for) and the estimated request counts
+
+    Args:
+        plan (list): the operations
+    """
+    steps = {id(operation): index for index, operation in enumerate(plan, start=1)}
+    for index, operation in enumerate(plan, start=1):
+        after = f" (after {', '.join(f'#{steps[id(dependency)]}' for dependency in operation.after)})" if operation.after else ""
+        log.info(f"{index:>6}. {operation.kind:<22} {operation.method:<28} {operation.description}{after}")
+    requests_by_method = count_requests(plan)
+    log.info(f"\nEstimated requests by method: {json.dumps(requests_by_method, indent=2)}")
+    log.info(f"Estimated requests in total: {sum(requests_by_method.values())} ('{len([operation for operation in plan if operation.kind != 'read'])}' writes)")
+
+
+def write_plan(plan: list, path: str):
+    """Writes the operations of a plan (with the steps they wait for) and the estimated request counts as JSON.
+    Payloads are not written, since they contain credentials
+
+    Args:
+        plan (list): the operations
+        path (str): the path of the JSON file
+    """
+    requests_by_method = count_requests(plan)
+    steps = {id(operation): index for index, operation in enumerate(plan, start=1)}
+    with open(path, "w") as plan_file:
+        json.dump({
+            "operations": [
+                {"step": index, "kind": operation.kind, "method": operation.method, "uuid": operation.uuid, "description": operation.description,
+                 "after": [steps[id(dependency)] for dependency in operation.after]}
+                for index, operation in enumerate(plan, start=1)
+            ],
+            "requests_by_method": requests_by_method,
+            "requests_total": sum(requests_by_method.values())
+        }, plan_file, indent=2)
+    log.info(f"Wrote plan with '{len(plan)}' operations to '{path}'")
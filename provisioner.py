@@ -0,0 +1,271 @@
+import uuid
+
+from slmClient import DEFAULT_RESOURCE_ITEM
+from journal import ProgressJournal
+from aasxUpload import AasxUploader
+from inventory import DeviceRecord, CapabilityRecord, CAPABILITY_COLUMNS
+from runSummary import ProvisionResult
+from scheduler import TaskGraph
+from structuredLog import get_logger
+
+log = get_logger("provisioner")
+
+
+def build_resource_item(device: DeviceRecord) -> dict:
+    """Builds the resource item, as sent to the resource registry, for a device
+
+    Args:
+        device (DeviceRecord): the device of the inventory
+
+    Returns:
+        dict: the resource item
+    """
+    device_resource_item = DEFAULT_RESOURCE_ITEM.copy()
+    device_resource_item["resourceIp"] = device.ip
+    device_resource_item['resourceHostname'] = device.hostname
+
+    if device.connection_type != "-":
+        device_resource_item["resourceUsername"] = device.user
+        device_resource_item["resourcePassword"] = device.password
+        device_resource_item['resourceConnectionType'] = device.connection_type
+        device_resource_item['resourceConnectionPort'] = device.connection_port
+
+    if device.location_uuid:
+        device_resource_item["resourceLocation"] = device.location_uuid
+
+    # add flag for install of BaseConfigCapability (aka. FabOS Device Capability) - True/False
+    if device.capabilities.get("DC_Base") in ["yes", "skip"]:
+        device_resource_item['resourceBaseConfiguration'] = "DC_Base"
+
+    return device_resource_item
+
+
+def parse_capabilities(device: DeviceRecord) -> list:
+    """Parses the requested capabilities of a device
+
+    Args:
+        device (DeviceRecord): the device of the inventory
+
+    Returns:
+        list: the CapabilityRecords, unpacking as (capability name, row value)
+    """
+    capabilities = []
+    for column, capability in CAPABILITY_COLUMNS:
+        if device.capabilities.get(column) in ["yes", "skip"]:
+            capabilities.append(CapabilityRecord(capability, device.capabilities[column]))
+    return capabilities
+
+
+def filter_aasx_files(device: DeviceRecord, aasx_files: list) -> list:
+    """Filters the AASX files of a device by its 'aasx-filter-substring'
+
+    Args:
+        device (DeviceRecord): the device of the inventory
+        aasx_files (list): the paths of all available AASX files
+
+    Returns:
+        list: the matching AASX file paths, or None if the device has no filter
+    """
+    if device.aasx_filter:
+        return [aasx_path for aasx_path in aasx_files if device.aasx_filter in aasx_path]
+    return None
+
+
+class Provisioner():
+    """Provisions devices concurrently. Every device is a set of tasks of a task graph
+    (create resource -> add capabilities / add AASX submodels), run on a bounded worker pool.
+    Completed steps are recorded in the (optional) journal and skipped, if already completed in a resumed run.
+    """
+    def __init__(self, slm, max_workers: int, overwrite: bool, ping_check: bool, generate_uuid: bool,
+                 resources_current: list, locations_current: list, aasx_files: list, readiness_timeout: float = 60,
+                 journal: ProgressJournal = None, uploader: AasxUploader = None, reachability: dict = None):
+        self.slm = slm
+        self.journal = journal or ProgressJournal()
+        self.uploader = uploader or AasxUploader(slm)
+        self.max_workers = max_workers
+        self.readiness_timeout = readiness_timeout
+        self.overwrite = overwrite
+        self.ping_check = ping_check
+        self.generate_uuid = generate_uuid
+        self.resources_current = set(resources_current)
+        self.locations_current = set(locations_current)
+        self.aasx_files = aasx_files
+        self.reachability = reachability or {}
+
+
+    def schedule(self, graph: TaskGraph, devices: list, locations: dict = None) -> list:
+        """Adds the tasks of the given devices to the task graph: the resource (created and visible at the registry),
+        after the location it references, then its capabilities (one after the other) and its AASX submodels.
+        The capabilities and submodels of a device start as soon as its resource is visible, whatever the other devices do
+
+        Args:
+            graph (TaskGraph): the graph to add the tasks to
+            devices (list): the DeviceRecords of the resources
+            locations (dict): the keys of the tasks creating locations, by location uuid
+
+        Returns:
+            list: one ProvisionResult per device, in the order of the given devices, filled in while the graph runs
+        """
+        locations = locations or {}
+        results = []
+        for device in devices:
+            result = ProvisionResult(device.uuid, device.hostname, build_resource_item(device)["resourceIp"])
+            results.append(result)
+
+            created = graph.add(f"resource/{device.uuid}", lambda device=device, result=result: self._provision_resource(device, result),
+                                after=[locations[device.location_uuid]] if device.location_uuid in locations else [], stage="create", device=device.uuid)
+            resource = graph.add(f"readiness/{device.uuid}", lambda result=result: self._wait_for_resource(result),
+                                 requires=[created], stage="readiness", device=device.uuid, waits=True)
+
+            capabilities = parse_capabilities(device)
+            if not capabilities:
+                log.warning(f"WARN: no capabilities parse for resource '{device.uuid}'. Will skip call to add ...", extra={"device": device.uuid})
+            previous = []
+            for capability in capabilities:
+                previous = [graph.add(f"capability/{device.uuid}/{capability.name}",
+                                      lambda device=device, result=result, capability=capability: self._add_capability(device, result, capability),
+                                      requires=[resource], after=previous, stage="capabilities", device=device.uuid)]
+
+            graph.add(f"submodels/{device.uuid}", lambda device=device, result=result: self._add_submodels(device, result),
+                      requires=[resource], stage="aasx", device=device.uuid)
+        return results
+
+
+    def _provision_resource(self, device: DeviceRecord, result: ProvisionResult) -> bool:
+        """Creates the resource of a device (if it is accessible)
+
+        Returns:
+            bool: True if the resource exists now (created, already registered or created in the journaled run)
+        """
+        device_resource_item = build_resource_item(device)
+        if not self._check_accessible(device, device_resource_item):
+            return False
+        result.accessible = self.ping_check
+        result.uuid, result.created = self._create_resource(device, device_resource_item)
+        return result.created or device.uuid in self.resources_current or self.journal.is_done(device.uuid, "resource")
+
+
+    def _wait_for_resource(self, result: ProvisionResult) -> bool:
+        """Waits until the resource is visible at the registry, so the capabilities and submodels can be added
+
+        Returns:
+            bool: True if the resource is visible
+        """
+        visible = self.slm.wait_for_resource(result.uuid, timeout=self.readiness_timeout)
+        if not visible:
+            log.error(f"FAILED: cannot add capabilities and aasx submodels to resource {result.uuid} since it is not registered at the registry (yet). Skipping...")
+        return visible
+
+
+    def _check_accessible(self, device: DeviceRecord, device_resource_item: dict) -> bool:
+        """Looks up the reachability of the device (scanned up front), IF ping check is enabled
+
+        Returns:
+            bool: False if the device is not available, else True
+        """
+        if not self.ping_check:
+            return True
+
+        result = self.reachability.get(device.uuid)
+        if result is None:
+            log.error(f"ERROR: Device '{device.uuid}' was not checked for reachability. Skipping...")
+            return False
+
+        if result.hostname_icmp is False:
+            log.warning(f"WARNING: Device '{device.uuid}' with hostname '{device_resource_item['resourceHostname']}' is not available via PING!")
+
+        if not result.reachable:
+            log.error(f"ERROR: Device '{device.uuid}' with IP '{device_resource_item['resourceIp']}' is not available (via PING or TCP port '{result.port}'). Skipping...")
+            return False
+        return True
+
+
+    def _create_resource(self, device: DeviceRecord, device_resource_item: dict) -> tuple:
+        """Creates the resource, if it does not exist yet or overwrite is set
+
+        Returns:
+            tuple: the uuid of the resource and True if it was created
+        """
+        if device.location_uuid and not device.location_uuid in self.locations_current:
+            log.warning(f"WARNING: Location uuid '{device.location_uuid}' for resource '{device_resource_item['resourceHostname']}' not registered yet... But proceed adding resource")
+
+        # skip resources, which were already created in the journaled run
+        if self.journal.is_done(device.uuid, "resource"):
+            log.info(f"RESUME: skipped creating resource '{device.uuid}' since it was already created in the journaled run")
+            return self.journal.detail(device.uuid, "resource"), False
+
+        # if resource already exists, check the overwrite argument, else create directly
+        if device.uuid in self.resources_current:
+            if self.overwrite:
+                log.warning(f"WARNING: overwriting resource '{device.uuid}' since it already exists")
+                res = self.slm.create_resource(uuid=device.uuid, item=device_resource_item)
+                if res.status_code in [200, 201]:
+                    self.journal.record(device.uuid, "resource", device.uuid)
+                    return device.uuid, True
+                return device.uuid, False
+            log.warning(f"WARNING: skipped overwriting resource '{device.uuid}' since parameter '-f' was not given!")
+            return device.uuid, False
+
+        uuid_str = str(uuid.uuid4()) if self.generate_uuid else device.uuid
+        res = self.slm.create_resource(uuid=uuid_str, item=device_resource_item)
+        if res.status_code in [200, 201]:
+            # a new resource has no capabilities and submodels yet, no need to fetch them
+            self.slm.capabilities.reset(uuid_str)
+            self.uploader.hash_store.forget(uuid_str)
+            self.journal.record(device.uuid, "resource", uuid_str)
+            return uuid_str, True
+        return uuid_str, False
+
+
+    def _add_capability(self, device: DeviceRecord, result: ProvisionResult, capability: CapabilityRecord) -> bool:
+        """Adds a requested capability of the device to the resource
+
+        Returns:
+            bool: True if the resource has the capability now
+        """
+        # skip capabilities, which were already added in the journaled run
+        if self.journal.is_done(device.uuid, "capability", capability.name):
+            log.info(f"RESUME: skipped adding capability '{capability.name}' to resource '{result.uuid}' since it was already added in the journaled run")
+            return True
+
+        res = self.slm.add_capabilities(
+            uuid=result.uuid,
+            capabilities=[capability],
+            overwrite=self.overwrite
+        )
+
+        # only report the capability if result is provided (implies that request succeeded)
+        if res:
+            result.capabilities.append(capability.name)
+        # journal the capability, if the resource has it now
+        added = capability.name in self.slm.capabilities.get(result.uuid)
+        if added:
+            self.journal.record(device.uuid, "capability", capability.name)
+        return added
+
+
+    def _add_submodels(self, device: DeviceRecord, result: ProvisionResult) -> bool:
+        """Uploads the matching AASX files of the device to the resource, and reports them in the result
+
+        Returns:
+            bool: always True, files which failed to upload are logged by the uploader
+        """
+        uuid_str = result.uuid
+        paths = filter_aasx_files(device, self.aasx_files)
+        if paths is None:
+            log.warning(f"WARN: no aasx files filter (aasx-filter-substring) available for for resource '{uuid_str}'. Will skip to add submodels ...")
+            return True
+        log.info(f"Found '{len(paths)}' aasx files matching given filter substring '{device.aasx_filter}' for resource '{uuid_str}' ...")
+
+        # skip files, which were already uploaded in the journaled run
+        pending = []
+        for path in paths:
+            if self.journal.is_done(device.uuid, "submodel", path):
+                log.info(f"RESUME: skipped uploading '{path}' to resource '{uuid_str}' since it was already uploaded in the journaled run")
+            else:
+                pending.append(path)
+
+        result.submodels = self.uploader.upload(uuid_str, pending)
+        for path in result.submodels:
+            self.journal.record(device.uuid, "submodel", path)
+        return True
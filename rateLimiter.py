@@ -0,0 +1,207 @@
+import time
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+# the types of operations, which can be limited separately
+OPERATIONS = ["capability", "submodel", "token", "read", "write"]
+
+
+def operation_of(method: str, url: str) -> str:
+    """Returns the type of operation of a request: 'capability' (install of a capability, starts a job at the SLM),
+    'submodel' (AASX upload), 'token' (keycloak), 'read' (other GETs) or 'write' (other PUT, POST and DELETE)
+
+    Args:
+        method (str): the HTTP method
+        url (str): the full url of the request
+
+    Returns:
+        str: the operation type
+    """
+    path = urlparse(url).path.rstrip("/")
+    if path.endswith("/protocol/openid-connect/token"):
+        return "token"
+    if method.upper() == "GET":
+        return "read"
+    if path.endswith("/capabilities"):
+        return "capability"
+    if path.endswith("/submodels"):
+        return "submodel"
+    return "write"
+
+
+class RateLimit():
+    """The limits of a host and operation type. Limits which are None (or 0) are not applied
+
+    Args:
+        rate (float): the sustained number of requests per second
+        burst (int): the number of requests, which may be sent at once after an idle period. Default: max(rate, 1)
+        max_in_flight (int): the maximum number of concurrent requests
+    """
+    __slots__ = ("rate", "burst", "max_in_flight")
+
+    def __init__(self, rate: float = None, burst: int = None, max_in_flight: int = None):
+        self.rate = rate or None
+        self.burst = burst or (max(int(rate), 1) if rate else None)
+        self.max_in_flight = max_in_flight or None
+
+
+    def __repr__(self):
+        return f"RateLimit(rate={self.rate}, burst={self.burst}, max_in_flight={self.max_in_flight})"
+
+
+class TokenBucket():
+    """A thread-safe token bucket. Requests reserve a token and are told how long to wait for it,
+    so the bucket can be shared by blocking (time.sleep) and asynchronous (asyncio.sleep) callers
+    """
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def reserve(self) -> float:
+        """Takes a token, which may only be available in the future
+
+        Returns:
+            float: the time (in seconds) to wait before sending the request, 0 if it may be sent at once
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # the token is taken right away (the count may become negative), so waiting callers keep their order
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+def parse_rate_limits(spec: str, hosts: dict) -> dict:
+    """Parses the configured limits, e.g. 'resource_registry/capability=5:10:4;*/write=50'. Every entry is
+    '<host>/<operation>=<rate>[:<burst>[:<max_in_flight>]]', where host is one of the given names (or '*' for all hosts),
+    operation one of OPERATIONS (or '*' for all operations of the host together) and empty or 0 values are not limited
+
+    Args:
+        spec (str): the limits, separated by ';'
+        hosts (dict): the urls of the hosts by name, e.g. {'resource_registry': 'http://192.168.153.47:9010'}
+
+    Raises:
+        ValueError: if an entry is invalid
+
+    Returns:
+        dict: the RateLimit by (host url or '*', operation or '*')
+    """
+    limits = {}
+    for entry in filter(None, (entry.strip() for entry in (spec or "").split(";"))):
+        try:
+            scope, values = entry.split("=", 1)
+            host_name, operation = scope.strip().split("/", 1)
+            rate, burst, max_in_flight = (values.split(":") + ["", ""])[:3]
+            limit = RateLimit(float(rate or 0), int(burst or 0), int(max_in_flight or 0))
+        except ValueError:
+            raise ValueError(f"invalid rate limit '{entry}', expected '<host>/<operation>=<rate>[:<burst>[:<max_in_flight>]]'")
+        if host_name != "*" and host_name not in hosts:
+            raise ValueError(f"unknown host '{host_name}' in rate limit '{entry}', expected one of {['*'] + list(hosts)}")
+        if operation != "*" and operation not in OPERATIONS:
+            raise ValueError(f"unknown operation '{operation}' in rate limit '{entry}', expected one of {['*'] + OPERATIONS}")
+        limits[(hosts.get(host_name, "*").rstrip("/"), operation)] = limit
+    return limits
+
+
+class RateLimiter():
+    """Admission control of the requests per host and operation type: a token bucket (sustained rate and burst)
+    and a maximum of requests in flight. The most specific limit applies: host and operation, host (all operations
+    together), operation (on every host), default. Buckets and slots are kept per host, so a limit for all hosts
+    applies to every host separately
+    """
+    def __init__(self, limits: dict = None):
+        self.limits = limits or {}
+        self._buckets = {}
+        self._slots = {}
+        self._lock = threading.Lock()
+
+
+    def _rule(self, host: str, operation: str) -> tuple:
+        """Returns the key of the most specific limit of the request, None if it is not limited
+        """
+        for key in [(host, operation), (host, "*"), ("*", operation), ("*", "*")]:
+            if key in self.limits:
+                return key
+        return None
+
+
+    def limit_for(self, host: str, operation: str) -> RateLimit:
+        """Returns the limit of the given host and operation type, None if it is not limited
+        """
+        rule = self._rule(host, operation)
+        return self.limits[rule] if rule else None
+
+
+    def scope(self, host: str, operation: str) -> tuple:
+        """Returns the scope, whose requests share a bucket and the slots in flight: the host and
+        the operation type of the applied limit ('*' for all operations of the host), None if not limited
+        """
+        rule = self._rule(host, operation)
+        return (host, rule[1]) if rule else None
+
+
+    def bucket(self, host: str, operation: str) -> TokenBucket:
+        """Returns the token bucket shared by all requests under the same limit, None if the rate is not limited
+        """
+        limit = self.limit_for(host, operation)
+        if limit is None or limit.rate is None:
+            return None
+        key = self.scope(host, operation)
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(limit.rate, limit.burst)
+            return self._buckets[key]
+
+
+    def reserve(self, host: str, operation: str) -> float:
+        """Reserves a token for a request, without blocking
+
+        Returns:
+            float: the time (in seconds) to wait before sending the request
+        """
+        bucket = self.bucket(host, operation)
+        return bucket.reserve() if bucket else 0.0
+
+
+    def _slot(self, host: str, operation: str) -> threading.BoundedSemaphore:
+        """Returns the semaphore limiting the requests in flight under the same limit, None if they are not limited
+        """
+        limit = self.limit_for(host, operation)
+        if limit is None or limit.max_in_flight is None:
+            return None
+        key = self.scope(host, operation)
+        with self._lock:
+            if key not in self._slots:
+                self._slots[key] = threading.BoundedSemaphore(limit.max_in_flight)
+            return self._slots[key]
+
+
+    @contextmanager
+    def admit(self, host: str, operation: str):
+        """Blocks until the request may be sent (free slot and token), and holds the slot while it is in flight
+
+        Args:
+            host (str): the host of the request (scheme://netloc)
+            operation (str): the operation type, see operation_of
+
+        Yields:
+            float: the time (in seconds) the request was held back
+        """
+        start = time.monotonic()
+        slot = self._slot(host, operation)
+        if slot:
+            slot.acquire()
+        try:
+            wait = self.reserve(host, operation)
+            if wait > 0:
+                time.sleep(wait)
+            yield time.monotonic() - start
+        finally:
+            if slot:
+                slot.release()
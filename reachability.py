@@ -0,0 +1,157 @@
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import ping
+from inventory import DeviceRecord
+from structuredLog import get_logger
+
+log = get_logger("reachability")
+
+
+class ReachabilityResult():
+    """The reachability of a device. Checks which were not run are None
+    """
+    __slots__ = ("uuid", "hostname", "ip", "port", "hostname_icmp", "ip_icmp", "tcp")
+
+    def __init__(self, uuid: str, hostname: str, ip: str, port: int):
+        self.uuid = uuid
+        self.hostname = hostname
+        self.ip = ip
+        self.port = port
+        self.hostname_icmp = None
+        self.ip_icmp = None
+        self.tcp = None
+
+
+    @property
+    def reachable(self) -> bool:
+        """True if the IP answered the ping, or accepted a connection on the connection port
+        """
+        return bool(self.ip_icmp or self.tcp)
+
+
+    @property
+    def method(self) -> str:
+        """The check which reached the device: 'icmp', 'tcp' or None
+        """
+        return "icmp" if self.ip_icmp else "tcp" if self.tcp else None
+
+
+    def to_dict(self) -> dict:
+        """Returns the result as dict, e.g. to write it as JSON
+        """
+        return {
+            "uuid": self.uuid,
+            "hostname": self.hostname,
+            "ip": self.ip,
+            "port": self.port,
+            "hostname_icmp": self.hostname_icmp,
+            "ip_icmp": self.ip_icmp,
+            "tcp": self.tcp,
+            "reachable": self.reachable,
+            "method": self.method
+        }
+
+
+    def __repr__(self):
+        return f"ReachabilityResult('{self.uuid}', reachable={self.reachable}, method={self.method})"
+
+
+def icmp_probe(host: str, timeout: float) -> bool:
+    """Pings the host once
+
+    Returns:
+        bool: True if the host answered, None if ping is not available (e.g. not installed)
+    """
+    try:
+        return ping(host, timeout=timeout)
+    except OSError:
+        return None
+
+
+def tcp_probe(host: str, port: int, timeout: float) -> bool:
+    """Checks if the host accepts a TCP connection on the port (for hosts, which drop ICMP)
+
+    Args:
+        host (str): the hostname or IP
+        port (int): the port, e.g. the SSH port of the device
+        timeout (float): the connect timeout (in seconds)
+
+    Returns:
+        bool: True if the connection was established
+    """
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+class ReachabilityScanner():
+    """Checks the reachability of all devices at once, on a bounded pool. Every device is pinged
+    (hostname and IP concurrently) and, if the IP does not answer, probed via TCP on its connection port
+    """
+    def __init__(self, timeout: float = 2.0, max_workers: int = 128, icmp: bool = True, tcp: bool = True, hostname_suffix: str = ""):
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.icmp = icmp
+        self.tcp = tcp
+        self.hostname_suffix = hostname_suffix
+
+
+    def scan(self, devices: list) -> dict:
+        """Checks the given devices
+
+        Args:
+            devices (list): the DeviceRecords to check
+
+        Returns:
+            dict: the ReachabilityResult by device uuid, in the order of the given devices
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = {device.uuid: self._new_result(device) for device in devices}
+
+            # first round: ping hostnames and IPs of all devices
+            pings = {}
+            if self.icmp:
+                for result in results.values():
+                    if result.hostname:
+                        pings[(result.uuid, "hostname_icmp")] = executor.submit(icmp_probe, result.hostname, self.timeout)
+                    if result.ip:
+                        pings[(result.uuid, "ip_icmp")] = executor.submit(icmp_probe, result.ip, self.timeout)
+            for (uuid, check), future in pings.items():
+                setattr(results[uuid], check, future.result())
+
+            # second round: probe the connection port of the devices, whose IP did not answer
+            probes = {}
+            if self.tcp:
+                for result in results.values():
+                    if not result.ip_icmp and result.ip and result.port:
+                        probes[result.uuid] = executor.submit(tcp_probe, result.ip, result.port, self.timeout)
+            for uuid, future in probes.items():
+                results[uuid].tcp = future.result()
+        return results
+
+
+    def _new_result(self, device: DeviceRecord) -> ReachabilityResult:
+        """Creates the (empty) result of a device
+        """
+        hostname = f"{device.hostname}{self.hostname_suffix}" if device.hostname else None
+        ip = device.ip if device.ip not in ["-", None] else None
+        return ReachabilityResult(device.uuid, hostname, ip, device.connection_port)
+
+
+def print_results(results: dict):
+    """Prints the results of a scan as table
+
+    Args:
+        results (dict): the ReachabilityResults by device uuid
+    """
+    def mark(value):
+        return "-" if value is None else "yes" if value else "no"
+
+    log.info(f"{'UUID':<38} {'HOSTNAME':<24} {'IP':<16} {'PORT':>5}  {'PING HOST':<9} {'PING IP':<7} {'TCP':<3}  REACHABLE")
+    for result in results.values():
+        log.info(f"{result.uuid:<38} {str(result.hostname):<24} {str(result.ip):<16} {str(result.port or '-'):>5}  "
+                 f"{mark(result.hostname_icmp):<9} {mark(result.ip_icmp):<7} {mark(result.tcp):<3}  {mark(result.reachable)}{f' ({result.method})' if result.reachable else ''}")
+    log.info(f"Reachable: '{len([result for result in results.values() if result.reachable])}' of '{len(results)}' devices")
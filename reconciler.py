@@ -0,0 +1,265 @@
+import json
+from collections import Counter
+
+import requests
+
+from slmClient import resource_fields
+from provisioner import build_resource_item, parse_capabilities, filter_aasx_files
+from inventory import Inventory
+from scheduler import TaskGraph
+from structuredLog import get_logger
+
+log = get_logger("reconciler")
+
+# order of the phases of a plan. The plan is applied as a task graph (see build_graph), so an operation does not wait
+# for the whole previous phase, only for the operations it depends on
+PHASES = [
+    ("create_location",),
+    ("create_service_group",),
+    ("delete_resource",),
+    ("create_resource", "update_resource"),
+    ("add_capability",),
+    ("add_submodels",),
+    ("delete_service_group",),
+    ("delete_location",),
+]
+
+
+class Operation():
+    """A single REST operation of a reconciliation plan, executed as one call of the slmClient
+    """
+    __slots__ = ("kind", "uuid", "description", "method", "kwargs", "after")
+
+    def __init__(self, kind: str, uuid: str, description: str, method: str, kwargs: dict, after: list = None):
+        self.kind = kind
+        self.uuid = uuid
+        self.description = description
+        self.method = method
+        self.kwargs = kwargs
+        # the operations of a plan this one waits for, if it runs as a task of the task graph (see planner)
+        self.after = after or []
+
+
+    def __repr__(self):
+        return f"{self.kind}({self.description})"
+
+
+    def execute(self, slm):
+        """Executes the operation with the given client
+
+        Args:
+            slm (slmClient): the client to use
+
+        Returns:
+            the result of the client call
+        """
+        if self.method == "add_submodels":
+            return slm.upload_submodel(uuid=self.uuid, path=self.kwargs["path"])
+        return getattr(slm, self.method)(**self.kwargs)
+
+
+def _normalize(value):
+    """Returns a field value comparable between the inventory and the registry (empty values and port 0 are unset)
+    """
+    return None if value in [None, "", 0, "0"] else str(value)
+
+
+def resource_changes(current: dict, item: dict) -> list:
+    """Compares a resource item with the resource at the registry, field by field (see slmClient.RESOURCE_FIELDS)
+
+    Fields, which the registry does not return (the password, or fields missing from its response), can not be
+    compared. They are sent with every update, but a change of them alone is only written with FORCE_OVERWRITE
+
+    Args:
+        current (dict): the resource, as listed by the registry
+        item (dict): the resource item of the inventory
+
+    Returns:
+        list: the registry fields, which differ
+    """
+    return [field for field, value in resource_fields(item).items() if field in current and _normalize(current[field]) != _normalize(value)]
+
+
+def fetch_state(slm, max_workers: int) -> dict:
+    """Fetches the current state of the registries in bulk. The deployment capabilities
+    of all resources are fetched concurrently
+
+    Args:
+        slm (slmClient): the client to use
+        max_workers (int): the number of concurrent requests for the deployment capabilities
+
+    Returns:
+        dict: the resources, locations, service groups (each by id) and the capability names by resource id
+    """
+    with slm.metrics.stage("fetch_state"):
+        resources = {resource["id"]: resource for resource in slm.get_resources()}
+        locations = {location["id"]: location for location in slm.get_locations()}
+        groups = {group["id"]: group for group in slm.get_service_groups()}
+
+        capabilities = slm.capabilities.prefetch(resources, max_workers=max_workers)
+
+    return {
+        "resources": resources,
+        "locations": locations,
+        "service_groups": groups,
+        "capabilities": capabilities
+    }
+
+
+def compute_plan(state: dict, inventory: Inventory, aasx_files: list, overwrite: bool, prune: bool) -> list:
+    """Computes the operations needed to bring the registries from the current state to the state of the inventory
+
+    Args:
+        state (dict): the current state, as returned by fetch_state
+        inventory (Inventory): the devices, locations and service groups of the inventory
+        aasx_files (list): the paths of all available AASX files
+        overwrite (bool): determines if existing resources and capabilities are written again
+        prune (bool): determines if resources, locations and groups missing in the EXCEL sheet are deleted
+
+    Returns:
+        list: the operations, in the order of PHASES
+    """
+    plan = []
+
+    for kind, records, current, method in [
+        ("location", inventory.locations, state["locations"], "create_location"),
+        ("service_group", inventory.service_groups, state["service_groups"], "create_service_group")
+    ]:
+        sheet_uuids = set()
+        for record in records or []:
+            sheet_uuids.add(record.uuid)
+            if record.uuid not in current or current[record.uuid].get("name") != record.name:
+                plan.append(Operation(f"create_{kind}", record.uuid, f'{record.name} ({record.uuid})', method, {"uuid": record.uuid, "name": record.name}))
+        if prune:
+            for uuid in set(current) - sheet_uuids:
+                plan.append(Operation(f"delete_{kind}", uuid, f'{current[uuid].get("name")} ({uuid})', method.replace("create_", "delete_"), {"uuid": uuid}))
+
+    sheet_uuids = set()
+    for device in inventory.resources:
+        uuid = device.uuid
+        sheet_uuids.add(uuid)
+        device_resource_item = build_resource_item(device)
+        description = f"{uuid}, {device_resource_item['resourceHostname']}, {device_resource_item['resourceIp']}"
+
+        current = state["resources"].get(uuid)
+        if current is None:
+            plan.append(Operation("create_resource", uuid, description, "create_resource", {"uuid": uuid, "item": device_resource_item}))
+        else:
+            changes = resource_changes(current, device_resource_item)
+            if overwrite or changes:
+                description = f"{description} (changed: {', '.join(changes)})" if changes else description
+                plan.append(Operation("update_resource", uuid, description, "create_resource", {"uuid": uuid, "item": device_resource_item}))
+
+        # only add capabilities, which are not installed yet
+        available_capabilities = state["capabilities"].get(uuid, set()) if current is not None else set()
+        for capability, row_value in parse_capabilities(device):
+            if overwrite or capability not in available_capabilities:
+                plan.append(Operation("add_capability", uuid, f"{uuid}, {capability} ({row_value})", "add_capability", {"uuid": uuid, "capability": capability, "row_value": row_value}))
+
+        # submodels can not be diffed, so they are only added to new resources
+        if current is None:
+            for path in filter_aasx_files(device, aasx_files) or []:
+                plan.append(Operation("add_submodels", uuid, f"{uuid}, {path}", "add_submodels", {"uuid": uuid, "path": path}))
+
+    if prune:
+        for uuid in set(state["resources"]) - sheet_uuids:
+            resource = state["resources"][uuid]
+            plan.append(Operation("delete_resource", uuid, f"{uuid}, {resource.get('hostname')}, {resource.get('ip')}", "delete_resource", {"uuid": uuid}))
+
+    order = {kind: index for index, phase in enumerate(PHASES) for kind in phase}
+    return sorted(plan, key=lambda operation: order[operation.kind])
+
+
+def summarize_plan(plan: list) -> dict:
+    """Counts the operations of a plan by kind
+
+    Args:
+        plan (list): the operations
+
+    Returns:
+        dict: the number of operations by kind, in the order of PHASES
+    """
+    counts = Counter(operation.kind for operation in plan)
+    return {kind: counts[kind] for phase in PHASES for kind in phase if counts[kind] > 0}
+
+
+def _execute(slm, operation: Operation) -> bool:
+    """Executes an operation
+
+    Returns:
+        bool: True if the operation succeeded
+    """
+    res = operation.execute(slm)
+    return isinstance(res, requests.models.Response) and res.status_code in [200, 201, 204]
+
+
+def build_graph(slm, plan: list, readiness_timeout: float) -> TaskGraph:
+    """Builds the task graph of a plan: every operation is a task, which only waits for the operations it depends on.
+    Resources are written after the location they reference, capabilities and submodels as soon as their
+    resource is visible at the registry (the capabilities, and the submodels, of a resource one after the other), and locations and service groups are
+    deleted after the resources
+
+    Args:
+        slm (slmClient): the client to use
+        plan (list): the operations, as returned by compute_plan
+        readiness_timeout (float): the maximum time (in seconds) to wait for written resources to be visible
+
+    Returns:
+        TaskGraph: the graph, with one task per operation (in the order of the plan) and one readiness task per written resource
+    """
+    graph = TaskGraph()
+    phase_of = {kind: "/".join(phase) for phase in PHASES for kind in phase}
+    ready_of = {}
+    last_of = {}
+    resource_tasks = []
+
+    def add(key, operation, requires=(), after=()):
+        return graph.add(key, lambda: _execute(slm, operation), requires=requires, after=after, stage=phase_of[operation.kind], device=operation.uuid)
+
+    for operation in plan:
+        if operation.kind in ["create_location", "create_service_group", "delete_resource"]:
+            key = add(f"{operation.kind}/{operation.uuid}", operation)
+            if operation.kind == "delete_resource":
+                resource_tasks.append(key)
+
+        elif operation.kind in ["create_resource", "update_resource"]:
+            location = f"create_location/{operation.kwargs['item'].get('resourceLocation')}"
+            deleted = f"delete_resource/{operation.uuid}"
+            key = add(f"{operation.kind}/{operation.uuid}", operation, after=[dependency for dependency in [location, deleted] if dependency in graph])
+            # continue as soon as the written resource is visible at the registry
+            ready_of[operation.uuid] = graph.add(f"readiness/{operation.uuid}", lambda uuid=operation.uuid: slm.wait_for_resource(uuid, timeout=readiness_timeout),
+                                                requires=[key], stage="readiness", device=operation.uuid, waits=True)
+            resource_tasks.append(key)
+
+        elif operation.kind in ["add_capability", "add_submodels"]:
+            detail = operation.kwargs["capability"] if operation.kind == "add_capability" else operation.kwargs["path"]
+            requires = [ready_of[operation.uuid]] if operation.uuid in ready_of else []
+            after = [last_of[operation.uuid, operation.kind]] if (operation.uuid, operation.kind) in last_of else []
+            last_of[operation.uuid, operation.kind] = add(f"{operation.kind}/{operation.uuid}/{detail}", operation, requires=requires, after=after)
+
+        else:
+            # locations and service groups are deleted after the resources, which might reference them
+            add(f"{operation.kind}/{operation.uuid}", operation, after=resource_tasks)
+    return graph
+
+
+def apply_plan(slm, plan: list, max_workers: int, readiness_timeout: float) -> list:
+    """Applies the plan as a task graph on a bounded worker pool (see build_graph)
+
+    Args:
+        slm (slmClient): the client to use
+        plan (list): the operations, as returned by compute_plan
+        max_workers (int): the number of concurrent workers
+        readiness_timeout (float): the maximum time (in seconds) to wait for created resources to be visible
+
+    Returns:
+        list: (operation, succeeded) tuples of all operations, in the order of the plan
+    """
+    if not plan:
+        return []
+    graph = build_graph(slm, plan, readiness_timeout)
+    log.info(f"\nApplying plan ('{len(plan)}' operations, '{len(graph)}' tasks):------------------------------------------------------------------------")
+    tasks = graph.run(max_workers=max_workers, metrics=slm.metrics)
+    log.info(f"Applied plan: {json.dumps(graph.counts())}")
+    operations = [task for task in tasks.values() if not task.key.startswith("readiness/")]
+    return [(operation, task.state == "succeeded") for operation, task in zip(plan, operations)]
@@ -0,0 +1,143 @@
+import os
+import json
+import threading
+
+from structuredLog import get_logger
+
+log = get_logger("registryCache")
+
+
+class RegistryCache():
+    """A local copy of the lists of the registries (resources, locations, service groups) by url, kept for the run
+    and optionally on disk between runs. Lists are revalidated with conditional requests (ETag / Last-Modified),
+    and updated by the client's own writes, so they need not be fetched again after every stage
+    """
+    def __init__(self, path: str = None):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+
+    def _load(self):
+        """Loads the lists of an earlier run. They are only used after the registry confirmed them (304)
+        """
+        try:
+            with open(self.path) as cache_file:
+                entries = json.load(cache_file)
+        except (OSError, ValueError) as e:
+            log.warning(f"WARNING: can not read registry cache '{self.path}' ({e}). Starting with an empty cache...")
+            return
+        for url, entry in entries.items():
+            self._entries[url] = {
+                "etag": entry.get("etag"),
+                "last_modified": entry.get("last_modified"),
+                "items": {item["id"]: item for item in entry.get("items", [])},
+                "validated": False
+            }
+        log.info(f"Loaded registry cache from '{self.path}' ('{len(self._entries)}' lists)")
+
+
+    def save(self):
+        """Writes the lists (with their validators) to disk, if a path is given
+        """
+        if not self.path:
+            return
+        with self._lock:
+            entries = {url: {"etag": entry["etag"], "last_modified": entry["last_modified"], "items": list(entry["items"].values())}
+                       for url, entry in self._entries.items()}
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as cache_file:
+            json.dump(entries, cache_file)
+        os.replace(temp_path, self.path)
+
+
+    def get(self, url: str) -> list:
+        """Returns the list of the url, if it was fetched or confirmed by the registry in this run
+
+        Returns:
+            list: the items, None if not known (yet)
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None or not entry["validated"]:
+                return None
+            return list(entry["items"].values())
+
+
+    def conditional_headers(self, url: str) -> dict:
+        """Returns the headers to revalidate the list of the url, empty if it was never fetched
+        """
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return {}
+            headers = {}
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+            return headers
+
+
+    def store(self, url: str, items: list, etag: str = None, last_modified: str = None):
+        """Stores a fetched list, replacing the known one
+
+        Args:
+            url (str): the url of the list
+            items (list): the items, each with an 'id'
+            etag (str): the ETag header of the response
+            last_modified (str): the Last-Modified header of the response
+        """
+        with self._lock:
+            self._entries[url] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "items": {item["id"]: item for item in items},
+                "validated": True
+            }
+
+
+    def revalidated(self, url: str) -> list:
+        """Marks the known list of the url as confirmed by the registry (304 Not Modified)
+
+        Returns:
+            list: the items
+        """
+        with self._lock:
+            entry = self._entries[url]
+            entry["validated"] = True
+            return list(entry["items"].values())
+
+
+    def upsert(self, url: str, uuid: str, fields: dict):
+        """Records a created or updated item in the known list of the url (ignored, if the list was never fetched)
+
+        Args:
+            url (str): the url of the list
+            uuid (str): the id of the item
+            fields (dict): the fields of the item, merged into the known item
+        """
+        with self._lock:
+            if url in self._entries:
+                items = self._entries[url]["items"]
+                items[uuid] = {**items.get(uuid, {}), **fields, "id": uuid}
+                self._invalidate_validators(url)
+
+
+    def remove(self, url: str, uuid: str):
+        """Records a deleted item in the known list of the url
+        """
+        with self._lock:
+            if url in self._entries:
+                self._entries[url]["items"].pop(uuid, None)
+                self._invalidate_validators(url)
+
+
+    def _invalidate_validators(self, url: str):
+        """Drops the ETag and Last-Modified of a locally changed list, so the registry can not confirm
+        the local changes with a 304, and the next revalidation fetches the list again
+        """
+        self._entries[url]["etag"] = None
+        self._entries[url]["last_modified"] = None
@@ -0,0 +1,253 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from structuredLog import get_logger
+
+log = get_logger("resilience")
+
+# statuses, which signal an overloaded or (temporarily) unavailable registry
+RETRY_STATUSES = {429, 502, 503, 504}
+
+# methods, which can be sent again without changing the outcome
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+
+def parse_retry_after(value: str) -> float:
+    """Parses a Retry-After header (seconds or HTTP date)
+
+    Args:
+        value (str): the header value
+
+    Returns:
+        float: the delay in seconds, None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy():
+    """Decides if and when a failed request is sent again. Idempotent requests are retried on connection errors,
+    timeouts and overload statuses (429, 502, 503, 504). Other requests (e.g. POST of a submodel) only if
+    they were certainly not processed: a connect timeout or 429
+    """
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.25, max_delay: float = 10.0, max_retry_after: float = 60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+
+    def should_retry(self, method: str, attempt: int, status: int = None, error: Exception = None, idempotent: bool = None,
+                     unsent: bool = None) -> bool:
+        """Checks if the request should be sent again
+
+        Args:
+            method (str): the HTTP method
+            attempt (int): the number of the failed attempt, starting at 0
+            status (int): the status code of the response, None if the request failed
+            error (Exception): the exception of the request, None if a response was received
+            idempotent (bool): overrides the idempotency derived from the method (e.g. POST with a client-chosen id)
+            unsent (bool): overrides if the error certainly happened before the request was sent (default: a connect timeout)
+
+        Returns:
+            bool: True if the request should be sent again
+        """
+        if attempt >= self.max_retries:
+            return False
+        idempotent = method.upper() in IDEMPOTENT_METHODS if idempotent is None else idempotent
+        if error is not None:
+            return idempotent or (isinstance(error, requests.exceptions.ConnectTimeout) if unsent is None else unsent)
+        if status == 429:
+            return True
+        return idempotent and status in RETRY_STATUSES
+
+
+    def delay(self, attempt: int, retry_after: float = None) -> float:
+        """Returns the pause before the next attempt: the Retry-After of the registry if given,
+        else exponential backoff with full jitter
+
+        Args:
+            attempt (int): the number of the failed attempt, starting at 0
+            retry_after (float): the delay (in seconds) requested by the registry
+
+        Returns:
+            float: the pause in seconds
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+    def next_attempt(self, breaker, method: str, url: str, attempt: int, status: int = None, retry_after: str = None,
+                     error: Exception = None, idempotent: bool = None, unsent: bool = None) -> float:
+        """Records the outcome of an attempt at the circuit breaker of the host, and decides if the request is sent again.
+        Shared by the clients, which only send the requests
+
+        Args:
+            breaker (CircuitBreaker): the circuit breaker of the host
+            method (str): the HTTP method
+            url (str): the full url of the request
+            attempt (int): the number of the attempt, starting at 0
+            status (int): the status code of the response, None if the request failed
+            retry_after (str): the Retry-After header of the response
+            error (Exception): the exception of the request, None if a response was received
+            idempotent (bool): overrides the idempotency derived from the method (see should_retry)
+            unsent (bool): overrides if the error certainly happened before the request was sent (see should_retry)
+
+        Returns:
+            float: the pause (in seconds) before the next attempt, None if the request is not sent again
+        """
+        if error is not None:
+            breaker.record_failure()
+            if not self.should_retry(method, attempt, error=error, idempotent=idempotent, unsent=unsent):
+                return None
+            delay = self.delay(attempt)
+            log.warning(f"WARNING: '{method} {url}' failed ({type(error).__name__}). Retrying in {delay:.2f}s ({attempt + 1}/{self.max_retries})...")
+            return delay
+
+        if status not in RETRY_STATUSES:
+            breaker.record_success()
+            return None
+        retry_after = parse_retry_after(retry_after)
+        if retry_after is not None:
+            retry_after = min(retry_after, self.max_retry_after)
+        breaker.record_failure(retry_after)
+        if not self.should_retry(method, attempt, status=status, idempotent=idempotent):
+            return None
+        delay = self.delay(attempt, retry_after)
+        log.warning(f"WARNING({status}): '{method} {url}' failed. Retrying in {delay:.2f}s ({attempt + 1}/{self.max_retries})...")
+        return delay
+
+
+def rejected_token(method: str, url: str, status: int, headers: dict) -> str:
+    """Returns the token of a request, which the registry rejected (401), so it is renewed and the request is sent once more
+
+    Args:
+        method (str): the HTTP method
+        url (str): the full url of the request
+        status (int): the status code of the response
+        headers (dict): the headers of the request
+
+    Returns:
+        str: the rejected token (without 'Bearer '), None if the request was not rejected or sent without token
+    """
+    headers = headers or {}
+    if status != 401 or "Authorization" not in headers:
+        return None
+    log.warning(f"WARNING(401): token rejected for '{method} {url}'. Renewing token and retrying once...")
+    return headers["Authorization"].removeprefix("Bearer ")
+
+
+class CircuitBreaker():
+    """Pauses all requests to a host, while it is overloaded. After 'failure_threshold' consecutive failures
+    (or a Retry-After of the host) the circuit opens for 'reset_timeout' seconds. Afterwards a single probe request
+    is let through (half-open): on success the circuit closes, on failure it opens again
+    """
+    def __init__(self, host: str, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+        self._probe_owner = None
+
+
+    @property
+    def state(self) -> str:
+        """'closed', 'open' or 'half-open'
+        """
+        with self._lock:
+            if self._probing:
+                return "half-open"
+            return "open" if self._failures >= self.failure_threshold or time.monotonic() < self._open_until else "closed"
+
+
+    def try_acquire(self, poll_interval: float = 0.05, owner: object = None) -> float:
+        """Checks without blocking if a request to the host may be sent
+
+        Args:
+            poll_interval (float): the time (in seconds) to wait for the outcome of a running probe
+            owner (object): identifies the request, which releases the probe if it ends without outcome (see release_probe)
+
+        Returns:
+            float: 0 if the request may be sent, else the time (in seconds) to wait before checking again
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._open_until and self._failures < self.failure_threshold:
+                return 0.0
+            if now >= self._open_until and not self._probing:
+                # half-open: let this request through as probe, the others wait for its outcome
+                self._probing = True
+                self._probe_owner = owner
+                return 0.0
+            return min(self._open_until - now, self.reset_timeout) if now < self._open_until else poll_interval
+
+
+    def acquire(self, poll_interval: float = 0.05, owner: object = None):
+        """Blocks until a request to the host may be sent (see try_acquire)
+        """
+        while True:
+            wait = self.try_acquire(poll_interval, owner)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+
+    def release_probe(self, owner: object):
+        """Lets the next request through as probe, if the probe of the given request ended without outcome
+        (e.g. it was cancelled or raised an unexpected error). Without outcome recorded, the probe would block the host forever.
+        To be called on every exit path of a request, it does nothing if the request was no probe or its outcome was recorded
+
+        Args:
+            owner (object): the request, as passed to try_acquire
+        """
+        with self._lock:
+            if self._probing and owner is not None and self._probe_owner is owner:
+                self._probing = False
+                self._probe_owner = None
+
+
+    def record_success(self):
+        """Closes the circuit
+        """
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._probe_owner = None
+
+
+    def record_failure(self, retry_after: float = None):
+        """Counts a failure, opening the circuit at the threshold (or for the Retry-After of the host)
+
+        Args:
+            retry_after (float): the delay (in seconds) requested by the host
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._failures += 1
+            was_probe, self._probing = self._probing, False
+            self._probe_owner = None
+            if retry_after is not None:
+                pause = retry_after
+            elif was_probe or self._failures >= self.failure_threshold:
+                pause = self.reset_timeout
+            else:
+                return
+            if now >= self._open_until:
+                log.warning(f"WARNING: circuit of '{self.host}' opened for {pause:.1f}s ('{self._failures}' consecutive failures)")
+            self._open_until = max(self._open_until, now + pause)
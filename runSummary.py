@@ -0,0 +1,113 @@
+from slmClient import ResourceRecord
+from inventory import NamedRecord
+
+
+class ProvisionResult():
+    """The result of the pipeline of a device: whether the resource was reachable and created,
+    and the capability names and AASX files added to it
+    """
+    __slots__ = ("uuid", "hostname", "ip", "accessible", "created", "capabilities", "submodels")
+
+    def __init__(self, uuid: str, hostname: str = None, ip: str = None, accessible: bool = False, created: bool = False,
+                 capabilities: list = None, submodels: list = None):
+        self.uuid = uuid
+        self.hostname = hostname
+        self.ip = ip
+        self.accessible = accessible
+        self.created = created
+        self.capabilities = capabilities or []
+        self.submodels = submodels or []
+
+
+    def __repr__(self):
+        return f"ProvisionResult('{self.uuid}', created={self.created}, capabilities={self.capabilities}, submodels={len(self.submodels)})"
+
+
+class RunSummary():
+    """The outcome of a run, kept as typed records. The lines of the summary are only formatted when it is printed or written
+    """
+    __slots__ = ("resources_deleted", "locations_added", "groups_added", "results", "installs", "_by_uuid")
+
+    def __init__(self):
+        self.resources_deleted = []
+        self.locations_added = []
+        self.groups_added = []
+        self.results = []
+        self.installs = []
+        self._by_uuid = {}
+
+
+    def add_result(self, result: ProvisionResult):
+        """Adds the result of the pipeline of a device
+        """
+        self.results.append(result)
+        self._by_uuid[result.uuid] = result
+
+
+    def result(self, uuid: str, hostname: str = None, ip: str = None) -> ProvisionResult:
+        """Returns the result of the given resource, adding an empty one if it has none yet
+        """
+        if uuid not in self._by_uuid:
+            self.add_result(ProvisionResult(uuid, hostname, ip))
+        return self._by_uuid[uuid]
+
+
+    def add_operation(self, operation, state: dict):
+        """Adds a succeeded operation of a reconciliation plan
+
+        Args:
+            operation (Operation): the operation
+            state (dict): the registry state the plan was computed from, to look up deleted resources
+        """
+        if operation.kind == "delete_resource":
+            resource = state["resources"].get(operation.uuid, {})
+            self.resources_deleted.append(ResourceRecord(operation.uuid, resource.get("hostname"), resource.get("ip")))
+        elif operation.kind == "create_location":
+            self.locations_added.append(NamedRecord(operation.uuid, operation.kwargs["name"]))
+        elif operation.kind == "create_service_group":
+            self.groups_added.append(NamedRecord(operation.uuid, operation.kwargs["name"]))
+        elif operation.kind in ["create_resource", "update_resource"]:
+            item = operation.kwargs["item"]
+            result = self.result(operation.uuid, item.get("resourceHostname"), item.get("resourceIp"))
+            result.created = True
+        elif operation.kind == "add_capability":
+            self.result(operation.uuid).capabilities.append(operation.kwargs["capability"])
+        elif operation.kind == "add_submodels":
+            self.result(operation.uuid).submodels.append(operation.kwargs["path"])
+
+
+    def sections(self) -> list:
+        """Returns the sections of the summary, as (key, title, records, format) tuples
+        """
+        return [
+            ("resources_deleted", "Resources deleted (via REST)", self.resources_deleted,
+             lambda resource: f"{resource.uuid}, {resource.hostname}, {resource.ip}"),
+            ("resources_accessible", "Resources accessible (via ping)", [result for result in self.results if result.accessible],
+             lambda result: f"{result.uuid}, {result.hostname}, {result.ip}"),
+            ("locations_added", "Locations added to registry (via REST)", self.locations_added,
+             lambda location: f"{location.name} ({location.uuid})"),
+            ("groups_added", "Service Groups added to registry (via REST)", self.groups_added,
+             lambda group: f"{group.name} ({group.uuid})"),
+            ("resources_added", "Resources added to registry (via REST)", [result for result in self.results if result.created],
+             lambda result: f"{result.uuid}, {result.hostname}, {result.ip}"),
+            ("resources_capabilities_added", "Capabilities added to resources (via REST)", [result for result in self.results if result.capabilities],
+             lambda result: f"{result.uuid}, {result.hostname}, {result.capabilities}"),
+            ("aasxs_added", "AAS submodels added to resources (via REST)", [(result, path) for result in self.results for path in result.submodels],
+             lambda entry: f"{entry[0].uuid}, {entry[1]}"),
+            ("capabilities_installed", "Capabilities installed on resources (via SLM)", [install for install in self.installs if install.state == "installed"],
+             lambda install: f"{install.uuid}, {install.capability}, {install.duration:.1f}s"),
+            ("capabilities_not_installed", "Capabilities failed or not installed in time (via SLM)", [install for install in self.installs if install.state != "installed"],
+             lambda install: f"{install.uuid}, {install.capability}, {install.state}")
+        ]
+
+
+    def counts(self) -> dict:
+        """Returns the number of records per section
+        """
+        return {key: len(records) for key, _, records, _ in self.sections()}
+
+
+    def to_dict(self) -> dict:
+        """Returns the formatted lines per section, as written to the summary file
+        """
+        return {key: [line(record) for record in records] for key, _, records, line in self.sections()}
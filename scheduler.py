@@ -0,0 +1,173 @@
+import heapq
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from structuredLog import get_logger, device_context
+
+log = get_logger("scheduler")
+
+# the states of a task: not run yet, succeeded, failed (returned a falsy result or raised), or skipped (a required task did not succeed)
+TASK_STATES = ["pending", "succeeded", "failed", "skipped"]
+
+
+class Task():
+    """An operation of the task graph (e.g. location X, resource Z, capability Z/DOCKER), with the tasks it depends on.
+    It runs as soon as all of them have finished. If a task it requires did not succeed, it is skipped;
+    tasks it only runs after are waited for, whatever their outcome
+    """
+    __slots__ = ("key", "func", "requires", "after", "stage", "device", "waits", "index", "state", "result")
+
+    def __init__(self, key: str, func, requires: list, after: list, stage: str, device: str, waits: bool, index: int):
+        self.key = key
+        self.func = func
+        self.requires = requires
+        self.after = after
+        self.stage = stage
+        self.device = device
+        self.waits = waits
+        self.index = index
+        self.state = "pending"
+        self.result = None
+
+
+    def __repr__(self):
+        return f"Task('{self.key}', {self.state})"
+
+
+class TaskGraph():
+    """A graph of tasks with explicit dependencies, run on a bounded worker pool. There are no global stages:
+    every task starts as soon as its dependencies have finished, so e.g. the capabilities of a device are added
+    as soon as its resource exists, while other devices are still being created. Dependencies must be added
+    before the tasks depending on them, so the graph can not contain cycles.
+    Tasks which mostly wait (e.g. poll the registry until a resource is visible) run on a pool of their own,
+    so they do not hold up the workers sending requests
+
+    Example:
+        graph = TaskGraph()
+        graph.add("location/L", lambda: slm.create_location("L", "Hall 1"))
+        graph.add("resource/Z", lambda: create("Z"), after=["location/L"], device="Z")
+        graph.add("capability/Z/DOCKER", lambda: add("Z", "DOCKER"), requires=["resource/Z"], device="Z")
+        graph.run(max_workers=8)
+    """
+    def __init__(self):
+        self.tasks = {}
+
+
+    def add(self, key: str, func, requires: list = (), after: list = (), stage: str = None, device: str = None, waits: bool = False) -> str:
+        """Adds a task
+
+        Args:
+            key (str): the unique key of the task, e.g. 'resource/<uuid>'
+            func (callable): the operation, returning a truthy result if it succeeded
+            requires (list): the keys of the tasks, which have to succeed before (else the task is skipped)
+            after (list): the keys of the tasks, which only have to finish before
+            stage (str): the stage the runs of the task are timed as in the metrics, e.g. 'create'
+            device (str): the uuid of the device, the log records of the task are tagged with
+            waits (bool): the task mostly waits, it runs on the pool of waiting tasks
+
+        Raises:
+            ValueError: if the key is taken, or a dependency is unknown
+
+        Returns:
+            str: the key
+        """
+        if key in self.tasks:
+            raise ValueError(f"task '{key}' is added twice")
+        unknown = [dependency for dependency in list(requires) + list(after) if dependency not in self.tasks]
+        if unknown:
+            raise ValueError(f"task '{key}' depends on unknown tasks {unknown} (dependencies have to be added first)")
+        self.tasks[key] = Task(key, func, list(requires), list(after), stage, device, waits, len(self.tasks))
+        return key
+
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.tasks
+
+
+    def __len__(self) -> int:
+        return len(self.tasks)
+
+
+    def _execute(self, task: Task, metrics):
+        """Runs a task within the (logging) context of its device, timed as its stage
+        """
+        with device_context(task.device) if task.device else nullcontext():
+            with metrics.stage(task.stage) if metrics is not None and task.stage else nullcontext():
+                try:
+                    result = task.func()
+                except Exception as e:
+                    log.error(f"ERROR: task '{task.key}' failed. Error: {type(e)}: {e}")
+                    return "failed", None
+                return "succeeded" if result else "failed", result
+
+
+    def run(self, max_workers: int, max_waiting: int = None, metrics=None) -> dict:
+        """Runs all tasks, at most max_workers (and max_waiting waiting tasks) at once. Of the tasks ready to run,
+        the earliest added runs first, so the tasks of a device (added one after the other) are finished before later devices are started
+
+        Args:
+            max_workers (int): the number of concurrent workers
+            max_waiting (int): the number of concurrent waiting tasks. Default: 4 * max_workers
+            metrics (Metrics): the metrics to time the stages of the tasks in (optional)
+
+        Returns:
+            dict: the tasks by key, in the order they were added, with their state and result
+        """
+        limits = {False: max_workers, True: max_waiting or 4 * max_workers}
+        dependents = {key: [] for key in self.tasks}
+        unfinished = {}
+        for task in self.tasks.values():
+            for dependency in set(task.requires + task.after):
+                dependents[dependency].append(task)
+            unfinished[task.key] = len(set(task.requires + task.after))
+
+        # the tasks ready to run, by pool (workers, waiting tasks)
+        ready = {False: [], True: []}
+        for task in self.tasks.values():
+            if unfinished[task.key] == 0:
+                ready[task.waits].append((task.index, task.key))
+        for tasks in ready.values():
+            heapq.heapify(tasks)
+        running = {}
+        busy = {False: 0, True: 0}
+
+        def finish(task: Task, state: str):
+            """Records the outcome of a task, and releases (or skips) the tasks depending on it
+            """
+            task.state = state
+            finished = [task]
+            while finished:
+                done = finished.pop()
+                for dependent in dependents[done.key]:
+                    unfinished[dependent.key] -= 1
+                    if unfinished[dependent.key] > 0:
+                        continue
+                    failed = [key for key in dependent.requires if self.tasks[key].state != "succeeded"]
+                    if failed:
+                        log.warning(f"SKIP: task '{dependent.key}' is skipped, since {failed} did not succeed")
+                        dependent.state = "skipped"
+                        finished.append(dependent)
+                    else:
+                        heapq.heappush(ready[dependent.waits], (dependent.index, dependent.key))
+
+        with ThreadPoolExecutor(max_workers=limits[False]) as workers, ThreadPoolExecutor(max_workers=limits[True]) as waiters:
+            pools = {False: workers, True: waiters}
+            while ready[False] or ready[True] or running:
+                for waits, pool in pools.items():
+                    while ready[waits] and busy[waits] < limits[waits]:
+                        _, key = heapq.heappop(ready[waits])
+                        running[pool.submit(self._execute, self.tasks[key], metrics)] = self.tasks[key]
+                        busy[waits] += 1
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    busy[task.waits] -= 1
+                    state, task.result = future.result()
+                    finish(task, state)
+        return self.tasks
+
+
+    def counts(self) -> dict:
+        """Returns the number of tasks by state
+        """
+        return {state: len([task for task in self.tasks.values() if task.state == state]) for state in TASK_STATES}
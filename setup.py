@@ -3,12 +3,28 @@ import glob
 import time
 import json
 import uuid
+import logging
 from argparse import ArgumentParser
 
-import pandas as pd
-
 from slmClient import *
 from utils import *
+from provisioner import Provisioner
+from teardown import Teardown
+from runSummary import RunSummary
+from reconciler import fetch_state, compute_plan, summarize_plan, apply_plan
+from journal import ProgressJournal
+from inventory import load_inventory, ColumnError
+from validation import validate_inventory, column_issue, print_issues, VALIDATION_MODES
+from installTracker import print_installs
+from scheduler import TaskGraph
+from resilience import RetryPolicy
+from rateLimiter import RateLimiter, parse_rate_limits
+from registryCache import RegistryCache
+from structuredLog import configure_logging, get_logger, SUMMARY_LOGGER
+from multiSite import MultiSiteRunner, load_manifest, combine_summaries, print_combined_summary
+from reachability import ReachabilityScanner, print_results
+from aasxUpload import AasxUploader, UploadHashStore
+from planner import save_snapshot, load_snapshot, build_default_plan, build_reconcile_plan, print_plan, write_plan
 
 # read variables from environment or use defaults
 SLM_HOST = str(os.getenv("SLM_HOST", "http://192.168.153.47"))
@@ -24,25 +40,96 @@ FORCE_DELETE = os.getenv("FORCE_DELETE", "False")
 DELETE_ALL = os.getenv("DELETE_ALL", "False")
 PING_CHECK = os.getenv("PING_CHECK", "False")
 GENERATE_UUID = os.getenv("GENERATE_UUID", "False")
+PING_TIMEOUT = os.getenv("PING_TIMEOUT", "2")
+PING_TCP = os.getenv("PING_TCP", "True")
+RECONCILE = os.getenv("RECONCILE", "False")
+RESUME = os.getenv("RESUME", "False")
+JOURNAL_FILE = os.getenv("JOURNAL_FILE", "/files/init-journal.jsonl")
+AASX_HASH_FILE = os.getenv("AASX_HASH_FILE", "/files/aasx-hashes.jsonl")
+AASX_MAX_PARALLEL = os.getenv("AASX_MAX_PARALLEL", "4")
 AASX_FILE_FILTER = os.getenv("AASX_FILE_FILTER", "/files/**/*.aasx")
+MAX_WORKERS = os.getenv("MAX_WORKERS", "8")
+MAX_CONCURRENCY_PER_HOST = os.getenv("MAX_CONCURRENCY_PER_HOST", "8")
+HTTP_POOL_SIZE = os.getenv("HTTP_POOL_SIZE", MAX_CONCURRENCY_PER_HOST)
+HTTP_CONNECT_TIMEOUT = os.getenv("HTTP_CONNECT_TIMEOUT", "5")
+HTTP_READ_TIMEOUT = os.getenv("HTTP_READ_TIMEOUT", "60")
+READINESS_TIMEOUT = os.getenv("READINESS_TIMEOUT", "60")
+WAIT_FOR_INSTALLS = os.getenv("WAIT_FOR_INSTALLS", "False")
+INSTALL_TIMEOUT = os.getenv("INSTALL_TIMEOUT", "900")
+HTTP_MAX_RETRIES = os.getenv("HTTP_MAX_RETRIES", "3")
+HTTP_BACKOFF_BASE = os.getenv("HTTP_BACKOFF_BASE", "0.25")
+HTTP_BACKOFF_MAX = os.getenv("HTTP_BACKOFF_MAX", "10")
+CIRCUIT_BREAKER_THRESHOLD = os.getenv("CIRCUIT_BREAKER_THRESHOLD", "5")
+CIRCUIT_BREAKER_RESET = os.getenv("CIRCUIT_BREAKER_RESET", "10")
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+REGISTRY_CACHE_FILE = os.getenv("REGISTRY_CACHE_FILE", "")
+METRICS_FILE = os.getenv("METRICS_FILE", "/files/init-metrics.json")
+METRICS_PROMETHEUS_FILE = os.getenv("METRICS_PROMETHEUS_FILE", "")
+SUMMARY_FILE = os.getenv("SUMMARY_FILE", "")
+MANIFEST_FILE = os.getenv("MANIFEST_FILE", "")
+MAX_SITES = os.getenv("MAX_SITES", "0")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_QUIET = os.getenv("LOG_QUIET", "False")
+VALIDATE = os.getenv("VALIDATE", "strict")
+
+# log through a background writer (JSON lines with LOG_FORMAT=json, only the summary with LOG_QUIET=True)
+try:
+    configure_logging(level=LOG_LEVEL, log_format=LOG_FORMAT, quiet=(LOG_QUIET == "True"))
+except ValueError as e:
+    print(f"ERORR: {e}. Aborting...")
+    exit(1)
+log = get_logger("setup")
+summary_log = logging.getLogger(SUMMARY_LOGGER)
 
 # print variables
-print("RESOURCE REGISTRY INIT: CONFIG SUMMARY (environment or defaults) ----------------------------------------------------------")
-print("SLM_HOST: ", SLM_HOST)
-print("SLM_USER: ", SLM_USER)
-print("SLM_PASSWORD: ", SLM_PASSWORD)
-print("RESOURCE_REGISTRY_HOST: ", RESOURCE_REGISTRY_HOST)
-print("SERVICE_REGISTRY_HOST: ", SERVICE_REGISTRY_HOST)
-print("KEYCLOAK_HOST: ", KEYCLOAK_HOST)
-print("XLSX_FILE: ", XLSX_FILE)
-print("SHEET_NAME: ", SHEET_NAME)
-print("FORCE_OVERWRITE: ", FORCE_OVERWRITE)
-print("FORCE_DELETE: ", FORCE_DELETE)
-print("DELETE_ALL: ", DELETE_ALL)
-print("PING_CHECK: ", PING_CHECK)
-print("GENERATE_UUID: ", GENERATE_UUID)
-print("AASX_FILE_FILTER: ", AASX_FILE_FILTER)
-print("RESOURCE REGISTRY INIT:----------------------------------------------------------------------------------------------------")
+log.info("RESOURCE REGISTRY INIT: CONFIG SUMMARY (environment or defaults) ----------------------------------------------------------")
+log.info(f"SLM_HOST: {SLM_HOST}")
+log.info(f"SLM_USER: {SLM_USER}")
+log.info(f"SLM_PASSWORD: {'***' if SLM_PASSWORD else ''}")
+log.info(f"RESOURCE_REGISTRY_HOST: {RESOURCE_REGISTRY_HOST}")
+log.info(f"SERVICE_REGISTRY_HOST: {SERVICE_REGISTRY_HOST}")
+log.info(f"KEYCLOAK_HOST: {KEYCLOAK_HOST}")
+log.info(f"XLSX_FILE: {XLSX_FILE}")
+log.info(f"SHEET_NAME: {SHEET_NAME}")
+log.info(f"FORCE_OVERWRITE: {FORCE_OVERWRITE}")
+log.info(f"FORCE_DELETE: {FORCE_DELETE}")
+log.info(f"DELETE_ALL: {DELETE_ALL}")
+log.info(f"PING_CHECK: {PING_CHECK}")
+log.info(f"GENERATE_UUID: {GENERATE_UUID}")
+log.info(f"PING_TIMEOUT: {PING_TIMEOUT}")
+log.info(f"PING_TCP: {PING_TCP}")
+log.info(f"RECONCILE: {RECONCILE}")
+log.info(f"RESUME: {RESUME}")
+log.info(f"JOURNAL_FILE: {JOURNAL_FILE}")
+log.info(f"AASX_HASH_FILE: {AASX_HASH_FILE}")
+log.info(f"AASX_MAX_PARALLEL: {AASX_MAX_PARALLEL}")
+log.info(f"AASX_FILE_FILTER: {AASX_FILE_FILTER}")
+log.info(f"MAX_WORKERS: {MAX_WORKERS}")
+log.info(f"MAX_CONCURRENCY_PER_HOST: {MAX_CONCURRENCY_PER_HOST}")
+log.info(f"HTTP_POOL_SIZE: {HTTP_POOL_SIZE}")
+log.info(f"HTTP_CONNECT_TIMEOUT: {HTTP_CONNECT_TIMEOUT}")
+log.info(f"HTTP_READ_TIMEOUT: {HTTP_READ_TIMEOUT}")
+log.info(f"READINESS_TIMEOUT: {READINESS_TIMEOUT}")
+log.info(f"WAIT_FOR_INSTALLS: {WAIT_FOR_INSTALLS}")
+log.info(f"INSTALL_TIMEOUT: {INSTALL_TIMEOUT}")
+log.info(f"HTTP_MAX_RETRIES: {HTTP_MAX_RETRIES}")
+log.info(f"HTTP_BACKOFF_BASE: {HTTP_BACKOFF_BASE}")
+log.info(f"HTTP_BACKOFF_MAX: {HTTP_BACKOFF_MAX}")
+log.info(f"CIRCUIT_BREAKER_THRESHOLD: {CIRCUIT_BREAKER_THRESHOLD}")
+log.info(f"CIRCUIT_BREAKER_RESET: {CIRCUIT_BREAKER_RESET}")
+log.info(f"RATE_LIMITS: {RATE_LIMITS}")
+log.info(f"REGISTRY_CACHE_FILE: {REGISTRY_CACHE_FILE}")
+log.info(f"METRICS_FILE: {METRICS_FILE}")
+log.info(f"METRICS_PROMETHEUS_FILE: {METRICS_PROMETHEUS_FILE}")
+log.info(f"SUMMARY_FILE: {SUMMARY_FILE}")
+log.info(f"MANIFEST_FILE: {MANIFEST_FILE}")
+log.info(f"MAX_SITES: {MAX_SITES}")
+log.info(f"LOG_LEVEL: {LOG_LEVEL}")
+log.info(f"LOG_FORMAT: {LOG_FORMAT}")
+log.info(f"LOG_QUIET: {LOG_QUIET}")
+log.info(f"VALIDATE: {VALIDATE}")
+log.info("RESOURCE REGISTRY INIT:----------------------------------------------------------------------------------------------------")
 
 
 def build_argparser():
@@ -54,281 +141,439 @@ def build_argparser():
     parser.add_argument("-f", "--force", default=False, action="store_true",
                         help="(optional) Force overwrite of resources, at creation"
                         "WARNING: this can cause problems in the resource registry!")
+    parser.add_argument("-r", "--reconcile", default=False, action="store_true",
+                        help="(optional) Only apply the difference between the EXCEL and the current registry state, "
+                        "instead of deleting and recreating (same as RECONCILE=True)")
+    parser.add_argument("--resume", default=False, action="store_true",
+                        help="(optional) Resume an interrupted run, skipping the steps completed in the journal (same as RESUME=True)")
+    parser.add_argument("-p", "--plan", default=False, action="store_true",
+                        help="(optional) Dry-run: only print the REST operations that would be performed, without touching the registry")
+    parser.add_argument("--snapshot", default=None,
+                        help="(optional) Plan against an offline JSON snapshot of the registry state, instead of the live registry")
+    parser.add_argument("--save-snapshot", default=None,
+                        help="(optional) Save the fetched registry state as JSON snapshot (only with '--plan')")
+    parser.add_argument("--plan-output", default=None,
+                        help="(optional) Write the plan as JSON to the given file (only with '--plan')")
+    parser.add_argument("-m", "--manifest", default=None,
+                        help="(optional) Provision all sites of the given JSON manifest in parallel, each with its own SLM host, "
+                        "credentials and inventory (same as MANIFEST_FILE)")
     return parser
 
 
-def main(args):
-    """The main function to add resources and their capabilites
+def print_summary(summary):
+    """Prints the summary of the run, and writes it to SUMMARY_FILE (if set)
+
     Args:
-        args (argparse arguments): the parsed args
+        summary (RunSummary): the outcome of the run
     """
+    summary_log.info("\nSUMMARY -------------------------------------------------------------------------------------------------------------------")
+    for _, title, records, line in summary.sections():
+        # in quiet mode, only the counts are logged
+        summary_log.info(f"{title}: '{len(records)}'" if LOG_QUIET == "True" else f"{title}: {json.dumps([line(record) for record in records], indent=2)}")
+    summary_log.info("Resource Registry Setup Done!")
+    summary_log.info(f"Took: {(time.time()-start_time):.2f}s")
+    if SUMMARY_FILE:
+        write_summary(SUMMARY_FILE, {**summary.to_dict(), "took_seconds": round(time.time()-start_time, 3)})
 
-    print(f"\nLoading data (XLSX_FILE='{XLSX_FILE}', SHEET_NAME='{SHEET_NAME}') ----------------------------------------------------------")
-    # check if EXCEL file exists
-    if not os.path.exists(XLSX_FILE):
-        print(f"ERORR: file '{XLSX_FILE}' does not exist. Please either add the file or change environment variable 'XLSX_FILE' accordingly!")
+
+def write_summary(path, summary):
+    """Writes the summary of the run as JSON, if a path is given
+
+    Args:
+        path (str): the path of the summary file
+        summary (dict): the summary
+    """
+    if not path:
+        return
+    if not os.path.isdir(os.path.dirname(path) or "."):
+        log.warning(f"WARNING: directory of SUMMARY_FILE '{path}' does not exist. The summary is not written!")
+        return
+    with open(path, "w") as summary_file:
+        json.dump(summary, summary_file, indent=2)
+
+
+def run_sites(manifest, args):
+    """Provisions all sites of the manifest in parallel, each as a separate run with its own settings, and prints the combined summary
+
+    Args:
+        manifest (str): the path of the manifest
+        args (argparse arguments): the parsed args, passed on to the run of every site
+    """
+    try:
+        targets = load_manifest(manifest)
+    except ValueError as e:
+        log.error(f"ERORR: {e}. Aborting...")
+        exit(1)
+    files = {
+        "JOURNAL_FILE": JOURNAL_FILE,
+        "AASX_HASH_FILE": AASX_HASH_FILE,
+        "METRICS_FILE": METRICS_FILE,
+        "METRICS_PROMETHEUS_FILE": METRICS_PROMETHEUS_FILE,
+        "REGISTRY_CACHE_FILE": REGISTRY_CACHE_FILE,
+        "SUMMARY_FILE": SUMMARY_FILE
+    }
+    site_args = [flag for flag, given in [("--force", args.force), ("--reconcile", args.reconcile), ("--resume", args.resume), ("--plan", args.plan)] if given]
+    max_sites = int(MAX_SITES) or len(targets)
+    log.info(f"\nStarting multi-site provisioning (MANIFEST_FILE='{manifest}', in total '{len(targets)}' sites, MAX_SITES={max_sites}):------------------------------------------------------------------------")
+    results = MultiSiteRunner(targets, files, max_parallel=max_sites, args=site_args).run()
+
+    combined = combine_summaries(results)
+    print_combined_summary(combined)
+    write_summary(SUMMARY_FILE, {**combined, "took_seconds": round(time.time()-start_time, 3)})
+    summary_log.info(f"Took: {(time.time()-start_time):.2f}s")
+    if combined["failed"]:
         exit(1)
-    # read file, and only use resources
-    sheet_names = pd.ExcelFile(XLSX_FILE).sheet_names 
-    
-    if SHEET_NAME in sheet_names:
-        df = pd.read_excel(XLSX_FILE, sheet_name=SHEET_NAME)
-        df_devices = df[df['is_resource']=="yes"]
-        print(f"Loaded '{len(df_devices)}' devices from sheet '{SHEET_NAME}' in file '{XLSX_FILE}'")
-    else:
-        print("ERORR: sheet name '{SHEET_NAME}' does not exist in file '{XLSX_FILE}'. Cannot process device data!")
 
-    if "LOCATIONS" in sheet_names:
-        df_locations = pd.read_excel(XLSX_FILE, sheet_name="LOCATIONS")
-        print(f"Loaded '{len(df_locations)}' devices from sheet 'LOCATIONS' in file '{XLSX_FILE}'")
-    else:
-        print("ERORR: sheet name 'LOCATIONS' does not exist in file '{XLSX_FILE}'. Cannot process location data!")
-    
-    if "SERVICE_GROUPS" in sheet_names:
-        df_groups = pd.read_excel(XLSX_FILE, sheet_name="SERVICE_GROUPS")
-        print(f"Loaded '{len(df_groups)}' service groups from sheet 'SERVICE_GROUPS' in file '{XLSX_FILE}'")
-    else:
-        print("ERORR: sheet name 'SERVICE_GROUPS' does not exist in file '{XLSX_FILE}'. Cannot process service group data!")  
 
-    # setup empty summary cache arrays
-    resources_added = []
-    resources_accessible = []
-    resources_capabilities_added = []
-    resources_deleted = []
-    locations_added = []
-    groups_added = []
-    aasxs_added = []
+def create_client():
+    """Creates the SLM client with the connection, concurrency, retry and rate limit settings of the environment
 
-    # get current state
-    print("\nFetching current state (resources, locations) ----------------------------------------------------------")
-    slm = slmClient(
+    Returns:
+        slmClient: the client
+    """
+    hosts = {
+        "slm": SLM_HOST,
+        "resource_registry": RESOURCE_REGISTRY_HOST,
+        "service_registry": SERVICE_REGISTRY_HOST,
+        "keycloak": KEYCLOAK_HOST
+    }
+    try:
+        limits = parse_rate_limits(RATE_LIMITS, hosts)
+    except ValueError as e:
+        log.error(f"ERORR: {e}. Aborting...")
+        exit(1)
+    cache_file = REGISTRY_CACHE_FILE or None
+    if cache_file and not os.path.isdir(os.path.dirname(cache_file) or "."):
+        log.warning(f"WARNING: directory of REGISTRY_CACHE_FILE '{cache_file}' does not exist. The registry state is only cached for this run!")
+        cache_file = None
+    return slmClient(
         host=SLM_HOST,
         host_keycloak=KEYCLOAK_HOST,
         host_resource_registry=RESOURCE_REGISTRY_HOST,
         host_service_registry=SERVICE_REGISTRY_HOST,
         slm_user=SLM_USER,
-        slm_password=SLM_PASSWORD
+        slm_password=SLM_PASSWORD,
+        max_concurrency_per_host=int(MAX_CONCURRENCY_PER_HOST),
+        pool_size=int(HTTP_POOL_SIZE),
+        connect_timeout=float(HTTP_CONNECT_TIMEOUT),
+        read_timeout=float(HTTP_READ_TIMEOUT),
+        retry_policy=RetryPolicy(
+            max_retries=int(HTTP_MAX_RETRIES),
+            base_delay=float(HTTP_BACKOFF_BASE),
+            max_delay=float(HTTP_BACKOFF_MAX)
+        ),
+        breaker_threshold=int(CIRCUIT_BREAKER_THRESHOLD),
+        breaker_reset_timeout=float(CIRCUIT_BREAKER_RESET),
+        rate_limiter=RateLimiter(limits),
+        cache=RegistryCache(cache_file)
     )
-    locations_current = slm.get_locations()
-    groups_current = slm.get_service_groups()
-    resources_current = [resource["id"] for resource in slm.get_resources()]
-
-    # add locations
-    if DELETE_ALL == 'True':
-        print(f"\nStarting locations clean up (DELETE_ALL={DELETE_ALL}):---------------------------------------------------------------------------------------")
-        for location_item in locations_current:
-            slm.delete_location(uuid=location_item['id'])
-    
-    if df_locations is not None and len(df_locations) > 0:
-        print(f"\nStarting adding locations (in total '{len(df_locations)}' locations):------------------------------------------------------------------------")
-        for index, row in df_locations.iterrows():
-            if slm.create_location(row["UUID"], row["Name"]):
-                locations_added.append(f'{row["Name"]} ({row["UUID"]})')
-    locations_current = [location["id"] for location in slm.get_locations()] 
-
-
-    ### add service groups
-    if DELETE_ALL == 'True':
-        print(f"\nStarting service group clean up (DELETE_ALL={DELETE_ALL}):---------------------------------------------------------------------------------------")
-        for group_item in groups_current:
-            slm.delete_service_group(uuid=group_item['id'])
-
-    if df_groups is not None and len(df_groups) > 0:
-        print(f"\nStarting adding service groups (in total '{len(df_groups)}' groups):-------------------------------------------------------------------------")
-        for index, row in df_groups.iterrows():
-
-            if slm.create_service_group(row["UUID"], row["Name"]):
-                groups_added.append(f'{row["Name"]} ({row["UUID"]})')
-    groups_current = [group["id"] for group in slm.get_service_groups()] 
-
-
-
-    # start with deleting all (currently available) resources, IF FORCE_DELETE is set
-    if FORCE_DELETE == 'True':
-        print(f"\nStarting resource clean up (DELETE_ALL={DELETE_ALL}, FORCE_DELETE={FORCE_DELETE}):-----------------------------------------------------------")
-        for resource in slm.get_resources():
-
-            # ensure resource will be added again, skip this if DELETE_ALL is set to True
-            if DELETE_ALL == 'True':
-                slm.delete_resource(uuid=resource["id"])
-                resources_deleted.append(f"{resource['id']}, {resource['hostname']}, {resource['ip']}")
-            else:
-                if resource["id"] in df["UUID"].tolist():
-                    slm.delete_resource(uuid=resource["id"])
-                    resources_deleted.append(f"{resource['id']}, {resource['hostname']}, {resource['ip']}")
-                else:
-                    print(f"Skipped deleting resource '{resource['id']}' since it is not in source file '{XLSX_FILE}'")
-
-        print("pause for registry to breath (long - 5s) ... will continue with adding resources\n------------------------------------------------------------------------")
-        time.sleep(5)
-
-
-    print(f"\nStarting resource creation (FORCE_OVERWRITE={FORCE_OVERWRITE}):------------------------------------------------------------------------")
-    # get already available resources first
-    resources_current = [resource["id"] for resource in slm.get_resources()]
-    # iterate through given resources from EXCEL
-    for index, row in df_devices.iterrows():
-        # create data item based on defaults
-        device_resource_item = DEFAULT_RESOURCE_ITEM.copy()
-        device_resource_item["resourceIp"] = row["eth0 IP"] if row["eth0 IP"]!="-" else row["eth1 IP"]
-        device_resource_item['resourceHostname'] = row["hostname"]
-
-        if row["connection-type"] != "-":
-            device_resource_item["resourceUsername"] = row["user"]
-            device_resource_item["resourcePassword"] = row["password"]
-            device_resource_item['resourceConnectionType'] = row["connection-type"]
-            device_resource_item['resourceConnectionPort'] = round(row["connection-port"])
-        
-        if row["location-uuid"]:
-            device_resource_item["resourceLocation"] = row["location-uuid"]
-            if not row["location-uuid"] in locations_current:
-                print(f"WARNING: Location uuid '{row['location-uuid']}' for resource '{device_resource_item['resourceHostname']}' not registered yet... But proceed adding resource")
-
-        # add flag for install of BaseConfigCapability (aka. FabOS Device Capability) - True/False
-        if "DC_Base" in row.keys() and (row["DC_Base"] in ["yes", "skip"]):
-            device_resource_item['resourceBaseConfiguration'] = "DC_Base"
-               
-
-        # check if hostname is available, IF PING_CHECK is set
-        if PING_CHECK == "True":
-
-           # ping hostname
-           if not ping(device_resource_item['resourceHostname']):
-                print(f"WARNING: Device '{row['UUID']}' with hostname '{device_resource_item['resourceHostname']}' is not available via PING!")
-
-           # additional IP ping test
-           if not ping(device_resource_item["resourceIp"]):
-                print(f"ERROR: Device '{row['UUID']}' with IP '{device_resource_item['resourceIp']}' is not available via PING. Aborting setup!")
-                break
-           resources_accessible.append(f"{row['UUID']}, {device_resource_item['resourceHostname']}, {device_resource_item['resourceIp']}")
-
-        # if resource already exists, check the FORCE_OVERWRITE argument, else create directly
-        if row['UUID'] in resources_current:
-            if (args.force) or (FORCE_OVERWRITE == 'True'):
-                print(f"WARNING: overwriting resource '{row['UUID']}' since it already exists")
-                print(slm.create_resource(uuid=row["UUID"], item=device_resource_item))
-                resources_added.append(f"{row['UUID']}, {device_resource_item['resourceHostname']}, {device_resource_item['resourceIp']}")
-            else:
-                print(f"WARNING: skipped overwriting resource '{row['UUID']}' since parameter '-f' was not given!")
-        else:
-            uuid_str = str(uuid.uuid4()) if GENERATE_UUID == "True" else row['UUID']
-            print(slm.create_resource(uuid=uuid_str, item=device_resource_item))
-            resources_added.append(f"{uuid_str}, {device_resource_item['resourceHostname']}, {device_resource_item['resourceIp']}")
-        
-        # print("pause for registry to breath")
-        time.sleep(0.3)
-        print("------------------------------------------------------------------------")
-
-    # only wait if resources were added, else continue direclty
-    if len(resources_added)  > 0:
-        print("pause for registry to breath (long - 10s) ... will continue with adding capabilities\n------------------------------------------------------------------------")
-        time.sleep(10)
-
-
-    print(f"\nChecking available resources:----------------------------------------------------------------------------------------------")
-    resources_current = [resource["id"] for resource in slm.get_resources()]
-    if len(resources_current) > 0:
-        print(f"'{len(resources_current)}' resources are available. Continuing with adding capabilities...")
-    else:
-        print(f"'{len(resources_current)}' resources are available. Additionally waiting 20s for resources...")
-        time.sleep(20)
-        print(f"Checking available resources again")
-        resources_current = [resource["id"] for resource in slm.get_resources()]
-        if len(resources_current) > 0:
-            print(f"'{len(resources_current)}' resources are available. Continuing with adding capabilities...")
-        else:
-            print(f"ERROR: '{len(resources_current)}' resources are available. Continuing, but expecting failure!")
-
-
-    print(f"\nStarting adding capabilities:----------------------------------------------------------------------------------------------")
-    resources_current = [resource["id"] for resource in slm.get_resources()]
-    for index, row in df_devices.iterrows():
-
-        # parse capabilities
-        capabilities = []
-        if "DC_Dummy" in row.keys() and (row["DC_Dummy"] in ["yes", "skip"]):
-            capabilities.append(("DUMMY", row["DC_Dummy"]))
-        if "DC_Docker" in row.keys() and (row["DC_Docker"] in ["yes", "skip"]):
-            capabilities.append(("DOCKER", row["DC_Docker"]))
-        if "DC_Transferapp" in row.keys() and (row["DC_Transferapp"] in ["yes", "skip"]):
-            capabilities.append(("TRANSFERAPP", row["DC_Transferapp"]))
-        if "DC_Swarm" in row.keys() and (row["DC_Swarm"] in ["yes", "skip"]):
-            capabilities.append(("DOCKER_SWARM", row["DC_Swarm"]))
-        if "DC_K3S" in row.keys() and (row["DC_K3S"] in ["yes", "skip"]):
-            capabilities.append(("K3S", row["DC_K3S"]))
-
-        if not len(capabilities) > 0:
-            print(f"WARN: no capabilities parse for resource '{row['UUID']}'. Will skip call to add ...")      
-            print("------------------------------------------------------------------------")
-            continue
 
-        if row["UUID"] in resources_current:
-            res = slm.add_capabilities(
-                uuid=row["UUID"],
-                capabilities=capabilities,
-                overwrite=(args.force) or (FORCE_OVERWRITE == 'True')
-            )
-
-            # only add capabilties to list if result is provided (implies that request succeeded)
-            if res:
-                print(res)
-                resources_capabilities_added.append(f"{row['UUID']}, {row['hostname']}, {capabilities}")
+
+def export_metrics(metrics):
+    """Prints the requests per endpoint and the stage timings, and writes the metrics report (JSON and optionally Prometheus)
+
+    Args:
+        metrics (Metrics): the metrics of the client
+    """
+    log.info("\nMETRICS -------------------------------------------------------------------------------------------------------------------")
+    metrics.print_endpoints()
+    for path, write in [(METRICS_FILE, metrics.write_json), (METRICS_PROMETHEUS_FILE, metrics.write_prometheus)]:
+        if not path:
+            continue
+        if os.path.isdir(os.path.dirname(path) or "."):
+            write(path)
         else:
-            print(f"FAILED: cannot add capabilities to resource {row['UUID']} since it is not registered at the registry (yet). Skipping...")
+            log.warning(f"WARNING: directory of metrics file '{path}' does not exist. Metrics are not written!")
+
+
+def wait_for_installs(slm, summary) -> bool:
+    """Waits until the capabilities added in this run are installed by the SLM (or failed), IF WAIT_FOR_INSTALLS is set
 
-        print("pause for registry to breath (long - 5s) ... will continue with adding aasx submodels\n------------------------------------------------------------------------")
-        time.sleep(5)
+    Args:
+        slm (slmClient): the client, which tracked the added capabilities
+        summary (RunSummary): the outcome of the run, the installs are added to
+
+    Returns:
+        bool: True if all installs finished in time (or none were waited for)
+    """
+    if WAIT_FOR_INSTALLS != "True":
+        return True
+    installs = slm.installs.installs()
+    log.info(f"\nWaiting for the installs of '{len(installs)}' capabilities (INSTALL_TIMEOUT={INSTALL_TIMEOUT}s):------------------------------------------------------------------------")
+    with slm.metrics.stage("installs"):
+        summary.installs = slm.installs.wait(timeout=float(INSTALL_TIMEOUT), max_workers=int(MAX_WORKERS))
+    print_installs(summary.installs)
+    return all(install.state == "installed" for install in summary.installs)
+
+
+def plan(inventory, args):
+    """Prints (and optionally writes) the REST operations a run would perform, without writing to the registry
+
+    Args:
+        inventory (Inventory): the devices, locations and service groups of the inventory
+        args (argparse arguments): the parsed args
+    """
+    reconcile_mode = (args.reconcile) or (RECONCILE == 'True')
+    log.info(f"\nPlanning operations (mode={'reconcile' if reconcile_mode else 'default'}, snapshot={args.snapshot or 'live'}):------------------------------------------------------------------------")
+    if args.snapshot:
+        state = load_snapshot(args.snapshot)
+    else:
+        slm = create_client()
+        state = fetch_state(slm, max_workers=int(MAX_WORKERS))
+        slm.close()
+        if args.save_snapshot:
+            save_snapshot(state, args.save_snapshot)
 
-    print(f"\nStarting adding aasx submodels:----------------------------------------------------------------------------------------------")
-    resources_current = [resource["id"] for resource in slm.get_resources()]
     aasx_files = glob.glob(AASX_FILE_FILTER, recursive=True)
-    print(f"Found '{len(aasx_files)}' AASX file(s) for filter '{AASX_FILE_FILTER}' ...\n")
+    overwrite = (args.force) or (FORCE_OVERWRITE == 'True')
+    if reconcile_mode:
+        operations = build_reconcile_plan(state, inventory, aasx_files=aasx_files, overwrite=overwrite, prune=(DELETE_ALL == 'True'))
+    else:
+        hash_store = UploadHashStore(AASX_HASH_FILE if os.path.exists(AASX_HASH_FILE) else None)
+        uploader = AasxUploader(None, hash_store=hash_store)
+        operations = build_default_plan(
+            state, inventory,
+            aasx_files=aasx_files,
+            overwrite=overwrite,
+            force_delete=(FORCE_DELETE == 'True'),
+            delete_all=(DELETE_ALL == 'True'),
+            generate_uuid=(GENERATE_UUID == "True"),
+            is_uploaded=lambda uuid, path: hash_store.is_uploaded(uuid, path, uploader.file_hash(path))
+        )
+        uploader.close()
+
+    print_plan(operations)
+    if args.plan_output:
+        write_plan(operations, args.plan_output)
+    summary_log.info(f"Planning Done! (no changes were made)\nTook: {(time.time()-start_time):.2f}s")
+
+
+def reconcile(slm, inventory, args):
+    """Applies only the difference between the inventory and the current registry state
 
-    for index, row in df_devices.iterrows():
+    Args:
+        slm (slmClient): the client to use
+        inventory (Inventory): the devices, locations and service groups of the inventory
+        args (argparse arguments): the parsed args
+    """
+    log.info(f"\nStarting reconciliation (FORCE_OVERWRITE={FORCE_OVERWRITE}, DELETE_ALL={DELETE_ALL}):------------------------------------------------------------------------")
+    state = fetch_state(slm, max_workers=int(MAX_WORKERS))
+    plan = compute_plan(
+        state,
+        inventory,
+        aasx_files=glob.glob(AASX_FILE_FILTER, recursive=True),
+        overwrite=(args.force) or (FORCE_OVERWRITE == 'True'),
+        prune=(DELETE_ALL == 'True')
+    )
+    if not plan:
+        log.info("Registry is up to date, nothing to do")
+    else:
+        log.info(f"Reconciliation plan: {json.dumps(summarize_plan(plan))}")
+
+    summary = RunSummary()
+    for operation, succeeded in apply_plan(slm, plan, max_workers=int(MAX_WORKERS), readiness_timeout=float(READINESS_TIMEOUT)):
+        if succeeded:
+            summary.add_operation(operation, state)
+    installed = wait_for_installs(slm, summary)
+    slm.close()
+    export_metrics(slm.metrics)
+
+    print_summary(summary)
+    if not installed:
+        exit(1)
 
-        # parse aasx files
 
-        capabilities = []
-        if "aasx-filter-substring" in row.keys() and len(str(row["aasx-filter-substring"])) > 0 and str(row["aasx-filter-substring"]) != "nan":
-            paths = [aasx_path for aasx_path in aasx_files if str(row["aasx-filter-substring"]) in aasx_path]
-            files = [("aasx", open(path, 'rb')) for path in paths]
-            print(f"Found '{len(paths)}' aasx files matching given filter substring '{str(row['aasx-filter-substring'])}' for resource '{row['UUID']}' ...")
+def main(args):
+    """The main function to add resources and their capabilites
+    Args:
+        args (argparse arguments): the parsed args
+    """
 
-        else:
-            print(f"WARN: no aasx files filter (aasx-filter-substring) available for for resource '{row['UUID']}'. Will skip to add submodels ...")      
-            print("------------------------------------------------------------------------")
-            continue
+    # provision every site of the manifest instead, IF '--manifest' or MANIFEST_FILE is given
+    if args.manifest or MANIFEST_FILE:
+        run_sites(args.manifest or MANIFEST_FILE, args)
+        return
 
-        if row["UUID"] in resources_current:
+    if VALIDATE not in VALIDATION_MODES:
+        log.error(f"ERORR: unknown value '{VALIDATE}' of environment variable 'VALIDATE', expected one of {VALIDATION_MODES}. Aborting...")
+        exit(1)
 
-            for file_item in files:
-                res = slm.add_submodels(
-                    uuid=row["UUID"],
-                    files=[file_item]
-                )
-                time.sleep(3)
+    log.info(f"\nLoading data (XLSX_FILE='{XLSX_FILE}', SHEET_NAME='{SHEET_NAME}') ----------------------------------------------------------")
+    # check if EXCEL file exists
+    if not os.path.exists(XLSX_FILE):
+        log.error(f"ERORR: file '{XLSX_FILE}' does not exist. Please either add the file or change environment variable 'XLSX_FILE' accordingly!")
+        exit(1)
+    # read file (EXCEL, CSV, Parquet or JSON) once, and only use resources
+    try:
+        inventory = load_inventory(XLSX_FILE, sheet_name=SHEET_NAME, generate_uuid=(GENERATE_UUID == "True"))
+    except ColumnError as e:
+        print_issues([column_issue(e)])
+        log.error("ERORR: the inventory is invalid, no request was sent. Please fix the errors above. Aborting...")
+        exit(1)
+    except ValueError as e:
+        log.error(f"ERORR: {e}. Cannot process device data!")
+        exit(1)
+    log.info(f"Loaded '{len(inventory.resources)}' devices from sheet '{SHEET_NAME}' in file '{XLSX_FILE}'")
 
-                # only add submodels to list if result is provided (implies that request succeeded)
-                if res:
-                    aasxs_added.append(f"{row['UUID']}, {file_item}")
+    if inventory.locations is not None:
+        log.info(f"Loaded '{len(inventory.locations)}' locations from sheet 'LOCATIONS' in file '{XLSX_FILE}'")
+    else:
+        log.error(f"ERORR: sheet name 'LOCATIONS' does not exist in file '{XLSX_FILE}'. Cannot process location data!")
+
+    if inventory.service_groups is not None:
+        log.info(f"Loaded '{len(inventory.service_groups)}' service groups from sheet 'SERVICE_GROUPS' in file '{XLSX_FILE}'")
+    else:
+        log.error(f"ERORR: sheet name 'SERVICE_GROUPS' does not exist in file '{XLSX_FILE}'. Cannot process service group data!")
+
+    # check the whole inventory before any request is sent, IF VALIDATE is not 'off' (abort on errors, IF VALIDATE is 'strict')
+    if VALIDATE != "off":
+        log.info(f"\nValidating the inventory (VALIDATE='{VALIDATE}') ----------------------------------------------------------")
+        issues = validate_inventory(inventory, generate_uuid=(GENERATE_UUID == "True"), sheet_name=SHEET_NAME)
+        print_issues(issues)
+        if VALIDATE == "strict" and not args.plan and any(issue.severity == "error" for issue in issues):
+            log.error("ERORR: the inventory is invalid, no request was sent. Please fix the errors above (or set VALIDATE=warn). Aborting...")
+            exit(1)
+    else:
+        # devices may only reference locations of the inventory (looked up in the index, instead of scanning the lists)
+        unknown_locations = inventory.unknown_locations()
+        if inventory.locations is not None and unknown_locations:
+            log.warning(f"WARNING: '{len(unknown_locations)}' location uuids of devices are not listed in sheet 'LOCATIONS': {sorted(unknown_locations)}")
+        if inventory.without_uuid:
+            log.warning(f"WARNING: skipped '{len(inventory.without_uuid)}' resources without UUID in sheet '{SHEET_NAME}' (set GENERATE_UUID=True to generate one)")
+
+    # every uuid is written once: later rows with the same uuid are dropped (whatever VALIDATE is set to)
+    for kind, record in inventory.deduplicate():
+        log.warning(f"WARNING: dropped {kind.replace('_', ' ')} '{record.uuid}' ('{getattr(record, 'hostname', None) or getattr(record, 'name', None)}', row {record.row}), since its uuid is listed in an earlier row already")
+
+    # collect the outcome of the run as typed records
+    summary = RunSummary()
+
+    # only print the plan, IF '--plan' is given
+    if args.plan:
+        plan(inventory, args)
+        return
+
+    # get current state
+    log.info("\nFetching current state (resources, locations) ----------------------------------------------------------")
+    slm = create_client()
+
+    # only apply the difference, IF RECONCILE is set
+    if (args.reconcile) or (RECONCILE == 'True'):
+        reconcile(slm, inventory, args)
+        return
+
+    # journal the completed steps, to be able to resume an interrupted run
+    if os.path.isdir(os.path.dirname(JOURNAL_FILE) or "."):
+        journal = ProgressJournal(JOURNAL_FILE, resume=(args.resume) or (RESUME == 'True'))
+    else:
+        log.warning(f"WARNING: directory of JOURNAL_FILE '{JOURNAL_FILE}' does not exist. Progress is not journaled, the run can not be resumed!")
+        journal = ProgressJournal()
+
+    locations_current = slm.get_locations()
+    groups_current = slm.get_service_groups()
+    resources_current = slm.get_resources()
+
+    # clean up first (IF FORCE_DELETE or DELETE_ALL is set): resources, then the locations and service groups they reference
+    if (FORCE_DELETE == 'True') or (DELETE_ALL == 'True'):
+        with slm.metrics.stage("delete"):
+            teardown = Teardown(slm, max_workers=int(MAX_WORKERS), readiness_timeout=float(READINESS_TIMEOUT), journal=journal)
+            for resource in teardown.run(
+                resources=resources_current,
+                locations=locations_current,
+                service_groups=groups_current,
+                device_uuids=inventory.device_uuids,
+                force_delete=(FORCE_DELETE == 'True'),
+                delete_all=(DELETE_ALL == 'True')
+            ):
+                summary.resources_deleted.append(ResourceRecord.from_item(resource))
+
+    log.info(f"\nStarting resource provisioning (FORCE_OVERWRITE={FORCE_OVERWRITE}, MAX_WORKERS={MAX_WORKERS}):------------------------------------------------------------------------")
+    # get already available locations, resources and aasx files first
+    with slm.metrics.stage("prefetch"):
+        locations_current = {location["id"] for location in slm.get_locations(cached=True)}
+        resources_current = {resource["id"] for resource in slm.get_resources(cached=True)}
+        slm.capabilities.prefetch(resources_current, max_workers=int(MAX_WORKERS))
+    aasx_files = glob.glob(AASX_FILE_FILTER, recursive=True)
+    if os.path.isdir(os.path.dirname(AASX_HASH_FILE) or "."):
+        hash_store = UploadHashStore(AASX_HASH_FILE)
+    else:
+        log.warning(f"WARNING: directory of AASX_HASH_FILE '{AASX_HASH_FILE}' does not exist. Unchanged AASX files will be uploaded again on the next run!")
+        hash_store = UploadHashStore()
+    uploader = AasxUploader(slm, hash_store=hash_store, max_parallel=int(AASX_MAX_PARALLEL))
+    log.info(f"Found '{len(aasx_files)}' AASX file(s) for filter '{AASX_FILE_FILTER}' ...\n")
+
+    # check the reachability of all devices at once, IF PING_CHECK is set
+    reachability = None
+    if PING_CHECK == "True":
+        log.info(f"Checking reachability of '{len(inventory.resources)}' devices (PING_TIMEOUT={PING_TIMEOUT}s, PING_TCP={PING_TCP}) ...")
+        with slm.metrics.stage("reachability"):
+            reachability = ReachabilityScanner(timeout=float(PING_TIMEOUT), tcp=(PING_TCP == "True")).scan(inventory.resources)
+        print_results(reachability)
+
+    provisioner = Provisioner(
+        slm=slm,
+        max_workers=int(MAX_WORKERS),
+        overwrite=(args.force) or (FORCE_OVERWRITE == 'True'),
+        ping_check=(PING_CHECK == "True"),
+        generate_uuid=(GENERATE_UUID == "True"),
+        resources_current=resources_current,
+        locations_current=locations_current,
+        aasx_files=aasx_files,
+        readiness_timeout=float(READINESS_TIMEOUT),
+        journal=journal,
+        uploader=uploader,
+        reachability=reachability
+    )
+
+    def create_named(kind, record):
+        """Creates a location or service group of the inventory, unless it was created in the journaled run
+        """
+        if journal.is_done(record.uuid, kind):
+            return True
+        if kind == "location":
+            res = slm.create_location(record.uuid, record.name)
         else:
-            print(f"FAILED: cannot add aasx submodels to resource {row['UUID']} since it is not registered at the registry (yet). Skipping...")
-        print("------------------------------------------------------------------------")
-        time.sleep(1)
+            res = slm.create_service_group(record.uuid, record.name)
+        if res:
+            (summary.locations_added if kind == "location" else summary.groups_added).append(record)
+        if not isinstance(res, requests.models.Response):
+            return False
+        journal.record(record.uuid, kind)
+        if kind == "location":
+            provisioner.locations_current.add(record.uuid)
+        return True
+
+    # every location, service group, resource, capability and submodel is a task, which only waits for the tasks it depends on
+    # (a resource for its location, the capabilities and submodels of a device for its resource), instead of a global stage
+    graph = TaskGraph()
+    location_tasks = {}
+    for kind, stage, records in [("location", "locations", inventory.locations), ("service_group", "groups", inventory.service_groups)]:
+        for record in records or []:
+            key = graph.add(f"{kind}/{record.uuid}", lambda kind=kind, record=record: create_named(kind, record), stage=stage)
+            if kind == "location":
+                location_tasks[record.uuid] = key
+    log.info(f"Adding '{len(inventory.locations or [])}' locations, '{len(inventory.service_groups or [])}' service groups and '{len(inventory.resources)}' resources ...")
+    results = provisioner.schedule(graph, inventory.resources, locations=location_tasks)
+    with slm.metrics.stage("provisioning"):
+        graph.run(max_workers=int(MAX_WORKERS), metrics=slm.metrics)
+    log.info(f"Finished '{len(graph)}' tasks: {json.dumps(graph.counts())}")
+    for result in results:
+        summary.add_result(result)
+
+    # wait until the SLM has installed the added capabilities, IF WAIT_FOR_INSTALLS is set
+    installed = wait_for_installs(slm, summary)
+
+    # release the kept-alive connections
+    uploader.close()
+    slm.close()
+    journal.close()
+    export_metrics(slm.metrics)
 
 
     # finish
-    print("\nSUMMARY -------------------------------------------------------------------------------------------------------------------")
-    print(f"Resources deleted (via REST): {json.dumps(resources_deleted, indent=2)}")
-    print(f"Resources accessible (via ping): {json.dumps(resources_accessible, indent=2)}")
-    print(f"Locations added to registry (via REST): {json.dumps(locations_added, indent=2)}")
-    print(f"Service Groups added to registry (via REST): {json.dumps(groups_added, indent=2)}")
-    print(f"Resources added to registry (via REST): {json.dumps(resources_added, indent=2)}")
-    print(f"Capabilities added to resources (via REST): {json.dumps(resources_capabilities_added, indent=2)}")
-    print(f"AAS submodels added to resources (via REST): {json.dumps(aasxs_added, indent=2)}")
-    print("Resource Registry Setup Done!")
-    print(f"Took: {(time.time()-start_time):.2f}s")
-
+    print_summary(summary)
+    if not installed:
+        exit(1)
 
 if __name__ == "__main__":
 
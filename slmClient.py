@@ -1,5 +1,24 @@
 import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from tokenManager import TokenManager, TokenError
+from aasxUpload import MultipartFileStream
+from metrics import Metrics
+from capabilities import CAPABILITY_NAME_TO_ID, capability_action, capability_url
+from resilience import RetryPolicy, CircuitBreaker, rejected_token
+from rateLimiter import RateLimiter, operation_of
+from registryCache import RegistryCache
+from installTracker import InstallTracker
+from jsonStream import iter_json_array
+from structuredLog import get_logger
+
+log = get_logger("slmClient")
 
 DEFAULT_RESOURCE_ITEM = {
     "resourceHostname": "",
@@ -7,55 +26,358 @@ DEFAULT_RESOURCE_ITEM = {
     "resourceConnectionPort": 0
 }
 
-CAPABILITY_NAME_TO_ID = {
-    "BASE" : "657d64b6-7f8a-41b7-8202-d3fb7c0ddaac",
-    "DUMMY" : "2c8cafe5-1155-471c-9639-0db48ec249eb",
-    "DOCKER": "08c5b8de-5d4a-4116-a73f-1d1f616c7c70",
-    "TRANSFERAPP": "110d43ff-f351-4e55-92c0-77625875ce6e",
-    "DOCKER_SWARM": "5dcb8fc8-556b-4735-9c80-fce546e7bd7a",
-    "K3S": "21afb100-01f9-4915-9c8c-bf9afc032c01",
-    "KUBERNETES": "a2ae8818-09ae-4e86-8e5a-2effb1122fa6"
+# the fields of a resource item -> the field the resource registry returns them as.
+# The password (resourcePassword) is never returned, so it can not be compared with the registry
+RESOURCE_FIELDS = {
+    "resourceHostname": "hostname",
+    "resourceIp": "ip",
+    "resourceLocation": "locationId",
+    "resourceUsername": "username",
+    "resourceConnectionType": "connectionType",
+    "resourceConnectionPort": "connectionPort",
+    "resourceBaseConfiguration": "baseConfiguration"
 }
 
+def resource_fields(item: dict) -> dict:
+    """Returns the fields of a resource item as the resource registry returns them (see RESOURCE_FIELDS)
+    """
+    fields = {field: item.get(key) for key, field in RESOURCE_FIELDS.items()}
+    if fields["baseConfiguration"] == "DC_Base":
+        fields["baseConfiguration"] = CAPABILITY_NAME_TO_ID["BASE"]
+    return fields
+
+
+def file_names(files) -> list:
+    """Returns the names of the files of a multipart upload (as for requests, e.g. [('aasx', (filename, file object))]),
+    to log them instead of the file objects
+    """
+    items = files.items() if isinstance(files, dict) else files or []
+    return [file_item[0] if isinstance(file_item, (tuple, list)) else getattr(file_item, "name", str(file_item)) for _, file_item in items]
+
+
+class ResourceRecord():
+    """A lightweight record of a registered resource, as yielded by slmClient.iter_resources
+    """
+    __slots__ = ("uuid", "hostname", "ip")
+
+    def __init__(self, uuid: str, hostname: str = None, ip: str = None):
+        self.uuid = uuid
+        self.hostname = hostname
+        self.ip = ip
+
+
+    @classmethod
+    def from_item(cls, item: dict):
+        """Creates the record from a resource item of the registry
+        """
+        return cls(item["id"], item.get("hostname"), item.get("ip"))
+
+
+    def to_dict(self) -> dict:
+        return {"id": self.uuid, "hostname": self.hostname, "ip": self.ip}
+
+
+    def __repr__(self):
+        return f"ResourceRecord('{self.uuid}', hostname='{self.hostname}', ip='{self.ip}')"
+
+
+class CapabilityIndex():
+    """In-memory index of the deployment capability names of every resource, kept for the run.
+    Every resource is fetched at most once, afterwards the index is updated by the client's own writes
+    """
+    def __init__(self, slm):
+        self.slm = slm
+        self._names = {}
+        self._lock = threading.Lock()
+
+
+    def _fetch(self, uuid: str) -> set:
+        """Fetches the capability names of the resource, parsing the response once
+        """
+        return {item['name'] for item in self.slm.get_deployment_capabilities(uuid)}
+
+
+    def prefetch(self, uuids: list, max_workers: int) -> dict:
+        """Fetches the deployment capabilities of all given resources concurrently
+
+        Args:
+            uuids (list): the uuids of the resources
+            max_workers (int): the number of concurrent requests
+
+        Returns:
+            dict: the capability names (set) by resource uuid
+        """
+        uuids = list(uuids)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            fetched = dict(zip(uuids, executor.map(self._fetch, uuids)))
+        with self._lock:
+            self._names.update(fetched)
+        log.info(f"Fetched deployment capabilities of '{len(fetched)}' resources")
+        return {uuid: set(names) for uuid, names in fetched.items()}
+
+
+    def get(self, uuid: str) -> set:
+        """Returns the capability names of the resource, fetched only if not indexed yet
+
+        Args:
+            uuid (str): the uuid of the resource
+
+        Returns:
+            set: the capability names
+        """
+        with self._lock:
+            if uuid in self._names:
+                return set(self._names[uuid])
+        names = self._fetch(uuid)
+        with self._lock:
+            self._names.setdefault(uuid, names)
+            return set(self._names[uuid])
+
+
+    def add(self, uuid: str, name: str):
+        """Records an added capability, if the resource is indexed
+        """
+        with self._lock:
+            if uuid in self._names:
+                self._names[uuid].add(name)
+
+
+    def reset(self, uuid: str):
+        """Records a new resource, which has no capabilities yet
+        """
+        with self._lock:
+            self._names[uuid] = set()
+
+
+    def forget(self, uuid: str):
+        """Removes a (deleted) resource from the index
+        """
+        with self._lock:
+            self._names.pop(uuid, None)
+
+
 class slmClient():
     """A client class for interaction with the SLM
     """
-    def __init__(self, host, host_keycloak, host_resource_registry, host_service_registry, slm_user, slm_password):
+    def __init__(self, host, host_keycloak, host_resource_registry, host_service_registry, slm_user, slm_password,
+                 max_concurrency_per_host=8, pool_size=None, connect_timeout=5.0, read_timeout=60.0, metrics=None,
+                 retry_policy=None, breaker_threshold=5, breaker_reset_timeout=10.0, rate_limiter=None, cache=None):
         self.host = host
         self.host_keycloak = host_keycloak
         self.host_resource_registry = host_resource_registry
         self.host_service_registry = host_service_registry
         self.slm_user = slm_user
         self.slm_password = slm_password
-        self.token = f"Bearer {self.get_keycloak_token()}"
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.pool_size = pool_size or max_concurrency_per_host
+        self.timeout = (connect_timeout, read_timeout)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset_timeout = breaker_reset_timeout
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.cache = cache or RegistryCache()
+        self._host_slots = {}
+        self._breakers = {}
+        self._sessions = {}
+        self._hosts_lock = threading.Lock()
+        self.metrics = metrics or Metrics()
+        self.capabilities = CapabilityIndex(self)
+        self.installs = InstallTracker(self)
+        self.tokens = TokenManager(
+            host_keycloak=self.host_keycloak,
+            user=self.slm_user,
+            password=self.slm_password,
+            # token requests do not change anything, so they are always safe to retry
+            request=lambda **kwargs: self._request(idempotent=True, **kwargs)
+        )
+        try:
+            self.tokens.get_token()
+        except (TokenError, requests.exceptions.RequestException) as e:
+            log.error(f"ERORR: can not get access_token from keycloak {e}. Aborting...")
+            exit(1)
 
 
-    def get_keycloak_token(self) -> str:
-        """Catch Bearer token from Keycloak
+    @property
+    def token(self) -> str:
+        """The bearer token, shared by all requests and renewed by the token manager before it expires
+        """
+        return f"Bearer {self.tokens.get_token()}"
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def close(self):
+        """Closes the pooled sessions (and their kept-alive connections) of all hosts, and saves the registry cache
+        """
+        self.cache.save()
+        with self._hosts_lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+    def _host_of(self, url: str) -> str:
+        """Returns the host (scheme://netloc) of the given url
+
+        Args:
+            url (str): the url of the request
+
         Returns:
-            str: bearer token as str
+            str: the host of the url
         """
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}"
 
-        token_data = {
-            "client_id": "self-service-portal",
-            "grant_type": "password",
-            "username": self.slm_user,
-            "password": self.slm_password
-        }
-        headers = {'Content-Type': 'application/x-www-form-urlencoded'}
 
-        res = requests.post(
-            url=f"{self.host_keycloak}/auth/realms/fabos/protocol/openid-connect/token",
-            data=token_data,
-            headers=headers
-        )
+    def _host_slot(self, host: str) -> threading.BoundedSemaphore:
+        """Returns the semaphore limiting the concurrent requests to the given host
 
-        if "access_token" in res.json().keys():
-            print(f"SUCCESS({res.status_code}): got access_token from keycloak")
-        else:
-            print(f"ERORR({res.status_code}): can not get access_token from keycloak ({res.json()['error_description']}). Aborting...")
-            exit(1)
-        return res.json()["access_token"]
+        Args:
+            host (str): the host of the request
+
+        Returns:
+            threading.BoundedSemaphore: the semaphore shared by all requests to that host
+        """
+        with self._hosts_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_concurrency_per_host)
+            return self._host_slots[host]
+
+
+    def _breaker(self, host: str) -> CircuitBreaker:
+        """Returns the circuit breaker of the given host
+
+        Args:
+            host (str): the host of the request
+
+        Returns:
+            CircuitBreaker: the breaker shared by all requests to that host
+        """
+        with self._hosts_lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(host, failure_threshold=self.breaker_threshold, reset_timeout=self.breaker_reset_timeout)
+            return self._breakers[host]
+
+
+    def _session(self, host: str) -> requests.Session:
+        """Returns the pooled session of the given host. Connections of the pool are kept alive and reused
+
+        Args:
+            host (str): the host of the request
+
+        Returns:
+            requests.Session: the session shared by all requests to that host
+        """
+        with self._hosts_lock:
+            if host not in self._sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update({'Connection': 'keep-alive'})
+                self._sessions[host] = session
+            return self._sessions[host]
+
+
+    def _request(self, method: str, url: str, idempotent: bool = None, **kwargs) -> requests.models.Response:
+        """Sends a HTTP request through the pooled session of the host, while respecting the concurrency limit per host.
+        Transient failures (connection errors, 429, 502, 503, 504) are retried with backoff, as far as the request
+        is safe to repeat, and requests are paused while the circuit of the host is open
+
+        Args:
+            method (str): the HTTP method
+            url (str): the full url of the request
+            idempotent (bool): overrides the idempotency derived from the method (e.g. POST with a client-chosen id)
+            **kwargs: passed on to requests
+
+        Returns:
+            requests.models.Response: the raw HTTP response (the last one, if all retries failed)
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        host = self._host_of(url)
+        breaker = self._breaker(host)
+        # identifies this request at the circuit breaker, if it is sent as probe
+        probe = object()
+        attempt = 0
+        while True:
+            breaker.acquire(owner=probe)
+            try:
+                res = self._send(host, method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                delay = self.retry_policy.next_attempt(breaker, method, url, attempt, error=e, idempotent=idempotent)
+                if delay is None:
+                    raise
+            else:
+                delay = self.retry_policy.next_attempt(breaker, method, url, attempt, status=res.status_code,
+                                                       retry_after=res.headers.get("Retry-After"), idempotent=idempotent)
+                if delay is None:
+                    break
+                # release the connection of a (streamed) response, which is not used
+                res.close()
+            finally:
+                # a probe ending without outcome (e.g. an unexpected error) must not block the host
+                breaker.release_probe(probe)
+
+            self.metrics.record_retry(method, url)
+            self._rewind(kwargs)
+            time.sleep(delay)
+            attempt += 1
+            # the token may have been renewed in the meantime
+            if "Authorization" in (kwargs.get("headers") or {}):
+                kwargs["headers"] = {**kwargs["headers"], "Authorization": self.token}
+
+        # retry once with a renewed token, if the token was rejected
+        token = rejected_token(method, url, res.status_code, kwargs.get("headers"))
+        if token is not None:
+            self.metrics.record_retry(method, url)
+            self.tokens.invalidate(token)
+            kwargs["headers"] = {**kwargs["headers"], "Authorization": self.token}
+            self._rewind(kwargs)
+            res.close()
+            res = self._send(host, method, url, **kwargs)
+        return res
+
+
+    def _rewind(self, kwargs: dict):
+        """Rewinds the streamed bodies of a request, to send it again
+        """
+        for file_item in [kwargs.get("data")] + [file_item for _, file_item in kwargs.get("files") or []]:
+            if hasattr(file_item, "seek"):
+                file_item.seek(0)
+
+
+    def _send(self, host: str, method: str, url: str, **kwargs) -> requests.models.Response:
+        """Sends a single HTTP request within the rate limit of its operation and the concurrency limit of the host,
+        and records it in the metrics. The latency is measured from sending (after waiting for a free slot) until the response is received
+
+        Returns:
+            requests.models.Response: the raw HTTP response
+        """
+        data = kwargs.get("data")
+        bytes_uploaded = len(data) if isinstance(data, (bytes, MultipartFileStream)) else len(data.encode()) if isinstance(data, str) else 0
+        with self.rate_limiter.admit(host, operation_of(method, url)) as throttled, self._host_slot(host):
+            start = time.monotonic()
+            try:
+                res = self._session(host).request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self.metrics.record_request(method, url, type(e).__name__, time.monotonic() - start, bytes_uploaded, throttled)
+                raise
+        self.metrics.record_request(method, url, res.status_code, time.monotonic() - start, bytes_uploaded, throttled)
+        return res
+
+
+    def get_keycloak_token(self) -> str:
+        """Catch Bearer token from Keycloak (through the token manager, only fetched if expired)
+        Returns:
+            str: bearer token as str
+        """
+        return self.tokens.get_token()
 
 
     def delete_resource(self, uuid:str) -> requests.models.Response:
@@ -71,7 +393,8 @@ class slmClient():
             'Realm': 'fabos'
         }
 
-        res = requests.delete(
+        res = self._request(
+            method="DELETE",
             url=f"{self.host_resource_registry}/resources/{uuid}",
             headers=headers
             #data={
@@ -80,9 +403,11 @@ class slmClient():
         )
 
         if res.status_code == 200:
-            print(f"SUCCESS({res.status_code}): removed resource '{uuid}'")
+            log.info(f"SUCCESS({res.status_code}): removed resource '{uuid}'")
+            self.capabilities.forget(uuid)
+            self.cache.remove(f"{self.host_resource_registry}/resources", uuid)
         else:
-            print(f"FAILED({res.status_code}): removed resource '{uuid}'")
+            log.error(f"FAILED({res.status_code}): removed resource '{uuid}'")
 
         return res
 
@@ -109,7 +434,8 @@ class slmClient():
             else:
                 del item["resourceBaseConfiguration"]
 
-        res = requests.put(
+        res = self._request(
+            method="PUT",
             url=f"{self.host_resource_registry}/resources/{uuid}",
             data=item,
             headers=headers
@@ -117,9 +443,10 @@ class slmClient():
 
 
         if res.status_code in [200, 201]:
-            print(f"SUCCESS({res.status_code}): added resource '{uuid}' with config: {item}")
+            log.info(f"SUCCESS({res.status_code}): added resource '{uuid}'", extra={"fields": {"hostname": item.get("resourceHostname"), "ip": item.get("resourceIp")}})
+            self.cache.upsert(f"{self.host_resource_registry}/resources", uuid, resource_fields(item))
         else:
-            print(f"FAILED({res.status_code}): added resource '{uuid}' with config: {item}: Response: {res.json()}")
+            log.error(f"FAILED({res.status_code}): added resource '{uuid}'", extra={"fields": {"hostname": item.get("resourceHostname"), "ip": item.get("resourceIp"), "response": res.text[:1000]}})
 
         return res
 
@@ -135,61 +462,20 @@ class slmClient():
         Returns:
             requests.models.Response: the raw http response
         """
-        if capabilities:
-
-            capability_options = ["DUMMY", "DOCKER", "TRANSFERAPP", "DOCKER_SWARM", "K3S"]
-
-            # prepare requets
-            headers = {
-                'Authorization': self.token,
-                'Realm': 'fabos',
-                'Content-Type': 'application/json'
-            }
-
-            # get already registered capability of given resource
-            res_get = requests.get(
-                url=f"{self.host_resource_registry}/resources/{uuid}/deployment-capabilities",
-                headers=headers
-            )
-
-            # iterate through given capability candidates given
-            for capability_item in capabilities:
-
-                # filter if capability candidate is valid, else skip adding
-                if capability_item[0] in capability_options:
-
-                    if len(res_get.json()) < 1:
-
-                        print(f"Adding capability '{capability_item[0]}' to resource '{uuid}'. Since resource has no capabilities yet")
-                        res = self.add_capability(uuid=uuid, capability=capability_item[0], row_value=capability_item[1])
-
-                    else:
-                        # parse fetched capabilties
-                        parsed_available_capabilities = [ item['name'] for item in res_get.json()]
-
-                        # add capability if already is registered but overwirte is True
-                        if (capability_item[0] in parsed_available_capabilities) and overwrite:
-                            print(f"OVERWRITE: adding capability '{capability_item[0]}' to resource '{uuid}'. Overwriting already available capbility!")
-                            res = self.add_capability(uuid=uuid, capability=capability_item[0], row_value=capability_item[1])
-
-                        # add capability if specific capability is not already registered
-                        elif capability_item[0] not in parsed_available_capabilities:
-                            print(f"Adding capability '{capability_item[0]}' to resource '{uuid}'. Since resource has the capability not yet!")
-                            res = self.add_capability(uuid=uuid, capability=capability_item[0], row_value=capability_item[1])
-
-                        # skip adding capbility
-                        else:
-                            print(f"SKIP: skipping adding capability '{capability_item[0]}' to resource '{uuid}'. Since it already has the capbility and FORCE_OVERWRITE is not given!")
-                            res = None
+        if not capabilities:
+            log.info(f"SKIP: adding capabilities skipped for resource '{uuid}' since no are given ...")
+            return None
 
-                else:
-                    print(f"FAILED: capability '{capability_item[0]}' not in available options {capability_options}. Skipping ...")
-                    return None
-            return res
+        # look up already registered capabilities of given resource (fetched once per run)
+        available_capabilities = self.capabilities.get(uuid)
 
-        else:
-            print(f"SKIP: adding capabilities skipped for resource '{uuid}' since no are given ...")
-            return None
+        res = None
+        for capability, row_value in capabilities:
+            action = capability_action(uuid, capability, available_capabilities, overwrite)
+            if action == "invalid":
+                return None
+            res = self.add_capability(uuid=uuid, capability=capability, row_value=row_value) if action == "add" else None
+        return res
 
     def add_capability(self, uuid: str, capability: str, row_value: str) -> requests.models.Response:
         """Adds capability to resource
@@ -208,21 +494,24 @@ class slmClient():
             'Content-Type': 'application/json'
         }
 
-        skip_flag = 'true' if row_value == 'skip' else 'false'
-
-        capabilityId = CAPABILITY_NAME_TO_ID[capability]
-        res = requests.put(
-            url=f"{self.host_resource_registry}/resources/{uuid}/capabilities?capabilityId={capabilityId}&skipInstall={skip_flag}",
+        url, skip_flag = capability_url(self.host_resource_registry, uuid, capability, row_value)
+        # a PUT with skipInstall=false starts an install at the SLM, so it is not sent again after it may have been processed
+        res = self._request(
+            method="PUT",
+            url=url,
+            idempotent=skip_flag == 'true',
             headers=headers,
             data=json.dumps({})
         )
 
         if res.status_code in [200, 201]:
-            print(f"SUCCESS({res.status_code}): added capability '{capability}' for resource '{uuid}' (skip={skip_flag})")
+            log.info(f"SUCCESS({res.status_code}): added capability '{capability}' for resource '{uuid}' (skip={skip_flag})")
+            self.capabilities.add(uuid, capability)
+            if skip_flag == 'false':
+                self.installs.started(uuid, capability)
             return res
         else:
-            print(f"FAILED({res.status_code}): adding capability '{capability}' for resource '{uuid}' (skip={skip_flag})")
-            print(res.text)
+            log.error(f"FAILED({res.status_code}): adding capability '{capability}' for resource '{uuid}' (skip={skip_flag})", extra={"fields": {"response": res.text[:1000]}})
             return None
 
     def add_submodels(self, uuid: str, files: list) -> requests.models.Response:
@@ -242,53 +531,162 @@ class slmClient():
         }
 
 
-        res = requests.post(
+        res = self._request(
+            method="POST",
             url=f"{self.host_resource_registry}/resources/{uuid}/submodels",
             files=files,
             headers=headers
         )
 
         if res.status_code in [200, 201]:
-            print(f"SUCCESS({res.status_code}): added files '{files}' for resource '{uuid}'")
+            log.info(f"SUCCESS({res.status_code}): added files {file_names(files)} for resource '{uuid}'")
             return res
         else:
-            print(f"FAILED({res.status_code}): adding files '{files}' for resource '{uuid}'")
-            print(res.text)
+            log.error(f"FAILED({res.status_code}): adding files {file_names(files)} for resource '{uuid}'", extra={"fields": {"response": res.text[:1000]}})
             return None
 
-    def get_resources(self) -> list:
-        """Gets all resource from resource registry
+    def upload_submodel(self, uuid: str, path: str) -> requests.models.Response:
+        """Adds the AAS submodels of an AASX file to resource. The file is streamed from disk
+        while sending, and closed afterwards
+
+        Args:
+            uuid (str): the uuid of the resource as str
+            path (str): the path of the AASX file
 
         Returns:
-            list: list of resource
+            requests.models.Response: the raw request response OR None if failed
         """
-        
-        print("refreshing token")
-        self.token = f"Bearer {self.get_keycloak_token()}"
-        print("token refreshed")
 
+        body = MultipartFileStream(path, field_name="aasx")
         headers = {
             'Authorization': self.token,
-            'Realm': 'fabos'
+            'Realm': 'fabos',
+            'Content-Type': body.content_type
+        }
+
+        try:
+            res = self._request(
+                method="POST",
+                url=f"{self.host_resource_registry}/resources/{uuid}/submodels",
+                data=body,
+                headers=headers
+            )
+        finally:
+            body.close()
+
+        if res.status_code in [200, 201]:
+            log.info(f"SUCCESS({res.status_code}): added file '{path}' ({len(body)} bytes) for resource '{uuid}'")
+            return res
+        else:
+            log.error(f"FAILED({res.status_code}): adding file '{path}' for resource '{uuid}'", extra={"fields": {"response": res.text[:1000]}})
+            return None
+
+    def _get_list(self, url: str, kind: str, cached: bool = False) -> list:
+        """Gets a list of the registries through the registry cache. A known list is revalidated with a
+        conditional request, so it is only transferred again if it changed
+
+        Args:
+            url (str): the url of the list
+            kind (str): the items of the list, e.g. 'resource items'
+            cached (bool): return the known list without any request, if it was fetched (or confirmed) in this run,
+                as it is kept up to date by the own writes
+
+        Returns:
+            list: the items of the list
+        """
+        if cached:
+            items = self.cache.get(url)
+            if items is not None:
+                return items
+
+        headers = {
+            'Authorization': self.token,
+            'Realm': 'fabos',
+            **self.cache.conditional_headers(url)
         }
-        res = requests.get(
-            url=f"{self.host_resource_registry}/resources",
+        res = self._request(
+            method="GET",
+            url=url,
             headers=headers
         )
 
+        if res.status_code == 304:
+            items = self.cache.revalidated(url)
+            log.info(f"SUCCESS({res.status_code}): found '{len(items)}' {kind} (not modified)")
+            return items
         if res.status_code in [200, 201]:
-            print(f"SUCCESS({res.status_code}): found '{len(res.json())}' resource items")
-        else:
-            print(f"FAILED({res.status_code}): getting resources failed")
+            items = res.json()
+            self.cache.store(url, items, res.headers.get("ETag"), res.headers.get("Last-Modified"))
+            log.info(f"SUCCESS({res.status_code}): found '{len(items)}' {kind}")
+            return items
 
+        log.error(f"FAILED({res.status_code}): getting {kind} failed")
         return res.json()
 
 
-    def get_resource(self, uuid:str) -> object:
+    def get_resources(self, cached: bool = False) -> list:
+        """Gets all resource from resource registry
+
+        Args:
+            cached (bool): return the known list without a request, if available (see _get_list)
+
+        Returns:
+            list: list of resource
+        """
+        return self._get_list(f"{self.host_resource_registry}/resources", "resource items", cached)
+
+
+    def iter_resources(self, page_size: int = None, chunk_size: int = 64 * 1024):
+        """Iterates over all resources of the resource registry, without loading the whole list into memory.
+        The list is decoded incrementally while it is received, or (with a page size) requested page by page.
+        Callers may stop early, the connection is released in any case
+
+        Args:
+            page_size (int): request pages of this size ('?page=<n>&size=<page_size>'), None to stream the full list
+            chunk_size (int): the size (in bytes) of the chunks read from the connection
+
+        Yields:
+            ResourceRecord: the records of the resources
+        """
+        page = 0
+        while True:
+            url = f"{self.host_resource_registry}/resources" + (f"?page={page}&size={page_size}" if page_size else "")
+            res = self._request(
+                method="GET",
+                url=url,
+                headers={
+                    'Authorization': self.token,
+                    'Realm': 'fabos'
+                },
+                stream=True
+            )
+            try:
+                if res.status_code not in [200, 201]:
+                    log.error(f"FAILED({res.status_code}): getting resources failed")
+                    return
+                if page_size is None:
+                    for item in iter_json_array(res.iter_content(chunk_size=chunk_size)):
+                        yield ResourceRecord.from_item(item)
+                    return
+                body = res.json()
+            finally:
+                res.close()
+
+            # a page is either a plain list or a page object (e.g. {"content": [...], "last": true})
+            items = body.get("content", []) if isinstance(body, dict) else body
+            for item in items:
+                yield ResourceRecord.from_item(item)
+            if len(items) < page_size or (isinstance(body, dict) and body.get("last", False)):
+                return
+            page += 1
+
+
+    def get_resource(self, uuid:str, verbose:bool=True) -> object:
         """Gets the resource for the given uuid at resource registry
 
         Args:
             uuid (str): the uuid to lookup
+            verbose (bool): determines if the result is printed
 
         Returns:
             object: the resource object, if available
@@ -298,18 +696,112 @@ class slmClient():
             'Authorization': self.token,
             'Realm': 'fabos'
         }
-        res = requests.get(
+        res = self._request(
+            method="GET",
             url=f"{self.host_resource_registry}/resources/{uuid}",
             headers=headers
         )
 
         if res.status_code in [200, 201]:
-            print(f"SUCCESS({res.status_code}): found resource '{uuid}' in registry")
+            if verbose:
+                log.info(f"SUCCESS({res.status_code}): found resource '{uuid}' in registry")
             return res.json()
         else:
-            print(f"FAILED({res.status_code}): could not found resource '{uuid}' in registry")
+            if verbose:
+                log.error(f"FAILED({res.status_code}): could not found resource '{uuid}' in registry")
             return {}
 
+    def get_deployment_capabilities(self, uuid:str) -> list:
+        """Gets the deployment capabilities registered for the resource with the given uuid
+
+        Args:
+            uuid (str): the uuid of the resource
+
+        Returns:
+            list: list of deployment capabilities, empty if none or the request failed
+        """
+
+        headers = {
+            'Authorization': self.token,
+            'Realm': 'fabos'
+        }
+        res = self._request(
+            method="GET",
+            url=f"{self.host_resource_registry}/resources/{uuid}/deployment-capabilities",
+            headers=headers
+        )
+
+        if res.status_code in [200, 201]:
+            return res.json()
+        else:
+            log.error(f"FAILED({res.status_code}): getting deployment capabilities of resource '{uuid}' failed")
+            return []
+
+    def _poll(self, ready, timeout: float, initial_delay: float = 0.25, max_delay: float = 5.0) -> bool:
+        """Polls the given check with exponential backoff, until it succeeds or the deadline is reached
+
+        Args:
+            ready (callable): the check, returning True once ready
+            timeout (float): the deadline (in seconds) from now
+            initial_delay (float): the first pause (in seconds) between two checks, doubled after every check
+            max_delay (float): the upper bound (in seconds) of the pause between two checks
+
+        Returns:
+            bool: True if the check succeeded before the deadline
+        """
+        deadline = time.monotonic() + timeout
+        delay = initial_delay
+        while True:
+            if ready():
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
+
+    def wait_for_resource(self, uuid:str, timeout:float=60, present:bool=True) -> bool:
+        """Waits until the resource for the given uuid is visible (or gone) at the resource registry
+
+        Args:
+            uuid (str): the uuid of the resource
+            timeout (float): the maximum time (in seconds) to wait
+            present (bool): wait for the resource to be visible (True) or to be gone (False)
+
+        Returns:
+            bool: True if the resource reached the expected state in time
+        """
+        ready = self._poll(lambda: bool(self.get_resource(uuid, verbose=False)) == present, timeout)
+        if not ready:
+            log.error(f"FAILED: resource '{uuid}' is {'still not visible' if present else 'still visible'} in registry after {timeout}s")
+        return ready
+
+    def wait_for_resources(self, uuids:list, timeout:float=60, present:bool=True) -> set:
+        """Waits until all resources for the given uuids are visible (or gone) at the resource registry,
+        using one list request per check
+
+        Args:
+            uuids (list): the uuids of the resources
+            timeout (float): the maximum time (in seconds) to wait
+            present (bool): wait for the resources to be visible (True) or to be gone (False)
+
+        Returns:
+            set: the uuids which did not reach the expected state in time, empty if all did
+        """
+        pending = set(uuids)
+
+        def ready():
+            visible = {resource.uuid for resource in self.iter_resources()}
+            if present:
+                pending.difference_update(visible)
+            else:
+                pending.intersection_update(visible)
+            return not pending
+
+        if pending and not self._poll(ready, timeout):
+            log.error(f"FAILED: '{len(pending)}' resources are {'still not visible' if present else 'still visible'} in registry after {timeout}s: {sorted(pending)}")
+        return pending
+
     def create_location(self, uuid:str, name:str) -> requests.models.Response:
         """Creates the location with the given uuid
 
@@ -325,16 +817,20 @@ class slmClient():
             'Authorization': self.token,
             'Realm': 'fabos'
         }
-        res = requests.post(
+        res = self._request(
+            method="POST",
             url=f"{self.host_resource_registry}/resources/locations?id={uuid}&name={name}",
-            headers=headers
+            headers=headers,
+            # the id is chosen by the client, so creating the location again does not duplicate it
+            idempotent=True
         )
 
         if res.status_code in [200, 201]:
-            print(f"SUCCESS({res.status_code}): added location '{name}' ({uuid})")
+            log.info(f"SUCCESS({res.status_code}): added location '{name}' ({uuid})")
+            self.cache.upsert(f"{self.host_resource_registry}/resources/locations", uuid, {"name": name})
             return res
         else:
-            print(f"FAILED({res.status_code}): adding location '{name}' ({uuid})")
+            log.error(f"FAILED({res.status_code}): adding location '{name}' ({uuid})")
             return res.json()
     
     def delete_location(self, uuid:str) -> requests.models.Response:
@@ -351,62 +847,41 @@ class slmClient():
             'Authorization': self.token,
             'Realm': 'fabos'
         }
-        res = requests.delete(
+        res = self._request(
+            method="DELETE",
             url=f"{self.host_resource_registry}/resources/locations?id={uuid}",
             headers=headers
         )
 
         if res.status_code in [200, 201]:
-            print(f"SUCCESS({res.status_code}): deleted location '{uuid}'")
+            log.info(f"SUCCESS({res.status_code}): deleted location '{uuid}'")
+            self.cache.remove(f"{self.host_resource_registry}/resources/locations", uuid)
             return res
         else:
-            print(f"FAILED({res.status_code}): deleting location failed '{uuid}'")
-            return res.json()
+            log.error(f"FAILED({res.status_code}): deleting location failed '{uuid}'")
+            return res
     
-    def get_locations(self) -> list:
+    def get_locations(self, cached: bool = False) -> list:
         """Gets all locations from resource registry
 
+        Args:
+            cached (bool): return the known list without a request, if available (see _get_list)
+
         Returns:
             list: list of locations
         """
-
-        headers = {
-            'Authorization': self.token,
-            'Realm': 'fabos'
-        }
-        res = requests.get(
-            url=f"{self.host_resource_registry}/resources/locations",
-            headers=headers
-        )
-
-        if res.status_code in [200, 201]:
-            print(f"SUCCESS({res.status_code}): found '{len(res.json())}' location items")
-        else:
-            print(f"FAILED({res.status_code}): getting locations failed")
-        return res.json()
+        return self._get_list(f"{self.host_resource_registry}/resources/locations", "location items", cached)
     
-    def get_service_groups(self) -> list:
+    def get_service_groups(self, cached: bool = False) -> list:
         """Gets all service groups from service registry
 
+        Args:
+            cached (bool): return the known list without a request, if available (see _get_list)
+
         Returns:
             list: list of groups
         """
-
-        headers = {
-            'Authorization': self.token,
-            'Realm': 'fabos'
-        }
-        res = requests.get(
-            url=f"{self.host_service_registry}/services/instances/groups",
-            headers=headers
-        )
-
-        if res.status_code in [200, 201]:
-            print(f"SUCCESS({res.status_code}): found '{len(res.json())}' service groups")
-        else:
-            print(f"FAILED({res.status_code}): getting service groups failed")
-
-        return res.json()
+        return self._get_list(f"{self.host_service_registry}/services/instances/groups", "service groups", cached)
     
     def create_service_group(self, uuid:str, name:str) -> requests.models.Response:
         """Creates the service group with the given uuid
@@ -424,17 +899,19 @@ class slmClient():
             'Realm': 'fabos',
             'Content-Type': 'application/json'
         }
-        res = requests.put(
+        res = self._request(
+            method="PUT",
             url=f"{self.host_service_registry}/services/instances/groups/{uuid}",
             data=json.dumps({"id": f"{uuid}", "name": f"{name}"}),
             headers=headers
         )
 
         if res.status_code in [200, 201]:
-            print(f"SUCCESS({res.status_code}): added service group '{name}' ({uuid})")
+            log.info(f"SUCCESS({res.status_code}): added service group '{name}' ({uuid})")
+            self.cache.upsert(f"{self.host_service_registry}/services/instances/groups", uuid, {"name": name})
             return res
         else:
-            print(f"FAILED({res.status_code}): adding service group failed '{name}' ({uuid})")
+            log.error(f"FAILED({res.status_code}): adding service group failed '{name}' ({uuid})")
             return res.json()
     
     def delete_service_group(self, uuid:str) -> requests.models.Response:
@@ -451,14 +928,16 @@ class slmClient():
             'Authorization': self.token,
             'Realm': 'fabos'
         }
-        res = requests.delete(
+        res = self._request(
+            method="DELETE",
             url=f"{self.host_service_registry}/services/instances/groups?id={uuid}",
             headers=headers
         )
 
         if res.status_code in [200, 201]:
-            print(f"SUCCESS({res.status_code}): deleted service group '{uuid}'")
+            log.info(f"SUCCESS({res.status_code}): deleted service group '{uuid}'")
+            self.cache.remove(f"{self.host_service_registry}/services/instances/groups", uuid)
             return res
         else:
-            print(f"FAILED({res.status_code}): deleting service group failed '{uuid}'")
-            return res.json()
\ No newline at end of file
+            log.error(f"FAILED({res.status_code}): deleting service group failed '{uuid}'")
+            return res
\ No newline at end of file
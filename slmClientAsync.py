@@ -0,0 +1,717 @@
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+import aiohttp
+
+from slmClient import file_names
+from capabilities import CAPABILITY_NAME_TO_ID, capability_action, capability_url
+from tokenManager import AsyncTokenManager, TokenError
+from aasxUpload import MultipartFileStream
+from metrics import Metrics
+from resilience import RetryPolicy, CircuitBreaker, rejected_token
+from rateLimiter import RateLimiter, operation_of
+from structuredLog import get_logger
+
+log = get_logger("slmClientAsync")
+
+
+class AsyncResponse():
+    """The response of the async SLM client. The body is read completely, so the response can be used
+    after the connection went back to the pool, with the same attributes as a requests response
+    """
+    __slots__ = ("status_code", "headers", "content")
+
+    def __init__(self, status_code: int, headers: dict, content: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+
+    def json(self):
+        """Parses the body as JSON
+
+        Raises:
+            ValueError: if the body is no valid JSON
+        """
+        return json.loads(self.content)
+
+
+    def __repr__(self):
+        return f"<AsyncResponse [{self.status_code}]>"
+
+
+class slmClientAsync():
+    """An asyncio client for interaction with the SLM, with the same methods as the slmClient (as coroutines).
+    All requests share one aiohttp session (a connection pool, limited per host) and the same retries,
+    circuit breakers, rate limits and metrics as the slmClient
+
+    Example:
+        async with slmClientAsync(host, host_keycloak, host_resource_registry, host_service_registry, user, password) as slm:
+            await asyncio.gather(*[slm.create_resource(uuid, item) for uuid, item in items.items()])
+    """
+    def __init__(self, host, host_keycloak, host_resource_registry, host_service_registry, slm_user, slm_password,
+                 max_concurrency_per_host=8, pool_size=None, connect_timeout=5.0, read_timeout=60.0, metrics=None,
+                 retry_policy=None, breaker_threshold=5, breaker_reset_timeout=10.0, rate_limiter=None):
+        self.host = host
+        self.host_keycloak = host_keycloak
+        self.host_resource_registry = host_resource_registry
+        self.host_service_registry = host_service_registry
+        self.slm_user = slm_user
+        self.slm_password = slm_password
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.pool_size = pool_size or max_concurrency_per_host
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset_timeout = breaker_reset_timeout
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.metrics = metrics or Metrics()
+        self.capabilities = {}
+        self._host_slots = {}
+        self._limit_slots = {}
+        self._breakers = {}
+        self._session = None
+        self.tokens = AsyncTokenManager(
+            host_keycloak=self.host_keycloak,
+            user=self.slm_user,
+            password=self.slm_password,
+            # token requests do not change anything, so they are always safe to retry
+            request=lambda **kwargs: self._request(idempotent=True, **kwargs)
+        )
+
+
+    async def open(self):
+        """Opens the shared session and fetches the first token
+
+        Raises:
+            TokenError: if no access token can be obtained from keycloak (aiohttp.ClientError if keycloak is unreachable)
+        """
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.pool_size)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        try:
+            await self.tokens.get_token()
+        except (TokenError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log.error(f"ERORR: can not get access_token from keycloak {e}. Aborting...")
+            await self.close()
+            raise
+        return self
+
+
+    async def close(self):
+        """Closes the shared session (and its kept-alive connections)
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+    async def __aenter__(self):
+        return await self.open()
+
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+    async def token(self) -> str:
+        """Returns the bearer token, shared by all requests and renewed by the token manager before it expires
+        """
+        return f"Bearer {await self.tokens.get_token()}"
+
+
+    async def get_keycloak_token(self) -> str:
+        """Catch Bearer token from Keycloak (through the token manager, only fetched if expired)
+        Returns:
+            str: bearer token as str
+        """
+        return await self.tokens.get_token()
+
+
+    def _host_of(self, url: str) -> str:
+        """Returns the host (scheme://netloc) of the given url
+        """
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}"
+
+
+    def _host_slot(self, host: str) -> asyncio.Semaphore:
+        """Returns the semaphore limiting the concurrent requests to the given host
+        """
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self.max_concurrency_per_host)
+        return self._host_slots[host]
+
+
+    def _breaker(self, host: str) -> CircuitBreaker:
+        """Returns the circuit breaker of the given host
+        """
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker(host, failure_threshold=self.breaker_threshold, reset_timeout=self.breaker_reset_timeout)
+        return self._breakers[host]
+
+
+    @asynccontextmanager
+    async def _admit(self, host: str, operation: str):
+        """Waits until the request may be sent within the rate limit of its operation, and holds its slot while it is in flight
+
+        Yields:
+            float: the time (in seconds) the request was held back
+        """
+        start = time.monotonic()
+        limit = self.rate_limiter.limit_for(host, operation)
+        slot = None
+        if limit is not None and limit.max_in_flight is not None:
+            slot = self._limit_slots.setdefault(self.rate_limiter.scope(host, operation), asyncio.Semaphore(limit.max_in_flight))
+            await slot.acquire()
+        try:
+            wait = self.rate_limiter.reserve(host, operation)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            yield time.monotonic() - start
+        finally:
+            if slot:
+                slot.release()
+
+
+    async def _request(self, method: str, url: str, idempotent: bool = None, **kwargs) -> AsyncResponse:
+        """Sends a HTTP request through the shared session, while respecting the concurrency limit per host.
+        Transient failures are retried with backoff (see slmClient._request), and requests are paused
+        while the circuit of the host is open
+
+        Args:
+            method (str): the HTTP method
+            url (str): the full url of the request
+            idempotent (bool): overrides the idempotency derived from the method (e.g. POST with a client-chosen id)
+            **kwargs: passed on to aiohttp (data, headers), 'files' as for requests
+
+        Returns:
+            AsyncResponse: the HTTP response (the last one, if all retries failed)
+        """
+        host = self._host_of(url)
+        breaker = self._breaker(host)
+        # identifies this request at the circuit breaker, if it is sent as probe
+        probe = object()
+        attempt = 0
+        while True:
+            wait = breaker.try_acquire(owner=probe)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = breaker.try_acquire(owner=probe)
+            try:
+                res = await self._send(host, method, url, **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # a refused or timed out connection was certainly not processed by the registry
+                delay = self.retry_policy.next_attempt(breaker, method, url, attempt, error=e, idempotent=idempotent,
+                                                       unsent=isinstance(e, aiohttp.ClientConnectorError))
+                if delay is None:
+                    raise
+            else:
+                delay = self.retry_policy.next_attempt(breaker, method, url, attempt, status=res.status_code,
+                                                       retry_after=res.headers.get("Retry-After"), idempotent=idempotent)
+                if delay is None:
+                    break
+            finally:
+                # a probe ending without outcome (e.g. cancelled by the caller) must not block the host
+                breaker.release_probe(probe)
+
+            self.metrics.record_retry(method, url)
+            self._rewind(kwargs)
+            await asyncio.sleep(delay)
+            attempt += 1
+            # the token may have been renewed in the meantime
+            if "Authorization" in (kwargs.get("headers") or {}):
+                kwargs["headers"] = {**kwargs["headers"], "Authorization": await self.token()}
+
+        # retry once with a renewed token, if the token was rejected
+        token = rejected_token(method, url, res.status_code, kwargs.get("headers"))
+        if token is not None:
+            self.metrics.record_retry(method, url)
+            self.tokens.invalidate(token)
+            kwargs["headers"] = {**kwargs["headers"], "Authorization": await self.token()}
+            self._rewind(kwargs)
+            res = await self._send(host, method, url, **kwargs)
+        return res
+
+
+    def _rewind(self, kwargs: dict):
+        """Rewinds the streamed bodies of a request, to send it again
+        """
+        files = kwargs.get("files") or []
+        for file_item in [kwargs.get("data")] + [file_item for _, file_item in (files.items() if isinstance(files, dict) else files)]:
+            file_item = file_item[1] if isinstance(file_item, tuple) else file_item
+            if hasattr(file_item, "seek"):
+                file_item.seek(0)
+
+
+    async def _file_chunks(self, stream: MultipartFileStream):
+        """Reads the streamed body chunk by chunk (in the default executor, to not block the event loop)
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            chunk = await loop.run_in_executor(None, stream.read, stream.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+    def _form_data(self, files) -> aiohttp.FormData:
+        """Converts the files of a request (as for requests: field name to file object or (filename, file object[, content type]))
+        into a multipart body
+        """
+        form = aiohttp.FormData()
+        for field_name, file_item in (files.items() if isinstance(files, dict) else files):
+            if isinstance(file_item, tuple):
+                form.add_field(field_name, file_item[1], filename=file_item[0], content_type=file_item[2] if len(file_item) > 2 else None)
+            else:
+                form.add_field(field_name, file_item)
+        return form
+
+
+    async def _send(self, host: str, method: str, url: str, **kwargs) -> AsyncResponse:
+        """Sends a single HTTP request within the rate limit of its operation and the concurrency limit of the host,
+        and records it in the metrics. The body of the response is read completely
+
+        Returns:
+            AsyncResponse: the HTTP response
+        """
+        data = kwargs.get("data")
+        bytes_uploaded = len(data) if isinstance(data, (bytes, MultipartFileStream)) else len(data.encode()) if isinstance(data, str) else 0
+        if isinstance(data, MultipartFileStream):
+            kwargs["data"] = self._file_chunks(data)
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), "Content-Length": str(len(data))}
+        files = kwargs.pop("files", None)
+        if files:
+            kwargs["data"] = self._form_data(files)
+
+        async with self._admit(host, operation_of(method, url)) as throttled, self._host_slot(host):
+            start = time.monotonic()
+            try:
+                async with self._session.request(method, url, **kwargs) as res:
+                    response = AsyncResponse(res.status, res.headers, await res.read())
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.metrics.record_request(method, url, type(e).__name__, time.monotonic() - start, bytes_uploaded, throttled)
+                raise
+        self.metrics.record_request(method, url, response.status_code, time.monotonic() - start, bytes_uploaded, throttled)
+        return response
+
+
+    async def _headers(self, **extra) -> dict:
+        """Returns the headers of an authorized request to the registries
+        """
+        return {'Authorization': await self.token(), 'Realm': 'fabos', **extra}
+
+
+    async def delete_resource(self, uuid:str) -> AsyncResponse:
+        """Deletes the resource for the given UUID at the resource registry
+        Args:
+            uuid (str): the uuid of the resource to be deleted
+        Returns:
+            AsyncResponse: the HTTP response
+        """
+        res = await self._request(
+            method="DELETE",
+            url=f"{self.host_resource_registry}/resources/{uuid}",
+            headers=await self._headers()
+        )
+
+        if res.status_code == 200:
+            log.info(f"SUCCESS({res.status_code}): removed resource '{uuid}'")
+            self.capabilities.pop(uuid, None)
+        else:
+            log.error(f"FAILED({res.status_code}): removed resource '{uuid}'")
+
+        return res
+
+
+    async def create_resource(self, uuid:str, item) -> AsyncResponse:
+        """Creates the resource for the given uuid
+
+        Args:
+            uuid (str): the uuid for the resource to be created
+            item (dict): the item to be used for the creation
+
+        Returns:
+            AsyncResponse: the HTTP response
+        """
+        if "resourceBaseConfiguration" in item.keys():
+            if item["resourceBaseConfiguration"] == "DC_Base":
+                item["resourceBaseConfiguration"] = CAPABILITY_NAME_TO_ID["BASE"]
+            else:
+                del item["resourceBaseConfiguration"]
+
+        res = await self._request(
+            method="PUT",
+            url=f"{self.host_resource_registry}/resources/{uuid}",
+            data=item,
+            headers=await self._headers()
+        )
+
+        if res.status_code in [200, 201]:
+            log.info(f"SUCCESS({res.status_code}): added resource '{uuid}'", extra={"fields": {"hostname": item.get("resourceHostname"), "ip": item.get("resourceIp")}})
+        else:
+            log.error(f"FAILED({res.status_code}): added resource '{uuid}'", extra={"fields": {"hostname": item.get("resourceHostname"), "ip": item.get("resourceIp"), "response": res.text[:1000]}})
+
+        return res
+
+
+    async def add_capabilities(self, uuid:str, capabilities: list, overwrite:bool) -> AsyncResponse:
+        """adds given capabilties to resource by given uuid (see slmClient.add_capabilities)
+
+        Args:
+            uuid (str): the resource to add the capabilities
+            capabilities (list): a list of (capability, row value) pairs
+            overwrite (bool): determines if an already registered capabilty is overwritten
+
+        Returns:
+            AsyncResponse: the HTTP response of the last added capability, None if none was added
+        """
+        if not capabilities:
+            log.info(f"SKIP: adding capabilities skipped for resource '{uuid}' since no are given ...")
+            return None
+
+        # look up already registered capabilities of given resource (fetched once per run)
+        if uuid not in self.capabilities:
+            self.capabilities[uuid] = {item['name'] for item in await self.get_deployment_capabilities(uuid)}
+        available_capabilities = set(self.capabilities[uuid])
+
+        res = None
+        for capability, row_value in capabilities:
+            action = capability_action(uuid, capability, available_capabilities, overwrite)
+            if action == "invalid":
+                return None
+            res = await self.add_capability(uuid=uuid, capability=capability, row_value=row_value) if action == "add" else None
+        return res
+
+
+    async def add_capability(self, uuid: str, capability: str, row_value: str) -> AsyncResponse:
+        """Adds capability to resource
+
+        Args:
+            uuid (str): the uuid of the resource as str
+            capability (str): the capability of the resource as str
+            row_value (str): the value of the capability in the inventory, 'skip' to skip the installation
+
+        Returns:
+            AsyncResponse: the HTTP response OR None if failed
+        """
+        url, skip_flag = capability_url(self.host_resource_registry, uuid, capability, row_value)
+        # a PUT with skipInstall=false starts an install at the SLM, so it is not sent again after it may have been processed
+        res = await self._request(
+            method="PUT",
+            url=url,
+            idempotent=skip_flag == 'true',
+            headers=await self._headers(**{'Content-Type': 'application/json'}),
+            data=json.dumps({})
+        )
+
+        if res.status_code in [200, 201]:
+            log.info(f"SUCCESS({res.status_code}): added capability '{capability}' for resource '{uuid}' (skip={skip_flag})")
+            if uuid in self.capabilities:
+                self.capabilities[uuid].add(capability)
+            return res
+        else:
+            log.error(f"FAILED({res.status_code}): adding capability '{capability}' for resource '{uuid}' (skip={skip_flag})", extra={"fields": {"response": res.text[:1000]}})
+            return None
+
+
+    async def add_submodels(self, uuid: str, files) -> AsyncResponse:
+        """Adds AAS submodels to resource
+
+        Args:
+            uuid (str): the uuid of the resource as str
+            files (list): the AASX files to add to the resource, as for requests (e.g. [('aasx', (filename, file object))])
+
+        Returns:
+            AsyncResponse: the HTTP response OR None if failed
+        """
+        res = await self._request(
+            method="POST",
+            url=f"{self.host_resource_registry}/resources/{uuid}/submodels",
+            files=files,
+            headers=await self._headers()
+        )
+
+        if res.status_code in [200, 201]:
+            log.info(f"SUCCESS({res.status_code}): added files {file_names(files)} for resource '{uuid}'")
+            return res
+        else:
+            log.error(f"FAILED({res.status_code}): adding files {file_names(files)} for resource '{uuid}'", extra={"fields": {"response": res.text[:1000]}})
+            return None
+
+
+    async def upload_submodel(self, uuid: str, path: str) -> AsyncResponse:
+        """Adds the AAS submodels of an AASX file to resource. The file is streamed from disk
+        while sending, and closed afterwards
+
+        Args:
+            uuid (str): the uuid of the resource as str
+            path (str): the path of the AASX file
+
+        Returns:
+            AsyncResponse: the HTTP response OR None if failed
+        """
+        body = MultipartFileStream(path, field_name="aasx")
+        try:
+            res = await self._request(
+                method="POST",
+                url=f"{self.host_resource_registry}/resources/{uuid}/submodels",
+                data=body,
+                headers=await self._headers(**{'Content-Type': body.content_type})
+            )
+        finally:
+            body.close()
+
+        if res.status_code in [200, 201]:
+            log.info(f"SUCCESS({res.status_code}): added file '{path}' ({len(body)} bytes) for resource '{uuid}'")
+            return res
+        else:
+            log.error(f"FAILED({res.status_code}): adding file '{path}' for resource '{uuid}'", extra={"fields": {"response": res.text[:1000]}})
+            return None
+
+
+    async def get_resources(self) -> list:
+        """Gets all resource from resource registry
+
+        Returns:
+            list: list of resource, empty if the request failed
+        """
+        resources = await self._list_resources()
+        return [] if resources is None else resources
+
+
+    async def _list_resources(self) -> list:
+        """Gets all resource from resource registry, None if the request failed (to tell it apart from an empty registry)
+        """
+        res = await self._request(
+            method="GET",
+            url=f"{self.host_resource_registry}/resources",
+            headers=await self._headers()
+        )
+
+        if res.status_code in [200, 201]:
+            resources = res.json()
+            log.info(f"SUCCESS({res.status_code}): found '{len(resources)}' resource items")
+            return resources
+        log.error(f"FAILED({res.status_code}): getting resources failed")
+        return None
+
+
+    async def get_resource(self, uuid:str, verbose:bool=True) -> object:
+        """Gets the resource for the given uuid at resource registry
+
+        Args:
+            uuid (str): the uuid to lookup
+            verbose (bool): determines if the result is printed
+
+        Returns:
+            object: the resource object, if available
+        """
+        res = await self._request(
+            method="GET",
+            url=f"{self.host_resource_registry}/resources/{uuid}",
+            headers=await self._headers()
+        )
+
+        if res.status_code in [200, 201]:
+            if verbose:
+                log.info(f"SUCCESS({res.status_code}): found resource '{uuid}' in registry")
+            return res.json()
+        if verbose:
+            log.error(f"FAILED({res.status_code}): could not found resource '{uuid}' in registry")
+        return {}
+
+
+    async def get_deployment_capabilities(self, uuid:str) -> list:
+        """Gets the deployment capabilities registered for the resource with the given uuid
+
+        Args:
+            uuid (str): the uuid of the resource
+
+        Returns:
+            list: list of deployment capabilities, empty if none or the request failed
+        """
+        res = await self._request(
+            method="GET",
+            url=f"{self.host_resource_registry}/resources/{uuid}/deployment-capabilities",
+            headers=await self._headers()
+        )
+
+        if res.status_code in [200, 201]:
+            return res.json()
+        log.error(f"FAILED({res.status_code}): getting deployment capabilities of resource '{uuid}' failed")
+        return []
+
+
+    async def wait_for_resources(self, uuids:list, timeout:float=60, present:bool=True, initial_delay:float=0.25, max_delay:float=5.0) -> set:
+        """Waits until all resources for the given uuids are visible (or gone) at the resource registry,
+        using one list request per check, polled with exponential backoff
+
+        Args:
+            uuids (list): the uuids of the resources
+            timeout (float): the maximum time (in seconds) to wait
+            present (bool): wait for the resources to be visible (True) or to be gone (False)
+
+        Returns:
+            set: the uuids which did not reach the expected state in time, empty if all did
+        """
+        pending = set(uuids)
+        deadline = time.monotonic() + timeout
+        delay = initial_delay
+        while pending:
+            resources = await self._list_resources()
+            # a failed poll tells nothing about the resources, they are checked again at the next poll
+            if resources is not None:
+                visible = {resource["id"] for resource in resources}
+                if present:
+                    pending.difference_update(visible)
+                else:
+                    pending.intersection_update(visible)
+            remaining = deadline - time.monotonic()
+            if not pending or remaining <= 0:
+                break
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
+
+        if pending:
+            log.error(f"FAILED: '{len(pending)}' resources are {'still not visible' if present else 'still visible'} in registry after {timeout}s: {sorted(pending)}")
+        return pending
+
+
+    async def create_location(self, uuid:str, name:str) -> AsyncResponse:
+        """Creates the location with the given uuid
+
+        Args:
+            uuid (str): the uuid of the location to be created
+            name (str): the name of the location to be created
+
+        Returns:
+            AsyncResponse: the HTTP response
+        """
+        res = await self._request(
+            method="POST",
+            url=f"{self.host_resource_registry}/resources/locations?id={uuid}&name={name}",
+            headers=await self._headers(),
+            # the id is chosen by the client, so creating the location again does not duplicate it
+            idempotent=True
+        )
+
+        if res.status_code in [200, 201]:
+            log.info(f"SUCCESS({res.status_code}): added location '{name}' ({uuid})")
+        else:
+            log.error(f"FAILED({res.status_code}): adding location '{name}' ({uuid})")
+        return res
+
+
+    async def delete_location(self, uuid:str) -> AsyncResponse:
+        """Deletes the location with the given uuid
+
+        Args:
+            uuid (str): the uuid of the location to be deleted
+
+        Returns:
+            AsyncResponse: the HTTP response
+        """
+        res = await self._request(
+            method="DELETE",
+            url=f"{self.host_resource_registry}/resources/locations?id={uuid}",
+            headers=await self._headers()
+        )
+
+        if res.status_code in [200, 201]:
+            log.info(f"SUCCESS({res.status_code}): deleted location '{uuid}'")
+        else:
+            log.error(f"FAILED({res.status_code}): deleting location failed '{uuid}'")
+        return res
+
+
+    async def get_locations(self) -> list:
+        """Gets all locations from resource registry
+
+        Returns:
+            list: list of locations
+        """
+        res = await self._request(
+            method="GET",
+            url=f"{self.host_resource_registry}/resources/locations",
+            headers=await self._headers()
+        )
+
+        if res.status_code in [200, 201]:
+            log.info(f"SUCCESS({res.status_code}): found '{len(res.json())}' location items")
+        else:
+            log.error(f"FAILED({res.status_code}): getting locations failed")
+        return res.json()
+
+
+    async def get_service_groups(self) -> list:
+        """Gets all service groups from service registry
+
+        Returns:
+            list: list of groups
+        """
+        res = await self._request(
+            method="GET",
+            url=f"{self.host_service_registry}/services/instances/groups",
+            headers=await self._headers()
+        )
+
+        if res.status_code in [200, 201]:
+            log.info(f"SUCCESS({res.status_code}): found '{len(res.json())}' service groups")
+        else:
+            log.error(f"FAILED({res.status_code}): getting service groups failed")
+        return res.json()
+
+
+    async def create_service_group(self, uuid:str, name:str) -> AsyncResponse:
+        """Creates the service group with the given uuid
+
+        Args:
+            uuid (str): the uuid of the service group to be created
+            name (str): the name of the service group to be created
+
+        Returns:
+            AsyncResponse: the HTTP response
+        """
+        res = await self._request(
+            method="PUT",
+            url=f"{self.host_service_registry}/services/instances/groups/{uuid}",
+            data=json.dumps({"id": f"{uuid}", "name": f"{name}"}),
+            headers=await self._headers(**{'Content-Type': 'application/json'})
+        )
+
+        if res.status_code in [200, 201]:
+            log.info(f"SUCCESS({res.status_code}): added service group '{name}' ({uuid})")
+        else:
+            log.error(f"FAILED({res.status_code}): adding service group failed '{name}' ({uuid})")
+        return res
+
+
+    async def delete_service_group(self, uuid:str) -> AsyncResponse:
+        """Deletes the service group with the given uuid
+
+        Args:
+            uuid (str): the uuid of the service group to be deleted
+
+        Returns:
+            AsyncResponse: the HTTP response
+        """
+        res = await self._request(
+            method="DELETE",
+            url=f"{self.host_service_registry}/services/instances/groups?id={uuid}",
+            headers=await self._headers()
+        )
+
+        if res.status_code in [200, 201]:
+            log.info(f"SUCCESS({res.status_code}): deleted service group '{uuid}'")
+        else:
+            log.error(f"FAILED({res.status_code}): deleting service group failed '{uuid}'")
+        return res
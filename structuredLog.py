@@ -0,0 +1,199 @@
+import io
+import re
+import sys
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+import contextvars
+from datetime import datetime, timezone
+from contextlib import contextmanager
+
+# all loggers of the tool are children of this logger
+LOGGER_NAME = "slm"
+# the logger of the summary of a run, which is kept in quiet mode
+SUMMARY_LOGGER = f"{LOGGER_NAME}.summary"
+LOG_FORMATS = ["text", "json"]
+# keys (case-insensitive) whose values are never written to the log
+SECRET_KEY_PATTERN = re.compile(r"password|secret|token", re.IGNORECASE)
+# secrets within a message, e.g. "'resourcePassword': 'abc'" or "password=abc"
+SECRET_TEXT_PATTERN = re.compile(r"""((?:password|secret|access_token|refresh_token)['"]?\s*[:=]\s*['"]?)([^'",\s}&]+)""", re.IGNORECASE)
+
+_device = contextvars.ContextVar("device", default=None)
+_listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Returns the logger of a module of the tool, e.g. get_logger("slmClient")
+    """
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+@contextmanager
+def device_context(uuid: str):
+    """Tags all records logged within the block (by this thread or asyncio task) with the uuid of the device,
+    as correlation id of its pipeline
+
+    Example:
+        with device_context(device.uuid):
+            slm.create_resource(...)
+    """
+    token = _device.set(uuid)
+    try:
+        yield
+    finally:
+        _device.reset(token)
+
+
+def current_device() -> str:
+    """Returns the uuid of the device the current thread (or task) is working on, None if none
+    """
+    return _device.get()
+
+
+def redact(value):
+    """Returns a copy of the value, with the values of all secret keys (passwords, tokens) replaced by '***'
+    """
+    if isinstance(value, dict):
+        return {key: "***" if isinstance(key, str) and SECRET_KEY_PATTERN.search(key) else redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+
+def redact_text(text: str) -> str:
+    """Replaces secrets within a text (e.g. a printed dict or url) by '***'
+    """
+    return SECRET_TEXT_PATTERN.sub(r"\1***", text)
+
+
+class ContextFilter(logging.Filter):
+    """Prepares a record in the logging thread: attaches the device (correlation id) of the thread or task,
+    renders the message and removes secrets, before the record is handed to the background writer
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "device", None) is None:
+            record.device = _device.get()
+        record.msg = redact_text(record.getMessage())
+        record.args = None
+        record.fields = redact(getattr(record, "fields", None) or {})
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    """Formats records like the console output of the tool: the message, followed by the structured fields (if any)
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        site = getattr(record, "site", None)
+        if site:
+            message = f"[{site}] {message}"
+        fields = getattr(record, "fields", None)
+        if fields:
+            message = f"{message} {json.dumps(fields, default=str)}"
+        if record.exc_text:
+            message = f"{message}\n{record.exc_text}"
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as JSON lines: time, level, logger, message, the device (correlation id), and the structured fields
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage().strip("\n")
+        }
+        for key in ["site", "device"]:
+            if getattr(record, key, None):
+                entry[key] = getattr(record, key)
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class BufferedStreamHandler(logging.StreamHandler):
+    """Writes records to a stream without flushing after every record. The stream is flushed by the
+    background listener, as soon as no more records are queued, so bursts are written in few system calls
+    """
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class _FlushingListener(logging.handlers.QueueListener):
+    """A queue listener, which flushes its handlers whenever the queue runs empty
+    """
+    def dequeue(self, block: bool):
+        if self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
+        return self.queue.get(block)
+
+
+def _buffered_stdout(buffer_size: int) -> io.TextIOWrapper:
+    """Returns a buffered text stream on the file descriptor of stdout (which is unbuffered, with 'python -u')
+    """
+    try:
+        fileno = sys.stdout.fileno()
+    except (AttributeError, OSError, ValueError):
+        return sys.stdout
+    raw = io.FileIO(fileno, "w", closefd=False)
+    return io.TextIOWrapper(io.BufferedWriter(raw, buffer_size), encoding=sys.stdout.encoding or "utf-8", errors="replace")
+
+
+def configure_logging(level: str = "INFO", log_format: str = "text", quiet: bool = False, stream=None, buffer_size: int = 65536):
+    """Configures the loggers of the tool: records are prepared by the calling thread and queued, and written
+    by a background thread through a buffered stream, so the workers are not held back by console I/O
+
+    Args:
+        level (str): the minimum level, e.g. 'DEBUG', 'INFO', 'WARNING'
+        log_format (str): 'text' (console) or 'json' (JSON lines)
+        quiet (bool): only log the summary of the run and errors
+        stream: the stream to write to. Default: a buffered stream on stdout
+        buffer_size (int): the size of the write buffer (in bytes)
+
+    Raises:
+        ValueError: if the level or format is unknown
+    """
+    global _listener
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"unknown log format '{log_format}', expected one of {LOG_FORMATS}")
+    numeric_level = logging.getLevelName(str(level).upper())
+    if not isinstance(numeric_level, int):
+        raise ValueError(f"unknown log level '{level}', expected one of ['DEBUG', 'INFO', 'WARNING', 'ERROR']")
+    shutdown_logging()
+
+    handler = BufferedStreamHandler(stream or _buffered_stdout(buffer_size))
+    handler.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+    queue_handler.addFilter(ContextFilter())
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.handlers = [queue_handler]
+    logger.propagate = False
+    # in quiet mode, records below ERROR are dropped by the level check already, before their message is rendered
+    logger.setLevel(max(numeric_level, logging.ERROR) if quiet else numeric_level)
+    logging.getLogger(SUMMARY_LOGGER).setLevel(logging.INFO)
+
+    _listener = _FlushingListener(records, handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """Writes all queued records and stops the background writer
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.flush()
+        _listener = None
@@ -0,0 +1,138 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from journal import ProgressJournal
+from structuredLog import get_logger, device_context
+
+log = get_logger("teardown")
+
+
+def select_resources(resources: list, device_uuids: set, delete_all: bool) -> tuple:
+    """Selects the registered resources to delete: all of them (DELETE_ALL) or only those listed in the inventory
+
+    Args:
+        resources (list): the resource items of the registry
+        device_uuids (set): the uuids of the devices of the inventory
+        delete_all (bool): DELETE_ALL
+
+    Returns:
+        tuple: the resource items to delete and those to keep
+    """
+    selected, skipped = [], []
+    for resource in resources:
+        (selected if delete_all or resource["id"] in device_uuids else skipped).append(resource)
+    return selected, skipped
+
+
+def _succeeded(res) -> bool:
+    """True if a delete succeeded, or the item was already gone
+    """
+    return isinstance(res, requests.models.Response) and res.status_code in [200, 201, 204, 404]
+
+
+class Teardown():
+    """Cleans up the registries before a run: resources are deleted concurrently on a bounded pool, and
+    only once the registry no longer lists them, the locations and service groups (which they reference) are deleted
+    """
+    def __init__(self, slm, max_workers: int = 8, readiness_timeout: float = 60.0, journal: ProgressJournal = None):
+        self.slm = slm
+        self.max_workers = max_workers
+        self.readiness_timeout = readiness_timeout
+        self.journal = journal or ProgressJournal()
+
+
+    def _delete_all(self, delete, uuids: list) -> tuple:
+        """Runs the delete call for all uuids concurrently
+
+        Returns:
+            tuple: the uuids deleted and the uuids failed
+        """
+        if not uuids:
+            return [], []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(lambda uuid: (uuid, self._delete(delete, uuid)), uuids))
+        return [uuid for uuid, ok in results if ok], [uuid for uuid, ok in results if not ok]
+
+
+    def _delete(self, delete, uuid: str) -> bool:
+        """Runs the delete call for a single uuid, tagging its log records with the uuid. A request, which failed
+        after all retries, counts as failed delete (instead of aborting the whole clean up)
+        """
+        with device_context(uuid):
+            try:
+                return _succeeded(delete(uuid=uuid))
+            except requests.exceptions.RequestException as e:
+                log.error(f"FAILED: deleting '{uuid}' failed. Error: {type(e)}: {e}")
+                return False
+
+
+    def delete_resources(self, resources: list) -> tuple:
+        """Deletes the given resources concurrently, and waits until the registry no longer lists them
+
+        Args:
+            resources (list): the resource items to delete
+
+        Returns:
+            tuple: the deleted resource items, and the uuids of the resources which failed to delete (or are still listed)
+        """
+        by_uuid = {resource["id"]: resource for resource in resources}
+        deleted, failed = self._delete_all(self.slm.delete_resource, list(by_uuid))
+        if failed:
+            log.error(f"FAILED: deleting '{len(failed)}' resources: {sorted(failed)}")
+        log.info(f"waiting for registry to remove '{len(deleted)}' resources (READINESS_TIMEOUT={self.readiness_timeout}s) ... will continue with adding resources\n------------------------------------------------------------------------")
+        still_listed = self.slm.wait_for_resources(deleted, timeout=self.readiness_timeout, present=False)
+        return [by_uuid[uuid] for uuid in deleted], failed + sorted(still_listed)
+
+
+    def run(self, resources: list, locations: list, service_groups: list, device_uuids: set, force_delete: bool, delete_all: bool) -> list:
+        """Cleans up the registries, skipping the steps already completed in the journal
+
+        Args:
+            resources (list): the resource items of the registry (anything else, if they could not be fetched)
+            locations (list): the location items of the registry (anything else, if they could not be fetched)
+            service_groups (list): the service group items of the registry (anything else, if they could not be fetched)
+            device_uuids (set): the uuids of the devices of the inventory
+            force_delete (bool): FORCE_DELETE, delete the resources of the inventory (all with DELETE_ALL)
+            delete_all (bool): DELETE_ALL, delete all locations and service groups as well
+
+        Returns:
+            list: the deleted resource items
+        """
+        deleted = []
+        if force_delete and self.journal.is_done("*", "cleanup_resources"):
+            log.info(f"\nRESUME: skipped resource clean up since it was already done in the journaled run")
+        elif force_delete and not isinstance(resources, list):
+            log.error("FAILED: the resources of the registry could not be fetched. Skipping the resource clean up (a resumed run tries it again) ...")
+        elif force_delete:
+            log.info(f"\nStarting resource clean up (DELETE_ALL={delete_all}, FORCE_DELETE={force_delete}):-----------------------------------------------------------")
+            selected, skipped = select_resources(resources, device_uuids, delete_all)
+            for resource in skipped:
+                log.info(f"Skipped deleting resource '{resource['id']}' since it is not in the inventory")
+            deleted, failed = self.delete_resources(selected)
+            # a step with failures is not journaled, so a resumed run tries it again
+            if not failed:
+                self.journal.record("*", "cleanup_resources")
+
+        if not delete_all:
+            return deleted
+
+        # the locations and service groups are deleted only now, as no deleted resource references them anymore
+        cleanups = [
+            ("cleanup_locations", "locations", self.slm.delete_location, locations),
+            ("cleanup_groups", "service groups", self.slm.delete_service_group, service_groups)
+        ]
+        for step, name, delete, items in cleanups:
+            if self.journal.is_done("*", step):
+                log.info(f"\nRESUME: skipped {name} clean up since it was already done in the journaled run")
+                continue
+            if not isinstance(items, list):
+                log.error(f"FAILED: the {name} of the registry could not be fetched. Skipping the {name} clean up (a resumed run tries it again) ...")
+                continue
+            log.info(f"\nStarting {name} clean up (DELETE_ALL={delete_all}, in total '{len(items)}' {name}):---------------------------------------------------------------------------------------")
+            _, failed = self._delete_all(delete, [item["id"] for item in items])
+            if failed:
+                log.error(f"FAILED: deleting '{len(failed)}' {name}: {sorted(failed)}")
+            else:
+                self.journal.record("*", step)
+        return deleted
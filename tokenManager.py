@@ -0,0 +1,217 @@
+import time
+import asyncio
+import threading
+
+import requests
+
+from structuredLog import get_logger
+
+log = get_logger("tokenManager")
+
+
+class TokenError(Exception):
+    """Raised if no access token can be obtained from Keycloak
+    """
+
+
+class TokenManager():
+    """Keeps one Keycloak access token valid and shares it between all (concurrent) users.
+    The token is refreshed proactively (refresh_token grant) shortly before it expires,
+    falling back to the password grant if the refresh token expired as well.
+    """
+    def __init__(self, host_keycloak: str, user: str, password: str, request=requests.request,
+                 client_id: str = "self-service-portal", realm: str = "fabos", refresh_margin: float = 30):
+        self.host_keycloak = host_keycloak
+        self.user = user
+        self.password = password
+        self.request = request
+        self.client_id = client_id
+        self.realm = realm
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._access_token = None
+        self._expires_at = 0.0
+        self._refresh_token = None
+        self._refresh_expires_at = 0.0
+
+
+    def get_token(self) -> str:
+        """Returns a valid access token, refreshing it first if it (almost) expired
+
+        Returns:
+            str: the raw access token
+        """
+        with self._lock:
+            if self._access_token is None or time.monotonic() >= self._expires_at:
+                self._renew()
+            return self._access_token
+
+
+    def invalidate(self, token: str):
+        """Marks the given token as expired (e.g. after a 401), so the next call renews it.
+        A token which was already replaced by another worker is ignored.
+
+        Args:
+            token (str): the raw access token, which was rejected
+        """
+        with self._lock:
+            if token == self._access_token:
+                self._expires_at = 0.0
+
+
+    def _renew(self):
+        """Renews the access token, preferring the refresh token over the password grant
+        """
+        if self._can_refresh():
+            try:
+                self._store(self._fetch(self._refresh_grant()))
+                log.info("SUCCESS: refreshed access_token from keycloak (refresh_token grant)")
+                return
+            except TokenError as e:
+                log.warning(f"WARNING: refreshing access_token failed ({e}). Falling back to password grant...")
+
+        self._store(self._fetch(self._password_grant()))
+        log.info("SUCCESS: got access_token from keycloak (password grant)")
+
+
+    def _can_refresh(self) -> bool:
+        """True if a refresh token is available, which did not expire yet
+        """
+        return self._refresh_token is not None and time.monotonic() < self._refresh_expires_at
+
+
+    def _refresh_grant(self) -> dict:
+        """Returns the form data of the refresh_token grant
+        """
+        return {
+            "client_id": self.client_id,
+            "grant_type": "refresh_token",
+            "refresh_token": self._refresh_token
+        }
+
+
+    def _password_grant(self) -> dict:
+        """Returns the form data of the password grant
+        """
+        return {
+            "client_id": self.client_id,
+            "grant_type": "password",
+            "username": self.user,
+            "password": self.password
+        }
+
+
+    def _token_request(self, token_data: dict) -> dict:
+        """Returns the arguments of the token request of the given grant
+
+        Args:
+            token_data (dict): the form data of the grant
+
+        Returns:
+            dict: the keyword arguments of the request function
+        """
+        return {
+            "method": "POST",
+            "url": f"{self.host_keycloak}/auth/realms/{self.realm}/protocol/openid-connect/token",
+            "data": token_data,
+            "headers": {'Content-Type': 'application/x-www-form-urlencoded'}
+        }
+
+
+    def _fetch(self, token_data: dict) -> dict:
+        """Requests a token from keycloak
+
+        Args:
+            token_data (dict): the form data of the grant
+
+        Returns:
+            dict: the token response of keycloak
+        """
+        return self._parse(self.request(**self._token_request(token_data)))
+
+
+    def _parse(self, res) -> dict:
+        """Parses the token response of keycloak
+
+        Args:
+            res: the response, providing status_code, text and json()
+
+        Raises:
+            TokenError: if the response contains no access token
+
+        Returns:
+            dict: the token response of keycloak
+        """
+        try:
+            body = res.json()
+        except ValueError:
+            body = {}
+        if "access_token" not in body:
+            raise TokenError(f"({res.status_code}) {body.get('error_description', res.text)}")
+        return body
+
+
+    def _store(self, body: dict):
+        """Stores the token response, including the expiry of the access and refresh token
+
+        Args:
+            body (dict): the token response of keycloak
+        """
+        now = time.monotonic()
+        expires_in = float(body.get("expires_in", 60))
+        self._access_token = body["access_token"]
+        self._expires_at = now + max(expires_in - min(self.refresh_margin, expires_in / 2), 0)
+        self._refresh_token = body.get("refresh_token")
+        self._refresh_expires_at = now + float(body.get("refresh_expires_in", 0)) - min(self.refresh_margin, expires_in / 2)
+
+
+class AsyncTokenManager(TokenManager):
+    """The TokenManager for asyncio clients: the token is renewed by at most one coroutine at a time,
+    while the others wait for it without blocking the event loop
+
+    Args:
+        request: a coroutine function, sending the token request and returning a response with status_code, text and json()
+    """
+    def __init__(self, host_keycloak: str, user: str, password: str, request,
+                 client_id: str = "self-service-portal", realm: str = "fabos", refresh_margin: float = 30):
+        super().__init__(host_keycloak, user, password, request=request, client_id=client_id, realm=realm, refresh_margin=refresh_margin)
+        self._renew_lock = asyncio.Lock()
+
+
+    async def get_token(self) -> str:
+        """Returns a valid access token, refreshing it first if it (almost) expired
+
+        Returns:
+            str: the raw access token
+        """
+        async with self._renew_lock:
+            if self._access_token is None or time.monotonic() >= self._expires_at:
+                await self._renew()
+            return self._access_token
+
+
+    async def _renew(self):
+        """Renews the access token, preferring the refresh token over the password grant
+        """
+        if self._can_refresh():
+            try:
+                self._store(await self._fetch(self._refresh_grant()))
+                log.info("SUCCESS: refreshed access_token from keycloak (refresh_token grant)")
+                return
+            except TokenError as e:
+                log.warning(f"WARNING: refreshing access_token failed ({e}). Falling back to password grant...")
+
+        self._store(await self._fetch(self._password_grant()))
+        log.info("SUCCESS: got access_token from keycloak (password grant)")
+
+
+    async def _fetch(self, token_data: dict) -> dict:
+        """Requests a token from keycloak
+
+        Args:
+            token_data (dict): the form data of the grant
+
+        Returns:
+            dict: the token response of keycloak
+        """
+        return self._parse(await self.request(**self._token_request(token_data)))
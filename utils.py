@@ -1,10 +1,11 @@
 import platform    # For getting the operating system name
 import subprocess  # For executing a shell command
 
-def ping(host):
+def ping(host, timeout=None):
     """
     Returns True if host (str) responds to a ping request.
     Remember that a host may not respond to a ping (ICMP) request even if the host name is valid.
+    An optional timeout (float, in seconds) limits the wait for the reply (and name resolution).
     """
 
     # Option for the number of packets as a function of
@@ -13,6 +14,16 @@ def ping(host):
     # Building the command. Ex: "ping -c 1 google.com"
     command = ['ping', param, '1', host]
 
-    response = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # Option for the reply timeout (windows: milliseconds, else: seconds). Ex: "ping -c 1 -W 1 google.com"
+    if timeout is not None:
+        if platform.system().lower()=='windows':
+            command[3:3] = ['-w', str(max(int(timeout * 1000), 1))]
+        else:
+            command[3:3] = ['-W', str(max(int(round(timeout)), 1))]
 
-    return response.returncode == 0
\ No newline at end of file
+    try:
+        response = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=None if timeout is None else timeout + 1)
+    except subprocess.TimeoutExpired:
+        return False
+
+    return response.returncode == 0
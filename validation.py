@@ -0,0 +1,162 @@
+import uuid
+import ipaddress
+from collections import Counter
+
+from inventory import Inventory, ColumnError, CAPABILITY_COLUMNS, LOCATIONS_SHEET, SERVICE_GROUPS_SHEET
+from structuredLog import get_logger
+
+log = get_logger("validation")
+
+# the values of a capability column
+CAPABILITY_FLAGS = ["yes", "skip", "no", "-"]
+# the capability columns, which are read by the provisioner (DC_Base is sent with the resource)
+KNOWN_CAPABILITY_COLUMNS = {column for column, _ in CAPABILITY_COLUMNS} | {"DC_Base"}
+# how invalid inventories are handled: abort the run, only report the problems, or skip the validation
+VALIDATION_MODES = ["strict", "warn", "off"]
+
+
+class ValidationIssue():
+    """A problem of an entry of the inventory, at its row in the file (see load_inventory, None if the problem is not
+    of a single row). Errors would make the run fail (or write wrong data), warnings are reported only
+    """
+    __slots__ = ("severity", "sheet", "row", "uuid", "column", "message")
+
+    def __init__(self, severity: str, sheet: str, row: int, uuid: str, column: str, message: str):
+        self.severity = severity
+        self.sheet = sheet
+        self.row = row
+        self.uuid = uuid
+        self.column = column
+        self.message = message
+
+
+    def __repr__(self):
+        return f"ValidationIssue({self.severity}, {self.sheet} #{self.row}, '{self.column}': {self.message})"
+
+
+def _is_uuid(value: str) -> bool:
+    try:
+        uuid.UUID(value)
+        return True
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+
+def _is_ip(value: str) -> bool:
+    try:
+        ipaddress.ip_address(value)
+        return True
+    except ValueError:
+        return False
+
+
+def _duplicates(sheet: str, records: list, severity: str = "error", note: str = "") -> list:
+    """Returns an issue for every row, whose uuid occurs more than once in the records
+    """
+    counts = Counter(record.uuid for record in records)
+    return [ValidationIssue(severity, sheet, record.row, record.uuid, "UUID", f"duplicate uuid '{record.uuid}' ({counts[record.uuid]} rows){note}")
+            for record in records if record.uuid is not None and counts[record.uuid] > 1]
+
+
+def _check_named(sheet: str, records: list) -> list:
+    """Checks the rows of the LOCATIONS or SERVICE_GROUPS sheet
+    """
+    issues = _duplicates(sheet, records)
+    for record in records:
+        if not _is_uuid(record.uuid):
+            issues.append(ValidationIssue("warning", sheet, record.row, record.uuid, "UUID", f"'{record.uuid}' is no valid UUID"))
+        if not record.name:
+            issues.append(ValidationIssue("warning", sheet, record.row, record.uuid, "Name", "has no name"))
+    return issues
+
+
+def _check_device(sheet: str, device, location_uuids: set, generate_uuid: bool) -> list:
+    """Checks a device, which is added to the resource registry
+    """
+    issues = []
+
+    def issue(severity, column, message):
+        issues.append(ValidationIssue(severity, sheet, device.row, device.uuid, column, message))
+
+    if not generate_uuid and not _is_uuid(device.uuid):
+        issue("warning", "UUID", f"'{device.uuid}' is no valid UUID")
+    if device.ip in ["-", None]:
+        issue("error", "eth0 IP", "has neither 'eth0 IP' nor 'eth1 IP'")
+    elif not _is_ip(device.ip):
+        issue("error", "eth0 IP" if device.eth0_ip not in ["-", None] else "eth1 IP", f"'{device.ip}' is no valid IP")
+    if not device.hostname:
+        issue("warning", "hostname", "has no hostname")
+
+    # a connection is added, unless the connection type is '-'
+    if device.connection_type is None:
+        issue("error", "connection-type", "has no connection type (use '-' to add the resource without connection)")
+    elif device.connection_type != "-":
+        if device.connection_port is None:
+            issue("error", "connection-port", "has no numeric connection port")
+        elif not 0 < device.connection_port < 65536:
+            issue("error", "connection-port", f"connection port '{device.connection_port}' is out of range")
+        if not device.user:
+            issue("error", "user", "has no user for the connection")
+
+    if device.location_uuid and location_uuids is not None and device.location_uuid not in location_uuids:
+        issue("error", "location-uuid", f"location '{device.location_uuid}' is not listed in sheet '{LOCATIONS_SHEET}'")
+
+    for column, flag in device.capabilities.items():
+        if flag is None:
+            continue
+        if flag not in CAPABILITY_FLAGS:
+            issue("error", column, f"unknown value '{flag}', expected one of {CAPABILITY_FLAGS}")
+        elif flag in ["yes", "skip"] and column not in KNOWN_CAPABILITY_COLUMNS:
+            issue("warning", column, f"unknown capability, it is not added (known: {sorted(KNOWN_CAPABILITY_COLUMNS)})")
+    return issues
+
+
+def validate_inventory(inventory: Inventory, generate_uuid: bool = False, sheet_name: str = "DEVICES") -> list:
+    """Checks the whole inventory at once, before any request is sent: every column is checked for all rows,
+    so all problems are reported together instead of failing mid-run
+
+    Args:
+        inventory (Inventory): the devices, locations and service groups of the inventory
+        generate_uuid (bool): GENERATE_UUID, the uuids of the devices are not sent to the registry
+        sheet_name (str): SHEET_NAME, the sheet (or JSON key) the devices were loaded from
+
+    Returns:
+        list: the ValidationIssues, errors first
+    """
+    # only resources are sent, and with GENERATE_UUID their uuid is not used as resource id (only the first row of a uuid is provisioned)
+    if generate_uuid:
+        issues = _duplicates(sheet_name, inventory.resources, "warning", ", only the first row is provisioned")
+    else:
+        issues = _duplicates(sheet_name, inventory.resources)
+    location_uuids = inventory.locations_by_uuid.keys() if inventory.locations is not None else None
+    for device in inventory.resources:
+        issues += _check_device(sheet_name, device, location_uuids, generate_uuid)
+    for device in inventory.without_uuid:
+        issues.append(ValidationIssue("warning", sheet_name, device.row, None, "UUID",
+                                      f"resource '{device.hostname}' ({device.ip}) has no UUID, it is skipped (set GENERATE_UUID=True to generate one)"))
+    if inventory.locations is not None:
+        issues += _check_named(LOCATIONS_SHEET, inventory.locations)
+    if inventory.service_groups is not None:
+        issues += _check_named(SERVICE_GROUPS_SHEET, inventory.service_groups)
+    return sorted(issues, key=lambda issue: (issue.severity != "error", issue.sheet, issue.row or 0))
+
+
+def column_issue(error: ColumnError) -> ValidationIssue:
+    """Returns the problem of an inventory, which could not be loaded since a required column is missing
+    """
+    return ValidationIssue("error", error.sheet, None, None, error.column, "the column is missing, the sheet can not be read")
+
+
+def print_issues(issues: list):
+    """Prints all problems of the inventory, and the number of errors and warnings
+    """
+    for issue in issues:
+        entry = f" #{issue.row}" if issue.row is not None else ""
+        entry += f" ('{issue.uuid}')" if issue.uuid is not None else ""
+        message = f"{issue.severity.upper()}: {issue.sheet}{entry}, column '{issue.column}': {issue.message}"
+        if issue.severity == "error":
+            log.error(message)
+        else:
+            log.warning(message)
+    errors = len([issue for issue in issues if issue.severity == "error"])
+    log.info(f"Validation found '{errors}' errors and '{len(issues) - errors}' warnings in the inventory")